@@ -0,0 +1,202 @@
+from bisect import bisect_right
+from datetime import date
+from itertools import islice
+import json
+
+
+# ---------------------------------------------------
+# AVAILABILITY CALENDAR — weekly rules + date overrides
+# ---------------------------------------------------
+# A student's study minutes per day, as a spec (the API's "availability"):
+#
+#   {"weekly": {"mon": 60, "sat": 180, "sun": 0},
+#    "overrides": [{"start": "2026-12-21", "end": "2027-01-03", "minutes": 0},
+#                  {"start": "2026-11-14", "minutes": 30}]}
+#
+# Weekdays left out of "weekly" get the study_mode's daily minutes; an
+# override covers start..end (inclusive, end defaults to start) and wins
+# over the weekly rule. 0 minutes = a closed day.
+#
+# Stored run-length: seven weekday values plus the overrides as sorted,
+# non-overlapping [start, end) runs of day offsets from `origin`, so a
+# semester with a handful of exceptions is a few short lists, not a dict
+# per day. Lookups bisect the runs; count_open() counts whole weeks
+# arithmetically and corrects for each overlapping run, O(runs).
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class AvailabilityCalendar:
+
+    def __init__(self, spec, origin, default_minutes):
+        """spec: as above; origin: the date of offset 0 (today)."""
+        weekly = spec.get("weekly") or {}
+        unknown = set(weekly) - set(WEEKDAYS)
+        if unknown:
+            raise ValueError(f"Unknown weekday(s) in availability: {', '.join(sorted(unknown))}")
+        self.weekly = [int(weekly.get(day, default_minutes)) for day in WEEKDAYS]
+        if not any(self.weekly):
+            raise ValueError("Availability needs at least one weekday with study time")
+
+        self.origin = origin
+        self._weekday0 = origin.weekday()
+
+        runs = []
+        for item in spec.get("overrides") or ():
+            start = date.fromisoformat(item["start"])
+            end = date.fromisoformat(item.get("end") or item["start"])
+            if end < start:
+                raise ValueError("Availability override ends before it starts")
+            lo = max((start - origin).days, 0)
+            hi = (end - origin).days + 1
+            if hi > lo:   # runs entirely in the past are dropped
+                runs.append((lo, hi, int(item["minutes"])))
+        runs.sort()
+        for (_, hi, _), (lo, _, _) in zip(runs, runs[1:]):
+            if lo < hi:
+                raise ValueError("Availability overrides overlap")
+
+        self.starts = [lo for lo, _, _ in runs]
+        self.ends = [hi for _, hi, _ in runs]
+        self.minutes = [m for _, _, m in runs]
+
+        self.max_recurring = max(self.weekly)
+        self.max_minutes = max([self.max_recurring] + self.minutes)
+        self._open_per_week = sum(1 for m in self.weekly if m > 0)
+        self.key = (json.dumps(spec, sort_keys=True, separators=(",", ":")),
+                    str(origin), int(default_minutes))
+
+    def _weekly_minutes(self, offset):
+        return self.weekly[(self._weekday0 + offset) % 7]
+
+    def minutes_on(self, offset):
+        i = bisect_right(self.starts, offset) - 1
+        if i >= 0 and offset < self.ends[i]:
+            return self.minutes[i]
+        return self._weekly_minutes(offset)
+
+    def is_open(self, offset):
+        return self.minutes_on(offset) > 0
+
+    def next_open(self, offset):
+        """First open day offset >= offset."""
+        i = bisect_right(self.starts, offset) - 1
+        while True:
+            if i >= 0 and offset < self.ends[i]:
+                if self.minutes[i] > 0:
+                    return offset
+                offset = self.ends[i]          # skip the closed run
+            stop = self.starts[i + 1] if i + 1 < len(self.starts) else offset + 7
+            for d in range(offset, min(stop, offset + 7)):
+                if self._weekly_minutes(d) > 0:
+                    return d
+            offset = stop
+            i += 1
+
+    def open_days(self, first=0):
+        """-> endless (offset, minutes) of open days from `first`."""
+        offset = first
+        i = bisect_right(self.starts, offset) - 1
+        while True:
+            if i >= 0 and offset < self.ends[i]:
+                if self.minutes[i] > 0:
+                    for d in range(offset, self.ends[i]):
+                        yield d, self.minutes[i]
+                offset = self.ends[i]
+            stop = self.starts[i + 1] if i + 1 < len(self.starts) else None
+            while stop is None or offset < stop:
+                m = self._weekly_minutes(offset)
+                if m > 0:
+                    yield offset, m
+                offset += 1
+            i += 1
+
+    def budgets(self, first=0):
+        """-> endless minutes of each open day from `first` (the packers' day budgets)."""
+        return (m for _, m in self.open_days(first))
+
+    def open_offsets(self, first=0):
+        return (d for d, _ in self.open_days(first))
+
+    def _weekly_open(self, lo, hi):
+        # open weekdays in [lo, hi) by the weekly rule alone
+        if hi <= lo:
+            return 0
+        weeks, rest = divmod(hi - lo, 7)
+        return weeks * self._open_per_week + sum(
+            1 for d in range(lo, lo + rest) if self._weekly_minutes(d) > 0
+        )
+
+    def count_open(self, first, stop):
+        """Open days in [first, stop)."""
+        n = self._weekly_open(first, stop)
+        i = max(bisect_right(self.starts, first) - 1, 0)
+        while i < len(self.starts) and self.starts[i] < stop:
+            lo, hi = max(self.starts[i], first), min(self.ends[i], stop)
+            if hi > lo:
+                n -= self._weekly_open(lo, hi)
+                if self.minutes[i] > 0:
+                    n += hi - lo
+            i += 1
+        return n
+
+    def packing_limits(self, limits):
+        """limits for engine.check_packable(): a task must fit some recurring day."""
+        return {**limits, "time": self.max_recurring}
+
+
+# ---------------------------------------------------
+# CHECK RUNNER (python availability.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import random
+    from datetime import timedelta
+
+    rng = random.Random(3)
+    origin = date(2026, 10, 14)   # a Wednesday
+    for trial in range(300):
+        weekly = {day: rng.choice([0, 0, 30, 60, 120]) for day in rng.sample(WEEKDAYS, 4)}
+        if not any(weekly.get(day, 90) for day in WEEKDAYS):
+            weekly["mon"] = 45
+        overrides, day = [], rng.randint(-5, 10)
+        for _ in range(rng.randint(0, 6)):
+            length = rng.randint(1, 12)
+            overrides.append({"start": str(origin + timedelta(days=day)),
+                              "end": str(origin + timedelta(days=day + length - 1)),
+                              "minutes": rng.choice([0, 0, 45, 200])})
+            day += length + rng.randint(0, 9)
+        rng.shuffle(overrides)
+        calendar = AvailabilityCalendar({"weekly": weekly, "overrides": overrides}, origin, 90)
+
+        # reference: one dict per day
+        horizon = 120
+        per_day = {}
+        for d in range(horizon):
+            when = origin + timedelta(days=d)
+            per_day[d] = weekly.get(WEEKDAYS[when.weekday()], 90)
+            for item in overrides:
+                if item["start"] <= str(when) <= item["end"]:
+                    per_day[d] = item["minutes"]
+
+        assert [calendar.minutes_on(d) for d in range(horizon)] == list(per_day.values())
+        open_ref = [d for d in range(horizon) if per_day[d] > 0]
+        assert list(islice(calendar.open_days(), len(open_ref))) == [(d, per_day[d]) for d in open_ref]
+        for _ in range(20):
+            a = rng.randint(0, 90)
+            b = rng.randint(a, horizon)
+            assert calendar.count_open(a, b) == sum(1 for d in open_ref if a <= d < b)
+            assert calendar.next_open(a) == next(d for d in open_ref if d >= a)
+            assert next(calendar.open_offsets(a)) == calendar.next_open(a)
+
+    for bad in ({"weekly": {"funday": 30}},
+                {"weekly": dict.fromkeys(WEEKDAYS, 0)},
+                {"overrides": [{"start": "2026-11-02", "end": "2026-11-01", "minutes": 0}]},
+                {"overrides": [{"start": "2026-11-01", "end": "2026-11-05", "minutes": 0},
+                               {"start": "2026-11-05", "minutes": 30}]}):
+        try:
+            AvailabilityCalendar(bad, origin, 90)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(bad)
+
+    print("availability calendar matches a per-day reference")
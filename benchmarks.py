@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from engine import DAILY_LIMITS, generate_realistic_plan_v2, generate_realistic_plan_fast
+from syllabus_index import SyllabusIndex
+
+
+# ---------------------------------------------------
+# BENCHMARK SUITE
+# ---------------------------------------------------
+#   python benchmarks.py                          -> bench_results.json
+#   python benchmarks.py --quick --only engine
+#   python benchmarks.py --baseline old.json --threshold 0.25
+#
+# Sections, each result named "<section>.<case>":
+#   features  features.feature_row() for one request, feature_matrix() for 1000
+#   models    pickle load, each of the three boosters (1 row / 1000 rows),
+#             and the fused predictor serving them all
+#   engine    v2 and fast engines over study modes, topic ranges and
+#             synthetic syllabi of 100 .. 100k topics
+#   api       POST /generate_study_plan through an in-process ASGI client
+#             at increasing concurrency (skipped without httpx)
+#
+# Every result carries p50_ms / p99_ms / mean_ms over `runs` timings. With
+# --baseline, p50 values are compared to an earlier run and the process
+# exits 1 if any case got slower than the threshold allows (and by more
+# than --min-delta-ms, so sub-0.1ms cases don't fail on timer noise).
+# Inputs are seeded and exam dates are relative to today, so runs on
+# different days build plans of the same shape.
+
+SYNTHETIC_SIZES = [100, 1_000, 10_000, 100_000]
+QUICK_SIZES = [100, 1_000]
+CONCURRENCY = [1, 8, 32, 64]
+QUICK_CONCURRENCY = [1, 8]
+
+EXAM_DATE = str(date.today() + timedelta(days=180))
+
+SAMPLE_REQUEST = {
+    "subject": "Maths",
+    "exam_date": EXAM_DATE,
+    "study_mode": "moderate",
+    "marks": 62,
+    "past_marks": [48, 55, 61],
+    "quiz_scores": [6, 7, 5, 8],
+    "attendance": 0.82,
+    "assignment_rate": 0.9,
+    "events_participation": 3,
+    "cluster_id": 2,
+}
+
+
+# ---------------------------------------------------
+# TIMING
+# ---------------------------------------------------
+def measure(fn, min_runs=5, max_runs=2000, budget=0.5, warmup=2):
+    """Call fn until `budget` seconds or `max_runs` calls (at least `min_runs`)."""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_runs:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+        if len(samples) >= min_runs and time.perf_counter() - start >= budget:
+            break
+
+    return summarize(samples)
+
+
+def summarize(samples):
+    ms = np.array(samples) * 1000
+    return {
+        "runs": len(ms),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+# ---------------------------------------------------
+# SYNTHETIC SYLLABI
+# ---------------------------------------------------
+def synthetic_syllabus(n_topics, with_hard=True, seed=0, topics_per_chapter=8):
+    """{"Synthetic": {chapter: [topic, ...]}} with n_topics topics."""
+    rng = random.Random(seed)
+    levels = ["easy", "medium", "hard"] if with_hard else ["easy", "medium"]
+
+    chapters = {}
+    for i in range(n_topics):
+        chapter = chapters.setdefault(f"Chapter {i // topics_per_chapter + 1}", [])
+        chapter.append({
+            "topic": f"Topic {i + 1}",
+            "difficulty": rng.choice(levels),
+            "estimated_time": rng.choice([20, 25, 30, 35, 40]),
+        })
+    return {"Synthetic": chapters}
+
+
+def engine_kwargs(syllabus, subject, mode, start_topic=None, end_topic=None):
+    return dict(
+        syllabus_json=syllabus, weakness_map={subject: 0.45},
+        speed_map={subject: 1}, study_mode=mode, exam_date=EXAM_DATE,
+        discipline_score=0.5, subject=subject,
+        start_topic=start_topic, end_topic=end_topic
+    )
+
+
+# ---------------------------------------------------
+# SECTIONS
+# ---------------------------------------------------
+def bench_features(results, quick):
+    from features import feature_row, feature_matrix
+    from planner_service import FullPlanInput
+
+    data = FullPlanInput(**SAMPLE_REQUEST)
+    batch = [data] * 1000
+    results["features.feature_row"] = measure(lambda: feature_row(data))
+    results["features.feature_matrix.1000"] = measure(lambda: feature_matrix(batch))
+
+
+def bench_models(results, quick):
+    import joblib
+    from fused_predictor import MODEL_FILES
+    from model_registry import ModelRegistry, _model_name
+    from features import feature_row
+    from planner_service import FullPlanInput
+
+    row = np.array([feature_row(FullPlanInput(**SAMPLE_REQUEST))], dtype=np.float64)
+    X = np.random.default_rng(0).uniform(0, 100, (1000, row.shape[1]))
+
+    for path in MODEL_FILES:
+        name = _model_name(path)
+        results[f"models.load_pickle.{name}"] = measure(
+            lambda: joblib.load(path), min_runs=3, max_runs=20
+        )
+
+        booster = joblib.load(path).booster_
+        results[f"models.{name}.row"] = measure(lambda: booster.predict(row))
+        results[f"models.{name}.batch1000"] = measure(lambda: booster.predict(X))
+
+    registry = ModelRegistry()
+    t0 = time.perf_counter()
+    registry.warm_up()
+    results[f"models.load_registry.{registry.backend}"] = summarize([time.perf_counter() - t0])
+
+    predictor = registry.predictor()
+    results["models.registry.row"] = measure(lambda: predictor.predict_row(row[0].tolist()))
+    results["models.registry.batch1000"] = measure(lambda: predictor.predict_matrix(X))
+
+
+def bench_engine(results, quick):
+    with open("syllabus.json") as f:
+        syllabus = json.load(f)
+    index = SyllabusIndex(syllabus)
+
+    engines = {"v2": generate_realistic_plan_v2, "fast": generate_realistic_plan_fast}
+
+    def run(name, kwargs, index, **measure_args):
+        for engine_name, engine in engines.items():
+            results[f"engine.{engine_name}.{name}"] = measure(
+                lambda: engine(**kwargs, index=index), **measure_args
+            )
+
+    # real syllabus: every mode, full range and first half
+    for subject, sub_index in index.subjects.items():
+        first_hard = next(
+            (i for i, c in enumerate(sub_index.difficulty_code) if c == 2), len(sub_index)
+        )
+        for mode, limits in DAILY_LIMITS.items():
+            # modes with no hard slots can only plan up to the first hard topic
+            stop = first_hard if limits["hard"] == 0 else len(sub_index)
+            if stop == 0:
+                continue
+            ranges = {"full": stop, "half": max(1, stop // 2)}
+            for range_name, end in ranges.items():
+                kwargs = engine_kwargs(syllabus, subject, mode,
+                                       sub_index.topics[0], sub_index.topics[end - 1])
+                run(f"{subject}.{mode}.{range_name}", kwargs, index)
+
+    # synthetic syllabi
+    for size in QUICK_SIZES if quick else SYNTHETIC_SIZES:
+        for mode, limits in DAILY_LIMITS.items():
+            synthetic = synthetic_syllabus(size, with_hard=limits["hard"] > 0)
+            kwargs = engine_kwargs(synthetic, "Synthetic", mode)
+            run(f"synthetic-{size}.{mode}", kwargs, SyllabusIndex(synthetic),
+                min_runs=3, budget=0.5 if size < 100_000 else 0.0)
+
+
+def bench_api(results, quick):
+    try:
+        import httpx
+    except ImportError:   # not a runtime dependency of the API itself
+        print("api: skipped, needs httpx (pip install httpx)")
+        return
+
+    spec = importlib.util.spec_from_file_location("api", "combined_api-planner.py")
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    api.registry.warm_up()
+
+    async def run_level(client, concurrency, n_requests):
+        latencies = []
+        queue = asyncio.Queue()
+        for _ in range(n_requests):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                t0 = time.perf_counter()
+                r = await client.post("/generate_study_plan", json=SAMPLE_REQUEST)
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code != 200 or r.json().get("status") != "success":
+                    raise RuntimeError(f"benchmark request failed: {r.text[:200]}")
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - t0
+        return {**summarize(latencies), "rps": n_requests / elapsed}
+
+    async def main():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await run_level(client, 1, 5)  # warm-up
+            for concurrency in QUICK_CONCURRENCY if quick else CONCURRENCY:
+                results[f"api.generate_study_plan.c{concurrency}"] = await run_level(
+                    client, concurrency, max(50, concurrency * 8)
+                )
+
+    asyncio.run(main())
+
+
+SECTIONS = {
+    "features": bench_features,
+    "models": bench_models,
+    "engine": bench_engine,
+    "api": bench_api,
+}
+
+
+# ---------------------------------------------------
+# REGRESSION CHECK
+# ---------------------------------------------------
+def compare(results, baseline, threshold, min_delta_ms=0.1):
+    """-> list of (name, old_p50, new_p50) slower than (1 + threshold) x baseline.
+
+    Slowdowns under min_delta_ms are timer / scheduler noise and never count.
+    """
+    regressions = []
+    for name, current in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratio = current["p50_ms"] / old["p50_ms"] if old["p50_ms"] else 1.0
+        slower = current["p50_ms"] - old["p50_ms"] > min_delta_ms
+        flag = "REGRESSION" if ratio > 1 + threshold and slower else ""
+        print(f"{name:60s} {old['p50_ms']:10.3f} -> {current['p50_ms']:10.3f} ms "
+              f"x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append((name, old["p50_ms"], current["p50_ms"]))
+    return regressions
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SPDM planner benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(SECTIONS), default=list(SECTIONS))
+    parser.add_argument("--quick", action="store_true", help="small syllabi, low concurrency")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare p50 against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed p50 slowdown before failing (0.25 = +25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="ignore p50 slowdowns smaller than this")
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = {}
+    for name in args.only:
+        t0 = time.perf_counter()
+        SECTIONS[name](results, args.quick)
+        print(f"{name}: done in {time.perf_counter() - t0:.1f}s")
+
+    report = {"environment": environment(), "quick": args.quick, "results": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{len(results)} results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than +{args.threshold:.0%}")
+            sys.exit(1)
+        print("no regressions")
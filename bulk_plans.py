@@ -0,0 +1,278 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pydantic import ValidationError
+
+from planner_service import FullPlanInput, generate_batch, warm_up
+from response_encoding import dumps
+
+
+# ---------------------------------------------------
+# OFFLINE BULK PLANS
+# ---------------------------------------------------
+#   python bulk_plans.py students.csv --out plans.ndjson
+#   python bulk_plans.py students.parquet --out plans.parquet --workers 8
+#   python bulk_plans.py students.csv --out - --exam-date 2027-03-01 --limit 100
+#
+# Rows are read in chunks of --chunk-size and each chunk goes to a process
+# pool whose workers load the models and syllabus once (initializer).
+# A worker scores its chunk with one predict_matrix call per model and
+# builds the plans through planner_service.generate_batch(): the same
+# features, models and engine as POST /generate_study_plan.
+#
+# At most 2 x workers chunks are in flight and results are written in
+# input order as they complete, so memory stays flat however long the
+# input is. Throughput goes to stderr every --progress seconds.
+#
+# Input columns are FullPlanInput's fields plus an optional student_id.
+# In CSV, past_marks / quiz_scores are "48;55;61" or a JSON list, and
+# availability is a JSON object (planner_service.Availability). Missing
+# subject / exam_date / study_mode fall back to the --subject / --exam-date
+# / --study-mode defaults. Parquet needs pyarrow.
+#
+# Output rows are {"row", "student_id", ...the API response}; invalid rows
+# come out as status "error" in place and do not stop the run. Parquet
+# output has row, student_id, status, message and result (that JSON).
+CHUNK_SIZE = 2000
+LIST_FIELDS = ("past_marks", "quiz_scores")
+JSON_FIELDS = ("availability",)
+
+
+# ---------------------------------------------------
+# INPUT
+# ---------------------------------------------------
+def read_chunks(path, chunk_size, defaults, limit=None):
+    """-> (first row number, [record dict, ...]) per chunk."""
+    records = iter_records(path, chunk_size)
+    if limit is not None:
+        records = itertools.islice(records, limit)
+
+    row = 0
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        for record in chunk:
+            for key, value in defaults.items():
+                if record.get(key) in (None, ""):
+                    record[key] = value
+        yield row, chunk
+        row += len(chunk)
+
+
+def iter_records(path, chunk_size):
+    if path.endswith(".parquet"):
+        pq = require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+        return
+
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def require_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet input/output needs pyarrow (pip install pyarrow)")
+    return pq
+
+
+def parse_record(record):
+    """CSV strings -> FullPlanInput kwargs (numbers are coerced by pydantic)."""
+    fields = {}
+    for key, value in record.items():
+        if key in LIST_FIELDS and not isinstance(value, list):
+            value = (value or "").strip()
+            if value.startswith("["):
+                value = json.loads(value)
+            else:
+                value = [float(v) for v in value.split(";") if v.strip()]
+        elif value is None or value == "":
+            continue
+        elif key in JSON_FIELDS and isinstance(value, str):
+            value = json.loads(value)
+        fields[key] = value
+    return fields
+
+
+def invalid_message(e):
+    if isinstance(e, ValidationError):
+        fields = sorted({str(err["loc"][0]) for err in e.errors() if err["loc"]})
+        return "Invalid field(s): " + ", ".join(fields)
+    return f"Invalid row: {e}"
+
+
+# ---------------------------------------------------
+# WORKER (one chunk -> encoded results)
+# ---------------------------------------------------
+def plan_chunk(first_row, records, compact=False):
+    """-> [(row, student_id, status, message, JSON bytes), ...] in input order."""
+    results = [None] * len(records)
+    inputs, slots = [], []
+    for i, record in enumerate(records):
+        try:
+            inputs.append(FullPlanInput(**parse_record(record)))
+            slots.append(i)
+        except ValueError as e:  # includes pydantic's ValidationError
+            results[i] = {"status": "error", "message": invalid_message(e)}
+
+    if inputs:
+        for i, result in zip(slots, generate_batch(inputs, compact)["results"]):
+            results[i] = result
+
+    encoded = []
+    for i, (record, result) in enumerate(zip(records, results)):
+        student_id = record.get("student_id")
+        student_id = None if student_id in (None, "") else str(student_id)
+        body = dumps({"row": first_row + i, "student_id": student_id, **result})
+        encoded.append((first_row + i, student_id, result["status"], result.get("message"), body))
+    return encoded
+
+
+# ---------------------------------------------------
+# OUTPUT
+# ---------------------------------------------------
+class NdjsonWriter:
+
+    def __init__(self, path):
+        self._file = sys.stdout.buffer if path == "-" else open(path, "wb")
+
+    def write(self, results):
+        self._file.writelines(body + b"\n" for *_, body in results)
+
+    def close(self):
+        self._file.flush()
+        if self._file is not sys.stdout.buffer:
+            self._file.close()
+
+
+class ParquetWriter:
+
+    def __init__(self, path):
+        pq = require_pyarrow()
+        import pyarrow as pa
+        self._pa = pa
+        self._schema = pa.schema([
+            ("row", pa.int64()), ("student_id", pa.string()), ("status", pa.string()),
+            ("message", pa.string()), ("result", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, results):
+        rows, student_ids, statuses, messages, bodies = zip(*results)
+        self._writer.write_table(self._pa.table({
+            "row": list(rows), "student_id": list(student_ids), "status": list(statuses),
+            "message": list(messages), "result": [b.decode() for b in bodies],
+        }, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path):
+    return ParquetWriter(path) if path.endswith(".parquet") else NdjsonWriter(path)
+
+
+# ---------------------------------------------------
+# THROUGHPUT
+# ---------------------------------------------------
+class Progress:
+
+    def __init__(self, every=5.0):
+        self.every = every
+        self.rows = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def add(self, results):
+        self.rows += len(results)
+        self.errors += sum(1 for _, _, status, _, _ in results if status != "success")
+        now = time.perf_counter()
+        if self.every and now - self._last_report >= self.every:
+            self._last_report = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0.0
+        prefix = "done: " if final else ""
+        print(f"{prefix}{self.rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s), "
+              f"{self.errors:,} error(s)", file=sys.stderr, flush=True)
+
+
+# ---------------------------------------------------
+# RUN
+# ---------------------------------------------------
+def run(path, out, workers=None, chunk_size=CHUNK_SIZE, defaults=None,
+        compact=False, limit=None, progress_every=5.0):
+    """workers=0 plans in this process (no pool)."""
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    chunks = read_chunks(path, chunk_size, defaults or {}, limit)
+    writer = open_writer(out)
+    progress = Progress(progress_every)
+
+    def finish(results):
+        writer.write(results)
+        progress.add(results)
+
+    try:
+        if workers == 0:
+            warm_up()
+            for first_row, records in chunks:
+                finish(plan_chunk(first_row, records, compact))
+        else:
+            pool = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up
+            )
+            with pool:
+                pending = deque()
+                for first_row, records in chunks:
+                    pending.append(pool.submit(plan_chunk, first_row, records, compact))
+                    if len(pending) >= 2 * workers:
+                        finish(pending.popleft().result())
+                while pending:
+                    finish(pending.popleft().result())
+    finally:
+        writer.close()
+
+    progress.report(final=True)
+    return progress
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate study plans for a student export")
+    parser.add_argument("input", help=".csv or .parquet")
+    parser.add_argument("--out", required=True, help=".ndjson, .parquet or - (stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="plan processes (default: CPU count, 0 = this process)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--subject", help="default when a row has none")
+    parser.add_argument("--exam-date", help="default when a row has none")
+    parser.add_argument("--study-mode", help="default when a row has none")
+    parser.add_argument("--compact", action="store_true", help="compact plan format")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    parser.add_argument("--progress", type=float, default=5.0,
+                        help="seconds between throughput lines (0 = only at the end)")
+    args = parser.parse_args()
+
+    defaults = {
+        key: value for key, value in (
+            ("subject", args.subject), ("exam_date", args.exam_date),
+            ("study_mode", args.study_mode)
+        ) if value
+    }
+    run(args.input, args.out, args.workers, args.chunk_size, defaults,
+        args.compact, args.limit, args.progress)
@@ -0,0 +1,326 @@
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+
+from metrics import observe_batch
+
+
+# ---------------------------------------------------
+# SINGLE-FLIGHT — one computation per key in flight
+# ---------------------------------------------------
+# do(key, fn, *args): the first caller for a key runs fn; callers that
+# arrive with the same key while it runs wait and get the same result (or
+# the same exception). Nothing is kept once the call returns: this only
+# folds concurrent duplicates (a retried mobile request racing the
+# original), it is not a cache.
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn(*args)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared,
+                "share_rate": round(self.shared / self.calls, 4) if self.calls else 0.0}
+
+
+# ---------------------------------------------------
+# PREDICTION COALESCER — micro-batched SPDM scoring
+# ---------------------------------------------------
+# Concurrent single-plan requests each score one feature row. Here rows
+# that arrive close together share one predict_matrix() call (one pass
+# per model over all of them), and each caller gets back its own row:
+#
+#   - the first row of a batch makes its caller the leader; the leader
+#     waits up to window_ms (or until max_batch rows), then scores the
+#     batch while the other callers wait
+#   - one batch is scored at a time, so rows arriving while a batch is
+#     scoring pile up in the next one: with window_ms=0 nothing waits on
+#     purpose, and a lone request pays a few lock operations
+#   - a row identical to one already queued or being scored (same feature
+#     bytes) joins that row instead of adding another (single-flight)
+#
+# Results are per row and bit-identical to predict_row(): the fused
+# forest scores each row independently of its neighbours. Batches are per
+# predictor, so a request scored during a model swap gets the version it
+# took its snapshot of. A batch signals
+# "full" and "done" by releasing locks taken when it was opened (a lock is
+# far cheaper to make than an Event, and a lone request makes a batch).
+#
+# Batches live in one process; with PLANNER_EXECUTION=process each pool
+# process only ever holds one request, so batching needs the sync or
+# thread mode.
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _Batch:
+    __slots__ = ("predictor", "rows", "keys", "full", "done", "results", "error")
+
+    def __init__(self, predictor, windowed):
+        self.predictor = predictor
+        self.rows = []
+        self.keys = []
+        self.full = threading.Lock() if windowed else None
+        self.done = threading.Lock()
+        if windowed:
+            self.full.acquire()
+        self.done.acquire()
+        self.results = None
+        self.error = None
+
+    def wait(self):
+        self.done.acquire()
+        self.done.release()
+
+    def result(self, i):
+        weakness, speed, slope = self.results
+        return float(weakness[i]), int(speed[i]), float(slope[i])
+
+
+class PredictionCoalescer:
+
+    def __init__(self, window_ms=0.0, max_batch=64):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        self._score_lock = threading.Lock()   # one batch scored at a time
+        self._open = {}                       # predictor -> the batch taking its rows
+        self._queued = {}                     # (predictor, row bytes) -> (batch, index)
+
+        self.requests = 0
+        self.deduped = 0
+        self.batches = 0
+        self.rows = 0
+        self.wait_ms = 0.0
+        self.sizes = [0] * (len(BATCH_SIZES) + 1)   # batch-size histogram, last = larger
+
+    def configure(self, window_ms=None, max_batch=None):
+        if window_ms is not None:
+            self.window_ms = max(float(window_ms), 0.0)
+        if max_batch is not None:
+            self.max_batch = max(int(max_batch), 1)
+
+    def predict_row(self, predictor, row):
+        """Score one feature row with predictor.predict_matrix() -> (weakness, speed, slope)."""
+        row = np.ascontiguousarray(row, dtype=np.float64) + 0.0   # -0.0 == 0.0
+        key = (predictor, row.tobytes())
+
+        with self._lock:
+            self.requests += 1
+            queued = self._queued.get(key)
+            if queued is not None:
+                self.deduped += 1
+                batch, i = queued
+                leader = False
+            else:
+                batch = self._open.get(predictor)
+                leader = batch is None
+                if leader:
+                    batch = self._open[predictor] = _Batch(predictor, self.window_ms > 0)
+                i = len(batch.rows)
+                batch.rows.append(row)
+                batch.keys.append(key)
+                self._queued[key] = (batch, i)
+                if len(batch.rows) >= self.max_batch:
+                    del self._open[predictor]
+                    if batch.full is not None:
+                        batch.full.release()
+
+        if leader:
+            self._score(batch)
+        else:
+            batch.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result(i)
+
+    def _score(self, batch):
+        t0 = time.perf_counter()
+        if batch.full is not None:
+            batch.full.acquire(timeout=self.window_ms / 1000)
+
+        with self._score_lock:
+            with self._lock:
+                if self._open.get(batch.predictor) is batch:
+                    del self._open[batch.predictor]
+                rows = batch.rows[:]
+            waited = (time.perf_counter() - t0) * 1000
+
+            try:
+                X = rows[0][None] if len(rows) == 1 else np.array(rows)
+                batch.results = batch.predictor.predict_matrix(X)
+            except BaseException as e:
+                batch.error = e
+            finally:
+                with self._lock:
+                    for key in batch.keys:
+                        del self._queued[key]
+                    self.batches += 1
+                    self.rows += len(rows)
+                    self.wait_ms += waited
+                    self.sizes[bisect_left(BATCH_SIZES, len(rows))] += 1
+                observe_batch(len(rows))
+                batch.done.release()
+
+    def stats(self):
+        with self._lock:
+            sizes = {f"le_{bound}": n for bound, n in zip(BATCH_SIZES, self.sizes)}
+            sizes["larger"] = self.sizes[-1]
+            return {
+                "window_ms": self.window_ms,
+                "max_batch": self.max_batch,
+                "requests": self.requests,
+                "deduped": self.deduped,
+                "dedup_rate": round(self.deduped / self.requests, 4) if self.requests else 0.0,
+                "batches": self.batches,
+                "rows_scored": self.rows,
+                "mean_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                "mean_wait_ms": round(self.wait_ms / self.batches, 3) if self.batches else 0.0,
+                "batch_sizes": sizes,
+            }
+
+
+# ---------------------------------------------------
+# CHECK RUNNER (python coalescer.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    from model_registry import ModelRegistry
+
+    predictor = ModelRegistry().predictor()
+    rng = np.random.default_rng(5)
+    rows = rng.uniform(0, 100, size=(400, predictor.n_features))
+    rows[:, 8] = rng.integers(0, 4, size=len(rows))
+    expected = [predictor.predict_row(r) for r in rows]
+
+    def burst(coalescer, workers, items):
+        with ThreadPoolExecutor(workers) as pool:
+            return list(pool.map(lambda i: coalescer.predict_row(predictor, rows[i]), items))
+
+    def best_ms(fn, runs=5):
+        best = float("inf")
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best * 1000
+
+    # every caller gets its own row back, with or without a window
+    for window_ms in (0.0, 2.0):
+        coalescer = PredictionCoalescer(window_ms=window_ms, max_batch=32)
+        assert burst(coalescer, 64, range(len(rows))) == expected
+        stats = coalescer.stats()
+        assert stats["rows_scored"] == len(rows) and stats["deduped"] == 0
+        print(f"window {window_ms}ms: {stats['batches']} batches, mean {stats['mean_batch']} rows")
+
+    # identical rows in flight are scored once
+    coalescer = PredictionCoalescer(window_ms=2.0)
+    items = [i % 20 for i in range(200)]
+    assert burst(coalescer, 64, items) == [expected[i] for i in items]
+    stats = coalescer.stats()
+    assert stats["deduped"] + stats["rows_scored"] == 200 and stats["deduped"] > 0
+    print(f"20 distinct rows x 10: {stats['rows_scored']} scored, dedup rate {stats['dedup_rate']}")
+
+    # rows for two model versions never share a batch
+    class Shifted:
+        def predict_matrix(self, X):
+            weakness, speed, slope = predictor.predict_matrix(X)
+            return weakness + 1, speed, slope
+
+    shifted = Shifted()
+    coalescer = PredictionCoalescer(window_ms=2.0)
+    with ThreadPoolExecutor(32) as pool:
+        got = list(pool.map(
+            lambda i: coalescer.predict_row(shifted if i % 2 else predictor, rows[i]), range(64)
+        ))
+    assert got == [(w + i % 2, s, sl) for i, (w, s, sl) in enumerate(expected[:64])]
+
+    # errors reach every caller of the batch
+    class Failing:
+        def predict_matrix(self, X):
+            return 1 / 0
+
+    failing = PredictionCoalescer(window_ms=2.0)
+    broken = Failing()
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(failing.predict_row, broken, rows[i]) for i in range(8)]
+        errors = [f.exception() for f in futures]
+    assert all(isinstance(e, ZeroDivisionError) for e in errors)
+    assert not failing._queued and not failing._open
+
+    flights = SingleFlight()
+    gate = threading.Event()
+    runs = []
+
+    def slow(x):
+        runs.append(x)
+        gate.wait()
+        return {"x": x}
+
+    with ThreadPoolExecutor(6) as pool:
+        futures = [pool.submit(flights.do, ("k", 1), slow, 1) for _ in range(5)]
+        time.sleep(0.05)
+        gate.set()
+        results = [f.result() for f in futures]
+    assert runs == [1] and all(r is results[0] for r in results) and flights.shared == 4
+    assert flights.do(("k", 1), slow, 2) == {"x": 2}   # nothing kept afterwards
+
+    # 64 concurrent callers, 256 rows: one predict per row vs coalesced
+    class Direct:
+        @staticmethod
+        def predict_row(predictor, row):
+            return predictor.predict_row(row)
+
+    with ThreadPoolExecutor(64) as pool:
+        def burst64(scorer):
+            return list(pool.map(lambda i: scorer.predict_row(predictor, rows[i]), range(256)))
+
+        timings = [f"one predict per row {best_ms(lambda: burst64(Direct)):.1f}ms"]
+        for window_ms in (0.0, 0.5):
+            coalescer = PredictionCoalescer(window_ms=window_ms)
+            ms = best_ms(lambda: burst64(coalescer))
+            timings.append(f"window {window_ms}ms {ms:.1f}ms (mean batch {coalescer.stats()['mean_batch']})")
+    print("256 rows, 64 threads: " + ", ".join(timings))
+    print("coalescer checks passed")
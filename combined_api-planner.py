@@ -1,120 +1,482 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import joblib
-import json
-import numpy as np
-import pandas as pd
-from engine import generate_realistic_plan_v2
-
-app = FastAPI(title="SortED Study Planner API v2 (Topic Range Ready)")
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from datetime import date
+import hmac
+import os
+import time
+from typing import Literal
+import metrics
+import profiler
+from executor import BoundedExecutor, Overloaded
+from plan_store import etag_matches
+from response_encoding import encoded_body, encoded_response
+from planner_service import (
+    FullPlanInput, MultiSubjectPlanInput, ReplanInput, registry, warm_up,
+    generate_single, generate_batch, stream_single, generate_multi, replan_single,
+    metric_labels, SKELETON_CACHE, PREDICTION_CACHE, SYLLABI, PLAN_STORE,
+    COALESCER, SHADOW, batching_stats
+)
 
 
 # ------------------------------
-# LOAD SPDM MODELS
+# SPDM MODELS (lazy registry)
 # ------------------------------
-weakness_model = joblib.load("spdm_weakness.pkl")
-slope_model = joblib.load("spdm_slope.pkl")
-speed_model = joblib.load("spdm_speed.pkl")
-features = joblib.load("spdm_features.pkl")
+# "warmup": load when the worker starts; "lazy": on the first request.
+MODEL_LOAD_MODE = os.environ.get("SPDM_LOAD_MODE", "warmup")
 
 
 # ------------------------------
-# LOAD COMBINED SYLLABUS
+# EXECUTION MODE
 # ------------------------------
-with open("syllabus.json") as f:
-    SYLLABUS = json.load(f)
+# PLANNER_EXECUTION:
+#   "sync"    -> FastAPI's default threadpool (unbounded queue)
+#   "thread"  -> bounded thread pool in this worker
+#   "process" -> bounded process pool (models loaded once per process)
+# With a pool, requests past PLANNER_POOL_SIZE + PLANNER_QUEUE_DEPTH get
+# an immediate 503 with Retry-After.
+EXECUTION_MODE = os.environ.get("PLANNER_EXECUTION", "sync")
+
+EXECUTOR = None
+if EXECUTION_MODE != "sync":
+    EXECUTOR = BoundedExecutor(
+        mode=EXECUTION_MODE,
+        workers=int(os.environ.get("PLANNER_POOL_SIZE", "0")) or None,
+        queue_depth=(int(os.environ["PLANNER_QUEUE_DEPTH"])
+                     if "PLANNER_QUEUE_DEPTH" in os.environ else None),
+        retry_after=int(os.environ.get("PLANNER_RETRY_AFTER", "1")),
+        initializer=warm_up if EXECUTION_MODE == "process" else None
+    )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if MODEL_LOAD_MODE == "warmup":
+        registry.warm_up()
+    profiler.install_signal_handler()
+    yield
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown()
+
+
+async def offload(fn, *args):
+    if EXECUTOR is None:
+        return await run_in_threadpool(fn, *args)
+
+    try:
+        return await EXECUTOR.run(fn, *args)
+    except Overloaded as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": "Planner is busy, retry shortly"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
 
 # ------------------------------
-# INPUT MODEL
+# ADMIN (PLANNER_ADMIN_TOKEN unset -> admin features off)
 # ------------------------------
-class FullPlanInput(BaseModel):
-    subject: str
-    exam_date: str
-    study_mode: str
+ADMIN_TOKEN = os.environ.get("PLANNER_ADMIN_TOKEN", "")
+
+
+def is_admin(request: Request):
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def admin_forbidden():
+    return JSONResponse(status_code=403, content={"status": "error", "message": "Admin token required"})
 
-    start_topic: str | None = None
-    end_topic: str | None = None
 
-    marks: float
-    past_marks: list
-    quiz_scores: list
-    attendance: float
-    assignment_rate: float
-    events_participation: int
-    cluster_id: int
+# ?format=compact -> engine.render_plan_compact() (topics / days / messages
+# by index); the verbose plan stays the default
+PlanFormat = Query("verbose", alias="format")
+
+
+async def encode(result, request: Request, headers=None):
+    # error / 503 responses pass through; plan dicts go out as fast JSON,
+    # compressed per Accept-Encoding. Serializing + compressing a large plan
+    # takes tens of ms, so it runs in the threadpool, not on the event loop.
+    if not isinstance(result, dict):
+        return result
+    return await run_in_threadpool(
+        encoded_response, result, request.headers.get("accept-encoding"), 200, headers
+    )
+
+
+def result_status(result):
+    if isinstance(result, JSONResponse):
+        return "rejected" if result.status_code == 503 else "error"
+    if isinstance(result, dict):
+        return result.get("status", "error")
+    return "success"  # a stream that has started
+
+
+app = FastAPI(title="SortED Study Planner API v2 (Topic Range Ready)", lifespan=lifespan)
 
 
 # ------------------------------
 # ENDPOINT
 # ------------------------------
 @app.post("/generate_study_plan")
-def generate_study_plan(data: FullPlanInput):
+async def generate_study_plan(data: FullPlanInput, request: Request,
+                              plan_format: Literal["verbose", "compact"] = PlanFormat):
+    t0 = time.perf_counter()
+    status = "exception"
+    try:
+        compact = plan_format == "compact"
+        headers = {}
+        # X-Profile: 1 (admin) -> trace this one request, id in X-Profile-Id
+        if request.headers.get("X-Profile") and is_admin(request):
+            result = await offload(profiler.run_traced, generate_single, data, compact)
+            if isinstance(result, tuple):
+                result, profile_id = result
+                headers["X-Profile-Id"] = profile_id
+        else:
+            result = await offload(generate_single, data, compact)
+        status = result_status(result)
+        return await encode(result, request, headers)
+    finally:
+        metrics.observe_request("generate_study_plan", time.perf_counter() - t0)
+        metrics.count_request("generate_study_plan", *metric_labels(data.subject, data.study_mode, data.syllabus), status)
+        profiler.note_request()
 
-    # FEATURE CALCULATIONS
-    past_mean = np.mean(data.past_marks) if data.past_marks else 0
-    past_std = np.std(data.past_marks) if data.past_marks else 0
 
-    quiz_mean = np.mean(data.quiz_scores) if data.quiz_scores else 0
-    quiz_std = np.std(data.quiz_scores) if data.quiz_scores else 0
+# ------------------------------
+# BATCH ENDPOINT
+# ------------------------------
+@app.post("/generate_study_plans/batch")
+async def generate_study_plans_batch(batch: list[FullPlanInput], request: Request,
+                                     plan_format: Literal["verbose", "compact"] = PlanFormat):
+    t0 = time.perf_counter()
+    statuses = ["exception"] * len(batch)
+    try:
+        result = await offload(generate_batch, batch, plan_format == "compact")
+        if isinstance(result, dict):
+            statuses = [item["status"] for item in result["results"]]
+        else:
+            statuses = [result_status(result)] * len(batch)
+        return await encode(result, request)
+    finally:
+        metrics.observe_request("batch", time.perf_counter() - t0)
+        for data, status in zip(batch, statuses):
+            metrics.count_request("batch", *metric_labels(data.subject, data.study_mode, data.syllabus), status)
 
-    improvement_slope = (
-        (data.past_marks[-1] - data.past_marks[0]) / len(data.past_marks)
-        if len(data.past_marks) > 1 else 0
-    )
 
-    discipline_score = (
-        0.4 * data.attendance +
-        0.4 * data.assignment_rate +
-        0.2 * (data.events_participation / 10)
-    )
+# ------------------------------
+# MULTI-SUBJECT ENDPOINT (one plan, shared daily budget)
+# ------------------------------
+@app.post("/generate_study_plan/multi")
+async def generate_study_plan_multi(data: MultiSubjectPlanInput, request: Request):
+    t0 = time.perf_counter()
+    status = "exception"
+    try:
+        result = await offload(generate_multi, data)
+        status = result_status(result)
+        return await encode(result, request)
+    finally:
+        metrics.observe_request("multi", time.perf_counter() - t0)
+        for item in data.subjects:
+            metrics.count_request("multi", *metric_labels(item.subject, data.study_mode, data.syllabus), status)
+
+
+# ------------------------------
+# RE-PLAN ENDPOINT (plan token + progress -> patch)
+# ------------------------------
+# No model calls: speed and weakness travel in the token. The response
+# only lists days, revision dates and weeks that changed (null = removed),
+# plus the token for the next re-plan.
+@app.post("/replan_study_plan")
+async def replan_study_plan(data: ReplanInput, request: Request):
+    t0 = time.perf_counter()
+    status = "exception"
+    result = None
+    try:
+        result = await offload(replan_single, data)
+        status = result_status(result)
+        return await encode(result, request)
+    finally:
+        metrics.observe_request("replan", time.perf_counter() - t0)
+        done = isinstance(result, dict) and result.get("status") == "success"
+        subject, syllabus = (result["subject_used"], result["syllabus_used"]) if done else ("unknown", None)
+        metrics.count_request("replan", *metric_labels(subject, "other", syllabus), status)
+
+
+# ------------------------------
+# STREAMING ENDPOINT (NDJSON, one event per line)
+# ------------------------------
+# Scoring runs in the threadpool; the plan is then generated day by day
+# while the response is written. Process pools can't hand back a
+# generator, so this endpoint always runs in this worker.
+@app.post("/generate_study_plan/stream")
+async def generate_study_plan_stream(data: FullPlanInput):
+    t0 = time.perf_counter()
+    status = "exception"
+    try:
+        result = await run_in_threadpool(stream_single, data)
+        status = result_status(result)
+        if isinstance(result, dict):
+            return result
+        return StreamingResponse(result, media_type="application/x-ndjson")
+    finally:
+        # time to first byte; the body is generated while it is sent
+        metrics.observe_request("stream", time.perf_counter() - t0)
+        metrics.count_request("stream", *metric_labels(data.subject, data.study_mode, data.syllabus), status)
+
+
+# ------------------------------
+# STORED PLANS (PLAN_STORE_URL; conditional GET)
+# ------------------------------
+# GET /plans/{id}                  the response POST /generate_study_plan gave
+# GET /plans/{id}/day/YYYY-MM-DD   {"plan_id", "date", "topics", "message", "revision"}
+#
+# Both carry an ETag; a request whose If-None-Match matches gets a 304
+# from one etag lookup. Stored bytes are sent as they are (compressed
+# per Accept-Encoding).
+def not_found(message):
+    return JSONResponse(status_code=404, content={"status": "error", "message": message})
+
+
+def stored_plan_response(request, etag, fetch):
+    if etag is None:
+        return not_found("Plan not found")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        PLAN_STORE.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    row = fetch()
+    if row is None:   # expired between the two reads
+        return not_found("Plan not found")
+    body, headers["ETag"] = row
+    return encoded_body(body, request.headers.get("accept-encoding"), headers=headers)
+
+
+@app.get("/plans/{plan_id}")
+def get_plan(plan_id: str, request: Request):
+    if PLAN_STORE is None:
+        return not_found("Plan storage is off")
+    return stored_plan_response(request, PLAN_STORE.etag(plan_id),
+                                lambda: PLAN_STORE.get(plan_id))
+
+
+@app.get("/plans/{plan_id}/day/{day}")
+def get_plan_day(plan_id: str, day: str, request: Request):
+    if PLAN_STORE is None:
+        return not_found("Plan storage is off")
+    try:
+        day = str(date.fromisoformat(day))
+    except ValueError:
+        return JSONResponse(status_code=422, content={
+            "status": "error", "message": "Expected a date as YYYY-MM-DD"
+        })
+    return stored_plan_response(request, PLAN_STORE.day_etag(plan_id, day),
+                                lambda: PLAN_STORE.get_day(plan_id, day))
+
+
+# ------------------------------
+# MODEL ROLLOUT (admin; versioned registry, see model_registry.py)
+# ------------------------------
+# POST /admin/models/load?model_dir=v2&shadow=0.05   load + validate in the
+#                                                    background, shadow 5%
+# POST /admin/models/promote | rollback | discard
+# POST /admin/models/shadow?fraction=0.1
+# Candidate directories must sit under SPDM_MODEL_ROOT (default: the
+# working directory); they hold the spdm_*.pkl files and, ideally, a
+# fresh spdm_compiled.npz. Like syllabus reloads, these act on this
+# worker process only. With PLANNER_EXECUTION=process the pool processes
+# score with registries of their own, which these calls can't reach, so
+# they answer 409 there (a rollout then means restarting the pool).
+MODEL_ROOT = os.path.realpath(os.environ.get("SPDM_MODEL_ROOT", "."))
+
+
+def model_conflict(message):
+    return JSONResponse(status_code=409, content={"status": "error", "message": message})
+
+
+def rollout_refused(request):
+    """-> an error response when this process can't change the served models."""
+    if not is_admin(request):
+        return admin_forbidden()
+    if EXECUTION_MODE == "process":
+        return model_conflict("Model rollout is unavailable with PLANNER_EXECUTION=process")
+    return None
+
+
+@app.get("/models")
+def model_status():
+    return {**registry.status(), "shadow_scoring": SHADOW.stats(),
+            "rollout": EXECUTION_MODE != "process"}
+
+
+@app.post("/admin/models/load")
+def load_models(request: Request, model_dir: str | None = None, shadow: float | None = None,
+                promote: bool = False):
+    refused = rollout_refused(request)
+    if refused is not None:
+        return refused
+    if shadow is not None and not 0 <= shadow <= 1:
+        return JSONResponse(status_code=422, content={
+            "status": "error", "message": "shadow must be between 0 and 1"
+        })
+    if model_dir is not None:
+        model_dir = os.path.realpath(os.path.join(MODEL_ROOT, model_dir))
+        if os.path.commonpath([model_dir, MODEL_ROOT]) != MODEL_ROOT or not os.path.isdir(model_dir):
+            return not_found("Model directory not found")
+
+    if not registry.load_candidate(model_dir, shadow_fraction=shadow, promote=promote):
+        return model_conflict("A model set is already loading")
+    return JSONResponse(status_code=202, content=registry.status())
+
+
+@app.post("/admin/models/promote")
+def promote_models(request: Request):
+    refused = rollout_refused(request)
+    if refused is not None:
+        return refused
+    if registry.promote() is None:
+        return model_conflict("No candidate to promote")
+    return registry.status()
+
+
+@app.post("/admin/models/rollback")
+def rollback_models(request: Request):
+    refused = rollout_refused(request)
+    if refused is not None:
+        return refused
+    if registry.rollback() is None:
+        return model_conflict("No previous version to roll back to")
+    return registry.status()
+
+
+@app.post("/admin/models/discard")
+def discard_models(request: Request):
+    refused = rollout_refused(request)
+    if refused is not None:
+        return refused
+    if registry.discard_candidate() is None:
+        return model_conflict("No candidate to discard")
+    return registry.status()
+
+
+@app.post("/admin/models/shadow")
+def shadow_fraction(request: Request, fraction: float):
+    refused = rollout_refused(request)
+    if refused is not None:
+        return refused
+    if not 0 <= fraction <= 1:
+        return JSONResponse(status_code=422, content={
+            "status": "error", "message": "fraction must be between 0 and 1"
+        })
+    registry.shadow_fraction = fraction
+    return {**registry.status(), "shadow_scoring": SHADOW.stats()}
+
+
+# ------------------------------
+# SYLLABI (hot reload)
+# ------------------------------
+# Changed source files are picked up on their own within
+# PLANNER_SYLLABUS_CHECK_SECONDS; the admin endpoint forces a check now.
+# Both act on this worker process; pool processes check on their own.
+@app.get("/syllabi")
+def syllabi_status():
+    return SYLLABI.status()
+
+
+@app.post("/admin/syllabi/reload")
+def reload_syllabi(request: Request):
+    if not is_admin(request):
+        return admin_forbidden()
+    reloaded = SYLLABI.reload()
+    return {"reloaded": reloaded, "syllabi": SYLLABI.status()}
+
+
+@app.get("/executor")
+def executor_stats():
+    if EXECUTOR is None:
+        return {"mode": "sync"}
+    return EXECUTOR.stats()
+
+
+# ------------------------------
+# REQUEST COALESCING (planner_service.COALESCER)
+# ------------------------------
+# GET /batching: batch-size histogram, dedup rates. The admin endpoint
+# retunes this worker's window / batch cap without a restart.
+@app.get("/batching")
+def batching_status():
+    return batching_stats()
+
+
+@app.post("/admin/batching")
+def tune_batching(request: Request, window_ms: float | None = None, max_batch: int | None = None):
+    if not is_admin(request):
+        return admin_forbidden()
+    if COALESCER is None:
+        return JSONResponse(status_code=409, content={
+            "status": "error", "message": "Batching is off (PLANNER_BATCHING=off)"
+        })
+    COALESCER.configure(window_ms=window_ms, max_batch=max_batch)
+    return batching_stats()
+
+
+# ------------------------------
+# PROMETHEUS METRICS (PLANNER_METRICS=off disables)
+# ------------------------------
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# ------------------------------
+# PROFILING (admin)
+# ------------------------------
+# POST /admin/profile?seconds=10          sample every thread for 10s
+# POST /admin/profile?requests=200        ... until 200 plan requests finished
+# GET  /admin/profile                     current / last session
+# GET  /admin/profile/{id}                collapsed stacks (flamegraph.pl, speedscope)
+@app.post("/admin/profile")
+def start_profile(request: Request, seconds: float = 10.0, requests: int = 0,
+                  interval_ms: float = 5.0):
+    if not is_admin(request):
+        return admin_forbidden()
+
+    # a request-count session still stops at the seconds cap
+    seconds = min(max(seconds, 0.1), 600.0)
+    session = profiler.start_session(seconds, max(requests, 0), max(interval_ms, 1.0) / 1000)
+    if session is None:
+        return JSONResponse(status_code=409, content={
+            "status": "error", "message": "A profiling session is already running"
+        })
+    return session.status()
+
+
+@app.get("/admin/profile")
+def profile_status(request: Request):
+    if not is_admin(request):
+        return admin_forbidden()
+    if profiler.SESSION is None:
+        return {"status": "idle"}
+    return profiler.SESSION.status()
+
+
+@app.get("/admin/profile/{profile_id}")
+def profile_output(profile_id: str, request: Request):
+    if not is_admin(request):
+        return admin_forbidden()
+    text = profiler.read_profile(profile_id)
+    if text is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Profile not found"})
+    return PlainTextResponse(text)
 
-    X = pd.DataFrame([[
-        data.marks, past_mean, past_std,
-        quiz_mean, quiz_std,
-        data.attendance, data.assignment_rate, data.events_participation,
-        data.cluster_id, improvement_slope, discipline_score
-    ]], columns=features)
-
-    weakness_score = float(weakness_model.predict(X)[0])
-    speed_category = int(speed_model.predict(X)[0])
-    predicted_slope = float(slope_model.predict(X)[0])
-
-    # SUBJECT MAPS
-    sub = None
-    for key in SYLLABUS.keys():
-        if key.lower() == data.subject.lower():
-            sub = key
-            break
-
-    if not sub:
-        return {"status": "error", "message": "Subject not found in syllabus"}
-
-    weakness_map = {sub: weakness_score}
-    speed_map = {sub: speed_category}
-
-    # GENERATE PLAN
-    plan = generate_realistic_plan_v2(
-        syllabus_json=SYLLABUS,
-        weakness_map=weakness_map,
-        speed_map=speed_map,
-        study_mode=data.study_mode,
-        exam_date=data.exam_date,
-        discipline_score=discipline_score,
-        subject=sub,
-        start_topic=data.start_topic,
-        end_topic=data.end_topic
-    )
 
+@app.get("/cache")
+def cache_stats():
     return {
-        "status": "success",
-        "analysis": {
-            "weakness_score": weakness_score,
-            "learning_speed_category": speed_category,
-            "predicted_improvement_slope": predicted_slope,
-            "discipline_score": discipline_score
-        },
-        "plan": plan
+        "skeletons": SKELETON_CACHE.stats(),
+        "predictions": PREDICTION_CACHE.stats() if PREDICTION_CACHE else None,
+        "plans": PLAN_STORE.stats() if PLAN_STORE else None
     }
 
 
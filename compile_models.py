@@ -0,0 +1,191 @@
+import sys
+import joblib
+import numpy as np
+
+from fused_predictor import (
+    FusedPredictor, file_sha256, MODEL_FILES, COMPILED_FILE,
+    MISSING_NONE, MISSING_ZERO, MISSING_NAN,
+    SLOT_WEAKNESS, SLOT_SLOPE, SLOT_SPEED,
+)
+
+
+# ---------------------------------------------------
+# OFFLINE STEP: PICKLES -> spdm_compiled.npz
+# ---------------------------------------------------
+# Usage: python compile_models.py
+# Re-run whenever any spdm_*.pkl changes. The API only uses the compiled
+# file while its recorded pickle hashes still match.
+
+FEATURES_FILE = "spdm_features.pkl"
+
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+IDENTITY_OBJECTIVES = ("regression", "regression_l1", "huber", "fair", "quantile")
+ALL_LEAVES = (1 << 64) - 1
+
+
+def _check_objective(name, dump, multiclass):
+    objective = dump["objective"].split()
+    if multiclass:
+        ok = objective[0] == "multiclass"
+    else:
+        ok = objective[0] in IDENTITY_OBJECTIVES and "sqrt" not in objective
+    if not ok or dump.get("average_output"):
+        raise ValueError(f"{name}: unsupported objective '{dump['objective']}'")
+
+
+def _flatten_tree(root, splits, leaf_values):
+    """Append one tree to the split and leaf tables (pre-order, left first)."""
+    first_leaf = len(leaf_values)
+
+    def add(node):
+        if "leaf_value" in node:
+            leaf_values.append(node["leaf_value"])
+            return ~(len(leaf_values) - 1)
+
+        if node["decision_type"] != "<=":
+            raise ValueError(f"unsupported split type {node['decision_type']}")
+
+        idx = len(splits["feature"])
+        splits["feature"].append(node["split_feature"])
+        splits["threshold"].append(node["threshold"])
+        splits["default_left"].append(node["default_left"])
+        splits["missing_type"].append(MISSING_TYPES[node["missing_type"]])
+        splits["left"].append(0)
+        splits["right"].append(0)
+        splits["leaf_mask"].append(0)
+
+        lo = len(leaf_values) - first_leaf
+        splits["left"][idx] = add(node["left_child"])
+        hi = len(leaf_values) - first_leaf
+        splits["right"][idx] = add(node["right_child"])
+
+        # going right rules out every leaf of the left subtree
+        splits["leaf_mask"][idx] = ALL_LEAVES & ~(((1 << hi) - 1) ^ ((1 << lo) - 1))
+        return idx
+
+    tree_start = len(splits["feature"])
+    add(root)
+
+    n_leaves = len(leaf_values) - first_leaf
+    if n_leaves > 64:
+        raise ValueError(f"tree has {n_leaves} leaves; the fused format supports 64")
+
+    if len(splits["feature"]) == tree_start:
+        # single-leaf tree: a split that never goes right keeps reduceat simple
+        for key, value in (("feature", 0), ("threshold", np.inf),
+                           ("default_left", True), ("missing_type", MISSING_NONE),
+                           ("left", ~first_leaf), ("right", ~first_leaf),
+                           ("leaf_mask", ALL_LEAVES)):
+            splits[key].append(value)
+
+    return tree_start, first_leaf
+
+
+def compile_models(weakness_model, slope_model, speed_model, features, source_hashes):
+    features = list(features)
+    splits = {k: [] for k in ("feature", "threshold", "default_left", "missing_type",
+                              "left", "right", "leaf_mask")}
+    leaf_values = []
+    tree_start, leaf_offset, tree_slot = [], [], []
+
+    # (slot, tree) pairs; multiclass trees are interleaved per iteration
+    trees = []
+    for name, model, multiclass, slot in (
+        ("weakness", weakness_model, False, SLOT_WEAKNESS),
+        ("slope", slope_model, False, SLOT_SLOPE),
+        ("speed", speed_model, True, SLOT_SPEED),
+    ):
+        dump = model.booster_.dump_model()
+        _check_objective(name, dump, multiclass)
+        if dump["feature_names"] != features:
+            raise ValueError(f"{name} model feature order does not match {FEATURES_FILE}")
+
+        per_iter = dump["num_tree_per_iteration"]
+        for tree in dump["tree_info"]:
+            trees.append((slot + tree["tree_index"] % per_iter, tree["tree_structure"]))
+
+    # group by output slot; the stable sort keeps boosting order inside a slot
+    for slot, root in sorted(trees, key=lambda t: t[0]):
+        start, offset = _flatten_tree(root, splits, leaf_values)
+        tree_start.append(start)
+        leaf_offset.append(offset)
+        tree_slot.append(slot)
+
+    return {
+        "features": np.array(features),
+        "speed_classes": np.asarray(speed_model.classes_),
+        "feature": np.array(splits["feature"], dtype=np.intp),
+        "threshold": np.array(splits["threshold"], dtype=np.float64),
+        "default_left": np.array(splits["default_left"], dtype=bool),
+        "missing_type": np.array(splits["missing_type"], dtype=np.int8),
+        "left": np.array(splits["left"], dtype=np.int32),
+        "right": np.array(splits["right"], dtype=np.int32),
+        "leaf_mask": np.array(splits["leaf_mask"], dtype=np.uint64),
+        "tree_start": np.array(tree_start, dtype=np.intp),
+        "leaf_value": np.array(leaf_values, dtype=np.float64),
+        "leaf_offset": np.array(leaf_offset, dtype=np.intp),
+        "tree_slot": np.array(tree_slot, dtype=np.int32),
+        "source_hashes": np.array(source_hashes),
+    }
+
+
+# ---------------------------------------------------
+# PARITY CHECK AGAINST THE PICKLES
+# ---------------------------------------------------
+def parity_check(fused, weakness_model, slope_model, speed_model, n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(0, 100, n_rows),       # marks
+        rng.uniform(0, 100, n_rows),       # past_mean
+        rng.uniform(0, 25, n_rows),        # past_std
+        rng.uniform(0, 10, n_rows),        # quiz_mean
+        rng.uniform(0, 4, n_rows),         # quiz_std
+        rng.uniform(0, 1, n_rows),         # attendance
+        rng.uniform(0, 1, n_rows),         # assignment_rate
+        rng.integers(0, 10, n_rows),       # events_participation
+        rng.integers(0, 5, n_rows),        # cluster_id
+        rng.uniform(-10, 10, n_rows),      # improvement_slope
+        rng.uniform(0, 1, n_rows),         # discipline_score
+    ])
+    # values sitting exactly on split thresholds are where traversal bugs show up
+    on_split = n_rows // 4
+    for f in range(X.shape[1]):
+        thresholds = fused.threshold[(fused.feature == f) & np.isfinite(fused.threshold)]
+        if len(thresholds):
+            X[:on_split, f] = rng.choice(thresholds, on_split)
+
+    weakness, speed, slope = fused.predict_matrix(X)
+    ref_weakness = weakness_model.booster_.predict(X)
+    ref_slope = slope_model.booster_.predict(X)
+    ref_speed = speed_model.classes_[np.argmax(speed_model.booster_.predict(X), axis=1)]
+
+    return {
+        "rows": n_rows,
+        "weakness_max_abs_diff": float(np.max(np.abs(weakness - ref_weakness))),
+        "slope_max_abs_diff": float(np.max(np.abs(slope - ref_slope))),
+        "speed_mismatches": int(np.sum(speed != ref_speed)),
+    }
+
+
+if __name__ == "__main__":
+    weakness_model, slope_model, speed_model = (joblib.load(p) for p in MODEL_FILES)
+    features = joblib.load(FEATURES_FILE)
+
+    arrays = compile_models(
+        weakness_model, slope_model, speed_model, features,
+        [file_sha256(p) for p in MODEL_FILES]
+    )
+    np.savez(COMPILED_FILE, **arrays)
+
+    fused = FusedPredictor.load(COMPILED_FILE)
+    report = parity_check(fused, weakness_model, slope_model, speed_model)
+    print(f"wrote {COMPILED_FILE}: {len(arrays['tree_start'])} trees, "
+          f"{len(arrays['feature'])} splits, {len(arrays['leaf_value'])} leaves")
+    print(report)
+
+    tolerance = 1e-9
+    if (report["weakness_max_abs_diff"] > tolerance
+            or report["slope_max_abs_diff"] > tolerance
+            or report["speed_mismatches"]):
+        sys.exit("parity check FAILED")
+    print("parity OK")
@@ -398,9 +398,18 @@
 
 
 import json
+import math
 from datetime import datetime, timedelta
 import random
 
+import numpy as np
+
+from metrics import count_dropped_revisions, span
+from plan_cache import skeleton_key
+from availability import AvailabilityCalendar
+from revision import RevisionScheduler
+from syllabus_index import SyllabusIndex, DIFFICULTY_CODES
+
 
 # ---------------------------------------------------
 # DAILY LIMIT SETTINGS
@@ -452,6 +461,17 @@ def select_subject(syllabus_json, subject_from_api):
     return list(syllabus_json.keys())[0]  # fallback
 
 
+# ---------------------------------------------------
+# PLAN WINDOW (exam already passed -> 45 days)
+# ---------------------------------------------------
+def plan_window(exam_date):
+    today = datetime.now().date()
+    exam = datetime.strptime(exam_date, "%Y-%m-%d").date()
+    if exam <= today:
+        exam = today + timedelta(days=45)
+    return today, exam, (exam - today).days
+
+
 # ---------------------------------------------------
 # MAIN ENGINE — now supports topic slicing
 # ---------------------------------------------------
@@ -464,71 +484,43 @@ def generate_realistic_plan_v2(
     discipline_score,
     subject,
     start_topic=None,
-    end_topic=None
+    end_topic=None,
+    index=None
 ):
 
-    today = datetime.now().date()
-    exam = datetime.strptime(exam_date, "%Y-%m-%d").date()
-    if exam <= today:
-        exam = today + timedelta(days=45)
-
-    days_left = (exam - today).days
+    today, exam, days_left = plan_window(exam_date)
     limits = DAILY_LIMITS[study_mode]
     time_budget = limits["time"]
 
-    subject_key = select_subject(syllabus_json, subject)
-    syllabus = syllabus_json[subject_key]
+    # prebuilt SyllabusIndex from the caller, or a throwaway one
+    if index is None:
+        index = SyllabusIndex(syllabus_json)
 
-    # ---------------------------------------------------
-    # 1. FLATTEN SYLLABUS INTO ORDERED TOPIC LIST
-    # ---------------------------------------------------
-    flat_topics = []
-    for chapter, topics in syllabus.items():
-        for t in topics:
-            flat_topics.append({
-                "chapter": chapter,
-                "topic": t["topic"],
-                "difficulty": t["difficulty"],
-                "estimated_time": t["estimated_time"]
-            })
+    subject_key = index.select_subject(subject)
+    sub_index = index.subjects[subject_key]
 
     # ---------------------------------------------------
-    # 2. TOPIC-RANGE SELECTION (OPTIONAL)
+    # 1+2. TOPIC-RANGE SELECTION (OPTIONAL) — O(1) lookups in the index
     # ---------------------------------------------------
-    if start_topic and end_topic:
-        start_topic = start_topic.lower().strip()
-        end_topic = end_topic.lower().strip()
-
-        start_idx = next((i for i, t in enumerate(flat_topics)
-                          if t["topic"].lower() == start_topic), None)
-
-        end_idx = next((i for i, t in enumerate(flat_topics)
-                        if t["topic"].lower() == end_topic), None)
-
-        if start_idx is None or end_idx is None:
-            raise ValueError("Invalid start_topic or end_topic")
-
-        if end_idx < start_idx:
-            raise ValueError("end_topic cannot come before start_topic")
-
-        flat_topics = flat_topics[start_idx:end_idx + 1]
+    lo, hi = sub_index.topic_range(start_topic, end_topic)
 
     # ---------------------------------------------------
     # 3. BUILD TASK LIST (ONLY SELECTED TOPICS)
     # ---------------------------------------------------
+    speed = speed_map.get(subject_key, 1)
+    weakness = weakness_map.get(subject_key, 0.4)
+
+    chapters = sub_index.chapters
     tasks = []
-    for item in flat_topics:
-        t = adjusted_time(
-            item["estimated_time"],
-            item["difficulty"],
-            speed_map.get(subject_key, 1),
-            weakness_map.get(subject_key, 0.4)
-        )
+    for cid, topic, diff, est in zip(sub_index.chapter_id[lo:hi].tolist(),
+                                     sub_index.topics[lo:hi],
+                                     sub_index.difficulty[lo:hi],
+                                     sub_index.estimated_time[lo:hi].tolist()):
         tasks.append({
-            "chapter": item["chapter"],
-            "topic": item["topic"],
-            "difficulty": item["difficulty"],
-            "time": t
+            "chapter": chapters[cid],
+            "topic": topic,
+            "difficulty": diff,
+            "time": adjusted_time(est, diff, speed, weakness)
         })
 
     # ---------------------------------------------------
@@ -589,41 +581,27 @@ def generate_realistic_plan_v2(
         weekly[wk] = list(dict.fromkeys(weekly[wk]))
 
     # ---------------------------------------------------
-    # 6. REVISION PLAN — works automatically for sliced topics
+    # 6. REVISION PLAN — +1 / +3 / +7 requests, capped per date (revision.py)
     # ---------------------------------------------------
-    revision = {}
+    scheduler = RevisionScheduler(days_left)
+
+    for d, detail in enumerate(plan.values()):
+        if d >= days_left:
+            break  # days from the exam on feed no revision date
 
-    for day, detail in plan.items():
         todays_topics = detail["topics"]
-        if not todays_topics:
-            continue
+        chapters = dict.fromkeys(t["chapter"] for t in todays_topics)
+        scheduler.add_day(
+            d,
+            [t["topic"] for t in todays_topics[-2:]],
+            [t["topic"] for t in todays_topics if t["difficulty"] in ("medium", "hard")],
+            [sub_index.topics[p] for chap in chapters
+             for p in sub_index.key_topics[sub_index.chapter_ids[chap]]]
+        )
 
-        # +1 Day
-        rd1 = day + timedelta(days=1)
-        if rd1 <= exam:
-            revision.setdefault(rd1, [])
-            revision[rd1].extend([t["topic"] for t in todays_topics[-2:]])
-
-        # +3 Day
-        rd3 = day + timedelta(days=3)
-        if rd3 <= exam:
-            revision.setdefault(rd3, [])
-            revision[rd3].extend([
-                t["topic"] for t in todays_topics
-                if t["difficulty"] in ("medium", "hard")
-            ])
-
-        # +7 Day
-        rd7 = day + timedelta(days=7)
-        if rd7 <= exam:
-            revision.setdefault(rd7, [])
-            chapters = list(dict.fromkeys([t["chapter"] for t in todays_topics]))
-            for chap in chapters:
-                key_topics = syllabus[chap][:3]
-                revision[rd7].extend([t["topic"] for t in key_topics])
-
-    for day in revision:
-        revision[day] = revision[day][:5]
+    revision = {
+        today + timedelta(days=r): topics for r, topics in scheduler.schedule(1).items()
+    }
 
     # ---------------------------------------------------
     # RETURN RESULT
@@ -636,3 +614,1116 @@ def generate_realistic_plan_v2(
         "revision_plan": {str(day): revision[day] for day in revision},
         "weekly_overview": weekly
     }
+
+
+# ---------------------------------------------------
+# NUMPY ENGINE — same plans, array-backed
+# ---------------------------------------------------
+# generate_realistic_plan_fast() returns exactly what generate_realistic_plan_v2()
+# returns (same random.choice() sequence for messages). Work is done on
+# syllabus positions and day offsets; dicts and dates are only built in
+# render_plan(), so a cached skeleton (plan_cache.SkeletonCache) can be
+# re-anchored per request. A topic that can never fit into an empty day raises
+# ValueError instead of looping forever (e.g. hard topics in "light").
+def adjusted_times(base, speed, weakness):
+    t = np.asarray(base, dtype=np.float64)
+    if speed == 0:
+        t = t * 1.3
+    if speed == 2:
+        t = t * 0.8
+    if weakness > 0.6:
+        t = t * 1.2
+    return np.round(t).astype(np.int64)
+
+
+def check_packable(codes, times, limits):
+    """ValueError up front for any topic that could never be placed."""
+    if (codes < 0).any():
+        raise ValueError("Unknown topic difficulty in syllabus")
+
+    caps = np.array([limits["easy"], limits["medium"], limits["hard"]])
+    if len(codes) and (limits["max_topics"] < 1 or (caps[codes] < 1).any()
+                       or (times > limits["time"]).any()):
+        raise ValueError("Topic does not fit into a single study day for this study_mode")
+
+
+def iter_day_bounds(codes, times, limits, budgets=None):
+    """Greedy step-4 packing, one (start, stop) task slice per day.
+
+    budgets: an iterator of per-day minutes replacing limits["time"]; a day
+    too short for the next task is left empty.
+    """
+    caps = [limits["easy"], limits["medium"], limits["hard"]]
+    max_topics = limits["max_topics"]
+    time_budget = limits["time"] if budgets is None else next(budgets)
+
+    start = n_topics = spent = 0
+    used = [0, 0, 0]
+
+    for i, (code, t) in enumerate(zip(codes.tolist(), times.tolist())):
+        if code < 0:
+            raise ValueError("Unknown topic difficulty in syllabus")
+
+        if not (n_topics < max_topics and used[code] < caps[code]
+                and spent + t <= time_budget):
+            if n_topics:
+                yield start, i
+                start = i
+                n_topics = spent = 0
+                used = [0, 0, 0]
+                if budgets is not None:
+                    time_budget = next(budgets)
+
+            # the task opens a day: it has to fit an empty one
+            if max_topics < 1 or caps[code] < 1 or (budgets is None and t > time_budget):
+                raise ValueError("Topic does not fit into a single study day for this study_mode")
+            if budgets is not None:
+                while t > time_budget:
+                    yield i, i
+                    time_budget = next(budgets)
+
+        used[code] += 1
+        n_topics += 1
+        spent += t
+
+    if n_topics:
+        yield start, len(codes)
+
+
+# ---------------------------------------------------
+# DEADLINE-AWARE PACKING (packing="deadline")
+# ---------------------------------------------------
+# The greedy packer above closes a day as soon as the next task breaks a
+# cap, so a run of medium topics leaves half-empty days and the plan can
+# run past the exam. With packing="deadline":
+#
+#   1. the greedy plan is kept whenever it fits before the exam (full
+#      syllabus order);
+#   2. otherwise iter_day_slots() tops each day up with later tasks from a
+#      window of PACK_LOOKAHEAD that still fit its caps. Topics of one
+#      chapter stay in syllabus order (a task that does not fit holds back
+#      the rest of its chapter for that day), the oldest waiting task
+#      opens every day, and no task is pulled more than PACK_LOOKAHEAD
+#      places ahead. O(n * PACK_LOOKAHEAD); kept only if it is shorter.
+#
+# plan_verdict() checks a plan against the exam without building it:
+# days_lower_bound() (topic, minute and per-difficulty counts against the
+# caps) rules modes out in O(1), then days are counted with the packer
+# for the requested mode and, lightest first, until one fits.
+PACKING_MODES = ("greedy", "deadline")
+PACK_LOOKAHEAD = 16
+
+
+def iter_day_slots(codes, times, chapter_id, limits, window=PACK_LOOKAHEAD, budgets=None):
+    """Lookahead packing, one list of task indices per day (budgets: as iter_day_bounds)."""
+    caps = [limits["easy"], limits["medium"], limits["hard"]]
+    max_topics = limits["max_topics"]
+    time_budget = limits["time"]
+    codes, times, chapter_id = codes.tolist(), times.tolist(), chapter_id.tolist()
+
+    waiting = []   # task indices not placed yet, in syllabus order
+    next_task = 0
+    while waiting or next_task < len(codes):
+        while len(waiting) < window and next_task < len(codes):
+            waiting.append(next_task)
+            next_task += 1
+        if budgets is not None:
+            time_budget = next(budgets)
+
+        day, held, held_chapters = [], [], set()
+        used = [0, 0, 0]
+        spent = 0
+        for i in waiting:
+            code, t = codes[i], times[i]
+            if (len(day) < max_topics and chapter_id[i] not in held_chapters
+                    and used[code] < caps[code] and spent + t <= time_budget):
+                day.append(i)
+                used[code] += 1
+                spent += t
+            else:
+                held.append(i)
+                held_chapters.add(chapter_id[i])
+
+        if not day and budgets is None:
+            raise ValueError("Topic does not fit into a single study day for this study_mode")
+        waiting = held
+        yield day
+
+
+# ---------------------------------------------------
+# AVAILABILITY (availability.AvailabilityCalendar)
+# ---------------------------------------------------
+# With a calendar the packers above take each open day's minutes as its
+# time budget (caps per difficulty still come from the study_mode), and
+# iter_calendar_days() spreads the packed study days over the calendar:
+# closed days become empty days. Plans keep one slice per calendar day,
+# so offsets, weeks, revision dates and plan tokens work unchanged; the
+# renderers skip empty days. Without a calendar no day is ever empty.
+def iter_calendar_days(days, calendar, first=0):
+    """Study-day (start, stop) slices -> one slice per calendar day from `first`."""
+    offset = first
+    for (start, stop), open_offset in zip(days, calendar.open_offsets(first)):
+        while offset < open_offset:
+            yield start, start
+            offset += 1
+        yield start, stop
+        offset += 1
+
+
+def pack_days(codes, times, chapter_id, limits, days_left, packing="greedy",
+              calendar=None, first=0):
+    """-> (order, bounds): task order (None = as given) and day boundaries into it.
+
+    With a calendar, bounds cover every calendar day from offset `first`
+    and days_left counts from there too.
+    """
+    if packing not in PACKING_MODES:
+        raise ValueError(f"Unknown packing: {packing}")
+
+    if calendar is None:
+        bounds = [0] + [stop for _, stop in iter_day_bounds(codes, times, limits)]
+    else:
+        check_packable(codes, times, calendar.packing_limits(limits))
+        days = iter_day_bounds(codes, times, limits, calendar.budgets(first))
+        bounds = [0] + [stop for _, stop in iter_calendar_days(days, calendar, first)]
+    if packing == "greedy" or len(bounds) - 1 <= days_left:
+        return None, bounds
+
+    check_packable(codes, times, limits if calendar is None else calendar.packing_limits(limits))
+    days = list(iter_day_slots(codes, times, chapter_id, limits,
+                               budgets=calendar and calendar.budgets(first)))
+    ends = np.cumsum([len(day) for day in days]).tolist()
+    slices = zip([0] + ends, ends)
+    if calendar is not None:
+        slices = iter_calendar_days(slices, calendar, first)
+    packed = [0] + [stop for _, stop in slices]
+    if len(packed) >= len(bounds):
+        return None, bounds
+    return np.array([i for day in days for i in day], dtype=np.int64), packed
+
+
+def days_lower_bound(codes, times, limits, time_cap=None):
+    """Fewest (study) days any packing could take; None if a topic can never be placed.
+
+    time_cap: the most minutes any day can have, when it is not limits["time"].
+    """
+    try:
+        check_packable(codes, times, limits)
+    except ValueError:
+        return None
+    if not len(codes):
+        return 0
+
+    counts = np.bincount(codes, minlength=3)
+    need = [len(codes) / limits["max_topics"], int(times.sum()) / (time_cap or limits["time"])]
+    for code, name in enumerate(("easy", "medium", "hard")):
+        if counts[code]:
+            need.append(counts[code] / limits[name])
+    return math.ceil(max(need))
+
+
+def count_days(codes, times, chapter_id, limits, days_left, packing, calendar=None):
+    check = limits if calendar is None else calendar.packing_limits(limits)
+    if days_lower_bound(codes, times, check) is None:
+        return None
+    return len(pack_days(codes, times, chapter_id, limits, days_left, packing, calendar)[1]) - 1
+
+
+def plan_verdict(codes, times, chapter_id, study_mode, days_left, packing, days_needed=None,
+                 calendar=None):
+    """-> {"fits", "days_needed", "days_left", "minimum_mode"} without building a plan.
+
+    days_needed: the requested mode's day count, when the caller has it
+    already. minimum_mode is the lightest study_mode that fits (None if
+    none does). With a calendar days are calendar days (closed ones
+    included) and the lower bound is checked against the open days left.
+    """
+    if days_needed is None:
+        days_needed = count_days(codes, times, chapter_id, DAILY_LIMITS[study_mode],
+                                 days_left, packing, calendar)
+    fits = days_needed is not None and days_needed <= days_left
+
+    open_left, time_cap = days_left, None
+    if calendar is not None:
+        open_left, time_cap = calendar.count_open(0, days_left), calendar.max_minutes
+
+    minimum_mode = None
+    for mode, limits in DAILY_LIMITS.items():
+        if mode == study_mode:
+            days = days_needed
+        else:
+            check = limits if calendar is None else calendar.packing_limits(limits)
+            bound = days_lower_bound(codes, times, check, time_cap)
+            if bound is None or bound > open_left:
+                continue
+            try:
+                days = count_days(codes, times, chapter_id, limits, days_left, packing, calendar)
+            except ValueError:   # fits an override day, but no recurring one
+                days = None
+        if days is not None and days <= days_left:
+            minimum_mode = mode
+            break
+
+    return {
+        "fits": fits,
+        "days_needed": days_needed,
+        "days_left": days_left,
+        "minimum_mode": minimum_mode,
+    }
+
+
+def build_skeleton(sub_index, lo, hi, speed, weakness, limits, days_left,
+                   study_mode=None, packing="greedy", calendar=None):
+    """Date-free schedule: day offsets, weekly chapter ids, revision offsets.
+
+    With study_mode given, "verdict" holds plan_verdict() for it. calendar:
+    an AvailabilityCalendar anchored at today (closed days stay empty).
+    """
+    positions = np.arange(lo, hi)
+    codes = sub_index.difficulty_code[lo:hi]
+    chapter_ids = sub_index.chapter_id[lo:hi]
+
+    with span("engine.task_times"):
+        times = adjusted_times(sub_index.estimated_time[lo:hi], speed, weakness)
+
+    with span("engine.daily_plan"):
+        order, bounds = pack_days(codes, times, chapter_ids, limits, days_left, packing,
+                                  calendar)
+    n_days = len(bounds) - 1
+
+    verdict = None
+    if study_mode is not None:
+        with span("engine.verdict"):
+            verdict = plan_verdict(codes, times, chapter_ids, study_mode, days_left,
+                                   packing, days_needed=n_days, calendar=calendar)
+
+    if order is not None:
+        positions, codes, times, chapter_ids = (
+            positions[order], codes[order], times[order], chapter_ids[order]
+        )
+    position = positions.tolist()
+    chapter_id = chapter_ids.tolist()
+    is_revisable = (codes >= DIFFICULTY_CODES["medium"]).tolist()
+
+    # WEEKLY OVERVIEW — plan days are consecutive from today
+    with span("engine.weekly_overview"):
+        weekly = {}
+        for d in range(n_days):
+            if bounds[d] < bounds[d + 1]:
+                weekly.setdefault(d // 7 + 1, []).extend(chapter_id[bounds[d]:bounds[d + 1]])
+        for wk in weekly:
+            weekly[wk] = list(dict.fromkeys(weekly[wk]))
+
+    # REVISION PLAN (+1 last two, +3 medium/hard, +7 chapter key topics)
+    with span("engine.revision_plan"):
+        scheduler = RevisionScheduler(days_left, calendar=calendar)
+        key_topics = sub_index.key_topics
+        # days from the exam on feed no revision date
+        for d in range(min(n_days, days_left)):
+            start, stop = bounds[d], bounds[d + 1]
+            scheduler.add_day(
+                d,
+                position[max(start, stop - 2):stop],
+                [position[k] for k in range(start, stop) if is_revisable[k]],
+                [p for cid in dict.fromkeys(chapter_id[start:stop]) for p in key_topics[cid]]
+            )
+        revision = scheduler.schedule(1)
+
+    return {
+        "positions": positions,
+        "times": times,
+        "bounds": bounds,
+        "n_days": n_days,
+        "weekly": weekly,
+        "revision": revision,
+        "revisions_dropped": scheduler.dropped,
+        "verdict": verdict,
+    }
+
+
+def render_plan(skeleton, sub_index, subject_key, today, days_left, time_budget, rng=random):
+    topics = sub_index.topics
+    difficulty = sub_index.difficulty
+    chapters = sub_index.chapters
+    chapter_id = sub_index.chapter_id
+
+    positions = skeleton["positions"].tolist()
+    times = skeleton["times"].tolist()
+    chapter_names = [chapters[c] for c in chapter_id[skeleton["positions"]].tolist()]
+    bounds = skeleton["bounds"]
+
+    daily_plan = {}
+    for d in range(skeleton["n_days"]):
+        if bounds[d] == bounds[d + 1]:
+            continue   # a closed day (availability calendar)
+        daily_plan[str(today + timedelta(days=d))] = {
+            "topics": [
+                {
+                    "chapter": chapter_names[k],
+                    "topic": topics[positions[k]],
+                    "difficulty": difficulty[positions[k]],
+                    "time": times[k]
+                }
+                for k in range(bounds[d], bounds[d + 1])
+            ],
+            "message": rng.choice(MOTIVATION)
+        }
+
+    return {
+        "subject_used": subject_key,
+        "days_left": days_left,
+        "daily_minutes": time_budget,
+        "daily_plan": daily_plan,
+        "revision_plan": {
+            str(today + timedelta(days=d)): [topics[p] for p in entries]
+            for d, entries in skeleton["revision"].items()
+        },
+        "weekly_overview": {
+            wk: [chapters[c] for c in cids] for wk, cids in skeleton["weekly"].items()
+        }
+    }
+
+
+# ---------------------------------------------------
+# COMPACT RENDER — same plan, strings sent once
+# ---------------------------------------------------
+# Opt-in wire format. Topics, chapters, difficulties and messages are
+# dictionaries sent once; everything else refers to them by index, and
+# days are offsets from start_date:
+#
+#   topics           [[name, chapter index, difficulty index], ...]
+#   daily_plan       [[day offset, message index, [topic...], [minutes...]], ...]
+#   revision_plan    [[day offset, [topic...]], ...]
+#   weekly_overview  {week: [chapter...]}
+#
+# expand_compact_plan() turns it back into the verbose plan, byte for byte.
+COMPACT_FORMAT = "compact-1"
+
+
+def render_plan_compact(skeleton, sub_index, subject_key, today, days_left, time_budget,
+                        rng=random):
+    positions = skeleton["positions"]
+    bounds = skeleton["bounds"]
+    revision = skeleton["revision"]
+
+    # dictionary: every topic the plan mentions, in syllabus order
+    used = np.unique(np.concatenate(
+        [positions] + [np.asarray(entries, dtype=positions.dtype) for entries in revision.values()]
+    ))
+    topic_ref = np.full(len(sub_index), -1, dtype=np.int64)
+    topic_ref[used] = np.arange(len(used))
+
+    chapter_ids, topic_chapter = np.unique(sub_index.chapter_id[used], return_inverse=True)
+    chapter_ref = dict(zip(chapter_ids.tolist(), range(len(chapter_ids))))
+    difficulties, topic_difficulty = np.unique(
+        [sub_index.difficulty[p] for p in used.tolist()], return_inverse=True
+    )
+
+    tasks = topic_ref[positions].tolist()
+    times = skeleton["times"].tolist()
+    n_messages = len(MOTIVATION)
+
+    return {
+        "format": COMPACT_FORMAT,
+        "subject_used": subject_key,
+        "days_left": days_left,
+        "daily_minutes": time_budget,
+        "start_date": str(today),
+        "chapters": [sub_index.chapters[c] for c in chapter_ids.tolist()],
+        "difficulties": difficulties.tolist(),
+        "messages": MOTIVATION,
+        "topics": [
+            [sub_index.topics[p], c, k]
+            for p, c, k in zip(used.tolist(), topic_chapter.tolist(), topic_difficulty.tolist())
+        ],
+        # randrange(n) draws exactly like random.choice() in render_plan()
+        "daily_plan": [
+            [d, rng.randrange(n_messages),
+             tasks[bounds[d]:bounds[d + 1]], times[bounds[d]:bounds[d + 1]]]
+            for d in range(skeleton["n_days"]) if bounds[d] < bounds[d + 1]
+        ],
+        "revision_plan": [
+            [d, topic_ref[entries].tolist()] for d, entries in revision.items()
+        ],
+        "weekly_overview": {
+            wk: [chapter_ref[c] for c in cids] for wk, cids in skeleton["weekly"].items()
+        }
+    }
+
+
+def expand_compact_plan(plan):
+    """Compact plan -> the verbose plan render_plan() would have returned."""
+    start = datetime.strptime(plan["start_date"], "%Y-%m-%d").date()
+    chapters, difficulties = plan["chapters"], plan["difficulties"]
+    topics = plan["topics"]
+
+    return {
+        "subject_used": plan["subject_used"],
+        "days_left": plan["days_left"],
+        "daily_minutes": plan["daily_minutes"],
+        "daily_plan": {
+            str(start + timedelta(days=d)): {
+                "topics": [
+                    {
+                        "chapter": chapters[topics[t][1]],
+                        "topic": topics[t][0],
+                        "difficulty": difficulties[topics[t][2]],
+                        "time": minutes
+                    }
+                    for t, minutes in zip(refs, times)
+                ],
+                "message": plan["messages"][m]
+            }
+            for d, m, refs, times in plan["daily_plan"]
+        },
+        "revision_plan": {
+            str(start + timedelta(days=d)): [topics[t][0] for t in refs]
+            for d, refs in plan["revision_plan"]
+        },
+        "weekly_overview": {
+            wk: [chapters[c] for c in refs] for wk, refs in plan["weekly_overview"].items()
+        }
+    }
+
+
+def generate_realistic_plan_fast(
+    syllabus_json,
+    weakness_map,
+    speed_map,
+    study_mode,
+    exam_date,
+    discipline_score,
+    subject,
+    start_topic=None,
+    end_topic=None,
+    index=None,
+    skeleton_cache=None,
+    cache_status=None,
+    state_out=None,
+    compact=False,
+    packing="greedy",
+    verdict_out=None,
+    availability=None,
+    seed=None
+):
+
+    today, exam, days_left = plan_window(exam_date)
+    limits = DAILY_LIMITS[study_mode]
+    calendar = (AvailabilityCalendar(availability, today, limits["time"])
+                if availability else None)
+
+    if index is None:
+        index = SyllabusIndex(syllabus_json)
+
+    with span("engine.topic_range"):
+        subject_key = index.select_subject(subject)
+        sub_index = index.subjects[subject_key]
+        lo, hi = sub_index.topic_range(start_topic, end_topic)
+
+    speed = speed_map.get(subject_key, 1)
+    weakness = weakness_map.get(subject_key, 0.4)
+
+    def build():
+        return build_skeleton(sub_index, lo, hi, speed, weakness, limits, days_left,
+                              study_mode, packing, calendar)
+
+    # cache lookup, plus the build stages above on a miss
+    with span("engine.skeleton"):
+        if skeleton_cache is None:
+            skeleton, source = build(), "miss"
+        else:
+            key = skeleton_key(sub_index, study_mode, speed, weakness, lo, hi, days_left, packing,
+                               calendar and calendar.key)
+            skeleton, source = skeleton_cache.get_or_build(key, build)
+
+    # optional out-param so callers can report where the schedule came from
+    if cache_status is not None:
+        cache_status["plan"] = source
+
+    # optional out-param: does the plan fit before the exam (plan_verdict()),
+    # and how many revision requests no date before it had room for
+    count_dropped_revisions("fast", skeleton["revisions_dropped"])
+    if verdict_out is not None:
+        verdict_out.update(skeleton["verdict"], revisions_dropped=skeleton["revisions_dropped"])
+
+    # optional out-param: the raw schedule, for replan.encode_token()
+    if state_out is not None:
+        state_out.update(
+            subject=subject_key, fingerprint=sub_index.fingerprint,
+            study_mode=study_mode, speed=int(speed), weakness=float(weakness),
+            origin=str(today), exam=str(exam), first=0, packing=packing,
+            availability=availability or None,
+            lengths=np.diff(skeleton["bounds"]).tolist(),
+            positions=skeleton["positions"].tolist(), carry=[]
+        )
+
+    # seed: per-plan messages (the same seed renders the same plan);
+    # None draws from the module-level random, like v2
+    rng = random if seed is None else random.Random(seed)
+    render = render_plan_compact if compact else render_plan
+    with span("engine.render"):
+        return render(skeleton, sub_index, subject_key, today, days_left, limits["time"], rng)
+
+
+# ---------------------------------------------------
+# STREAMING ENGINE — one event per day, flat memory
+# ---------------------------------------------------
+# stream_realistic_plan() takes the same arguments as the engines above but
+# returns an iterator of events instead of one dict:
+#
+#   {"type": "meta", "subject_used", "days_left", "daily_minutes"}
+#   {"type": "day", "date", "topics", "message"}      in date order
+#   {"type": "revision", "date", "topics"}            once no later day can add to it
+#   {"type": "week", "week", "chapters"}              when the week's last day is out
+#   {"type": "end", "days", "revisions_dropped"}
+#
+# Revision requests only come from the 7 days before a date, so the
+# scheduler can close day d+1 as soon as day d has been sent; only a week of
+# requests (plus any spill) is ever held. Collected back together the events
+# give the same daily_plan / weekly_overview / revision_plan as
+# generate_realistic_plan_fast().
+#
+# Bad input (topic range, study_mode, a topic that cannot be placed) raises
+# when the function is called, before the first event.
+def stream_realistic_plan(
+    syllabus_json,
+    weakness_map,
+    speed_map,
+    study_mode,
+    exam_date,
+    discipline_score,
+    subject,
+    start_topic=None,
+    end_topic=None,
+    index=None,
+    packing="greedy",
+    availability=None,
+    seed=None
+):
+
+    today, exam, days_left = plan_window(exam_date)
+    limits = DAILY_LIMITS[study_mode]
+    calendar = (AvailabilityCalendar(availability, today, limits["time"])
+                if availability else None)
+
+    if index is None:
+        index = SyllabusIndex(syllabus_json)
+
+    subject_key = index.select_subject(subject)
+    sub_index = index.subjects[subject_key]
+    lo, hi = sub_index.topic_range(start_topic, end_topic)
+
+    speed = speed_map.get(subject_key, 1)
+    weakness = weakness_map.get(subject_key, 0.4)
+
+    positions = np.arange(lo, hi)
+    codes = sub_index.difficulty_code[lo:hi]
+    times = adjusted_times(sub_index.estimated_time[lo:hi], speed, weakness)
+    check_packable(codes, times, limits if calendar is None else calendar.packing_limits(limits))
+
+    # greedy days are cut while streaming; a deadline plan needs the whole
+    # packing first (it only differs from greedy when greedy overruns)
+    if packing == "greedy" and calendar is None:
+        days = iter_day_bounds(codes, times, limits)
+    elif packing == "greedy":
+        days = iter_calendar_days(iter_day_bounds(codes, times, limits, calendar.budgets()),
+                                  calendar)
+    else:
+        order, bounds = pack_days(codes, times, sub_index.chapter_id[lo:hi], limits,
+                                  days_left, packing, calendar)
+        if order is not None:
+            positions, codes, times = positions[order], codes[order], times[order]
+        days = zip(bounds, bounds[1:])
+
+    meta = {
+        "type": "meta",
+        "subject_used": subject_key,
+        "days_left": days_left,
+        "daily_minutes": limits["time"],
+    }
+    rng = random if seed is None else random.Random(seed)
+    return _plan_events(meta, sub_index, positions, codes, times, days, today, days_left,
+                        calendar, rng)
+
+
+def _plan_events(meta, sub_index, positions, codes, times, days, today, days_left,
+                 calendar=None, rng=random):
+    topics = sub_index.topics
+    difficulty = sub_index.difficulty
+    chapters = sub_index.chapters
+    chapter_id = sub_index.chapter_id
+    is_revisable = (codes >= DIFFICULTY_CODES["medium"]).tolist()
+    minutes = times.tolist()
+
+    key_topics = sub_index.key_topics
+
+    def revision_event(d, entries):
+        return {
+            "type": "revision",
+            "date": str(today + timedelta(days=d)),
+            "topics": [topics[p] for p in entries]
+        }
+
+    yield meta
+
+    scheduler = RevisionScheduler(days_left, calendar=calendar)
+    week = []
+    d = -1
+
+    for d, (start, stop) in enumerate(days):
+        day_positions = positions[start:stop].tolist()
+        day_chapters = chapter_id[positions[start:stop]].tolist()
+
+        if day_positions:   # closed days (availability calendar) send no event
+            yield {
+                "type": "day",
+                "date": str(today + timedelta(days=d)),
+                "topics": [
+                    {
+                        "chapter": chapters[day_chapters[k - start]],
+                        "topic": topics[day_positions[k - start]],
+                        "difficulty": difficulty[day_positions[k - start]],
+                        "time": minutes[k]
+                    }
+                    for k in range(start, stop)
+                ],
+                "message": rng.choice(MOTIVATION)
+            }
+
+        # same +1 / +3 / +7 requests as build_skeleton(); nothing after
+        # day d adds to day d + 1 any more
+        if d < days_left:
+            scheduler.add_day(
+                d,
+                day_positions[-2:],
+                [p for k, p in zip(range(start, stop), day_positions) if is_revisable[k]],
+                [p for cid in dict.fromkeys(day_chapters) for p in key_topics[cid]]
+            )
+            entries = scheduler.close(d + 1)
+            if entries:
+                yield revision_event(d + 1, entries)
+
+        week.extend(day_chapters)
+        if d % 7 == 6 and week:
+            yield {"type": "week", "week": d // 7 + 1,
+                   "chapters": [chapters[c] for c in dict.fromkeys(week)]}
+            week = []
+
+    if week:
+        yield {"type": "week", "week": d // 7 + 1,
+               "chapters": [chapters[c] for c in dict.fromkeys(week)]}
+
+    for rd, entries in scheduler.schedule(d + 2).items():
+        yield revision_event(rd, entries)
+
+    count_dropped_revisions("stream", scheduler.dropped)
+    yield {"type": "end", "days": d + 1, "revisions_dropped": scheduler.dropped}
+
+
+# ---------------------------------------------------
+# MULTI-SUBJECT ENGINE — one plan, one shared daily budget
+# ---------------------------------------------------
+# Each subject keeps its own syllabus order, weakness and speed. Tasks are
+# interleaved by stride scheduling: a subject's k-th task sits at k / weakness,
+# so a subject twice as weak gets twice the slots, and ties go to the weaker
+# subject. The merged list is packed with the same greedy rules and
+# DAILY_LIMITS as a single-subject plan, then revision (+1 / +3 / +7) and
+# the weekly overview are built over all subjects together.
+#
+# subjects: [{"subject", "weakness", "speed", "start_topic"?, "end_topic"?}]
+MIN_STRIDE_WEIGHT = 0.05
+
+
+def interleave_order(weakness, lengths):
+    """-> (subject idx, task idx within subject) arrays in plan order."""
+    weights = np.maximum(np.asarray(weakness, dtype=np.float64), MIN_STRIDE_WEIGHT)
+    tie = np.empty(len(weights), dtype=np.int64)
+    tie[np.argsort(-weights, kind="stable")] = np.arange(len(weights))
+
+    subject = np.repeat(np.arange(len(lengths)), lengths)
+    local = np.concatenate([np.arange(n) for n in lengths])
+
+    order = np.lexsort((tie[subject], local / weights[subject]))
+    return subject[order], local[order]
+
+
+def generate_combined_plan(syllabus_json, subjects, study_mode, exam_date, index=None,
+                           seed=None):
+
+    today, exam, days_left = plan_window(exam_date)
+    limits = DAILY_LIMITS[study_mode]
+
+    if index is None:
+        index = SyllabusIndex(syllabus_json)
+
+    if not subjects:
+        raise ValueError("At least one subject is required")
+
+    # ---------------------------------------------------
+    # 1. PER-SUBJECT RANGES + ADJUSTED TIMES
+    # ---------------------------------------------------
+    keys, sub_indexes, starts, times, codes, chapter_ids = [], [], [], [], [], []
+    for entry in subjects:
+        subject_key = index.select_subject(entry["subject"])
+        sub_index = index.subjects[subject_key]
+        lo, hi = sub_index.topic_range(entry.get("start_topic"), entry.get("end_topic"))
+
+        keys.append(subject_key)
+        sub_indexes.append(sub_index)
+        starts.append(lo)
+        times.append(adjusted_times(sub_index.estimated_time[lo:hi],
+                                    entry.get("speed", 1), entry.get("weakness", 0.4)))
+        codes.append(sub_index.difficulty_code[lo:hi])
+        chapter_ids.append(sub_index.chapter_id[lo:hi])
+
+    # ---------------------------------------------------
+    # 2. INTERLEAVE + PACK INTO ONE DAILY BUDGET
+    # ---------------------------------------------------
+    subject_of, local = interleave_order(
+        [entry.get("weakness", 0.4) for entry in subjects], [len(t) for t in times]
+    )
+    offsets = np.cumsum([0] + [len(t) for t in times[:-1]])
+    flat = offsets[subject_of] + local
+    task_times = np.concatenate(times)[flat]
+    task_codes = np.concatenate(codes)[flat]
+    check_packable(task_codes, task_times, limits)
+
+    # per-task lists, k = position in plan order
+    position = (np.asarray(starts)[subject_of] + local).tolist()
+    chapter = np.concatenate(chapter_ids)[flat].tolist()
+    revisable = (task_codes >= DIFFICULTY_CODES["medium"]).tolist()
+    subject_of = subject_of.tolist()
+    minutes = task_times.tolist()
+
+    daily_plan = {}
+    days = []
+    # seed: as in generate_realistic_plan_fast()
+    rng = random if seed is None else random.Random(seed)
+    for d, (start, stop) in enumerate(iter_day_bounds(task_codes, task_times, limits)):
+        days.append((start, stop))
+        daily_plan[str(today + timedelta(days=d))] = {
+            "topics": [
+                {
+                    "subject": keys[subject_of[k]],
+                    "chapter": sub_indexes[subject_of[k]].chapters[chapter[k]],
+                    "topic": sub_indexes[subject_of[k]].topics[position[k]],
+                    "difficulty": sub_indexes[subject_of[k]].difficulty[position[k]],
+                    "time": minutes[k]
+                }
+                for k in range(start, stop)
+            ],
+            "message": rng.choice(MOTIVATION)
+        }
+
+    # ---------------------------------------------------
+    # 3. WEEKLY OVERVIEW — {week: {subject: [chapters]}}
+    # ---------------------------------------------------
+    weekly = {}
+    for d, (start, stop) in enumerate(days):
+        week = weekly.setdefault(d // 7 + 1, {})
+        for k in range(start, stop):
+            week.setdefault(subject_of[k], {})[chapter[k]] = None
+    for wk, week in weekly.items():
+        weekly[wk] = {
+            keys[s]: [sub_indexes[s].chapters[c] for c in cids] for s, cids in week.items()
+        }
+
+    # ---------------------------------------------------
+    # 4. REVISION PLAN — same +1 / +3 / +7 rules across subjects
+    # ---------------------------------------------------
+    scheduler = RevisionScheduler(days_left)
+    for d, (start, stop) in enumerate(days[:days_left]):
+        scheduler.add_day(
+            d,
+            [(subject_of[k], position[k]) for k in range(max(start, stop - 2), stop)],
+            [(subject_of[k], position[k]) for k in range(start, stop) if revisable[k]],
+            [(s, p) for s, cid in dict.fromkeys((subject_of[k], chapter[k]) for k in range(start, stop))
+             for p in sub_indexes[s].key_topics[cid]]
+        )
+
+    revision_plan = {
+        str(today + timedelta(days=d)): [
+            {"subject": keys[s], "topic": sub_indexes[s].topics[p]} for s, p in entries
+        ]
+        for d, entries in scheduler.schedule(1).items()
+    }
+    count_dropped_revisions("combined", scheduler.dropped)
+
+    return {
+        "subjects_used": keys,
+        "days_left": days_left,
+        "daily_minutes": limits["time"],
+        "daily_plan": daily_plan,
+        "revision_plan": revision_plan,
+        "revisions_dropped": scheduler.dropped,
+        "weekly_overview": weekly
+    }
+
+
+# ---------------------------------------------------
+# PARITY RUNNER (python engine.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import itertools
+    from revision import REVISION_CAP
+
+    with open("syllabus.json") as f:
+        syllabus = json.load(f)
+    index = SyllabusIndex(syllabus)
+
+    checked = 0
+    dropped = 0
+    for subject, mode, speed, weakness, exam_date in itertools.product(
+        syllabus.keys(), DAILY_LIMITS.keys(), (0, 1, 2), (0.3, 0.7),
+        ("2026-12-01", "2027-06-01", "2020-01-01")
+    ):
+        sub_index = index.subjects[subject]
+        start, end = sub_index.topics[0], sub_index.topics[-1]
+        if DAILY_LIMITS[mode]["hard"] == 0:
+            # v2 never terminates on topics it cannot place; use an easy/medium run
+            run = next(i for i, c in enumerate(sub_index.difficulty_code) if c == 2)
+            start, end = sub_index.topics[0], sub_index.topics[run - 1]
+
+        kwargs = dict(
+            syllabus_json=syllabus, weakness_map={subject: weakness},
+            speed_map={subject: speed}, study_mode=mode, exam_date=exam_date,
+            discipline_score=0.5, subject=subject, start_topic=start, end_topic=end
+        )
+        random.seed(checked)
+        expected = generate_realistic_plan_v2(**kwargs)
+        random.seed(checked)
+        verdict = {}
+        actual = generate_realistic_plan_fast(**kwargs, index=index, verdict_out=verdict)
+
+        assert json.dumps(actual) == json.dumps(expected), kwargs
+
+        # the compact format expands back to the same plan
+        random.seed(checked)
+        compact = generate_realistic_plan_fast(**kwargs, index=index, compact=True)
+        assert json.dumps(expand_compact_plan(json.loads(json.dumps(compact)))) \
+            == json.dumps(expected), kwargs
+
+        # streamed events reassemble into the same plan
+        random.seed(checked)
+        streamed = {"daily_plan": {}, "revision_plan": {}, "weekly_overview": {}}
+        for event in stream_realistic_plan(**kwargs, index=index):
+            if event["type"] == "meta":
+                streamed.update(subject_used=event["subject_used"],
+                                days_left=event["days_left"],
+                                daily_minutes=event["daily_minutes"])
+            elif event["type"] == "day":
+                streamed["daily_plan"][event["date"]] = {
+                    "topics": event["topics"], "message": event["message"]
+                }
+            elif event["type"] == "revision":
+                streamed["revision_plan"][event["date"]] = event["topics"]
+            elif event["type"] == "week":
+                streamed["weekly_overview"][event["week"]] = event["chapters"]
+            elif event["type"] == "end":
+                assert event["revisions_dropped"] == verdict["revisions_dropped"], kwargs
+
+        assert streamed == expected, kwargs
+
+        # a one-subject combined plan schedules the same days and revisions
+        random.seed(checked)
+        combined = generate_combined_plan(
+            syllabus, [{"subject": subject, "weakness": weakness, "speed": speed,
+                        "start_topic": start, "end_topic": end}],
+            mode, exam_date, index=index
+        )
+        assert {
+            day: [t["topic"] for t in detail["topics"]]
+            for day, detail in combined["daily_plan"].items()
+        } == {
+            day: [t["topic"] for t in detail["topics"]]
+            for day, detail in expected["daily_plan"].items()
+        }, kwargs
+        assert {
+            day: [t["topic"] for t in entries]
+            for day, entries in combined["revision_plan"].items()
+        } == expected["revision_plan"], kwargs
+        assert combined["revisions_dropped"] == verdict["revisions_dropped"], kwargs
+        dropped += verdict["revisions_dropped"]
+
+        # revision dates are capped, repeat-free and in date order
+        revision = expected["revision_plan"]
+        assert all(len(topics) <= REVISION_CAP and len(set(topics)) == len(topics)
+                   for topics in revision.values()), kwargs
+        assert list(revision) == sorted(revision), kwargs
+        checked += 1
+
+    # a mode that cannot take a topic at all fails on every path, not only
+    # when that topic opens the plan (light mode has no hard slots)
+    subject = "Science"
+    sub_index = index.subjects[subject]
+    assert 0 < list(sub_index.difficulty_code).index(2)
+    light = dict(
+        syllabus_json=syllabus, weakness_map={subject: 0.5}, speed_map={subject: 1},
+        study_mode="light", exam_date="2027-06-01", discipline_score=0.5, subject=subject
+    )
+    for attempt in (
+        lambda: generate_realistic_plan_fast(**light, index=index),
+        lambda: generate_realistic_plan_fast(**light, index=index, packing="deadline"),
+        lambda: list(stream_realistic_plan(**light, index=index)),
+        lambda: generate_combined_plan(syllabus, [{"subject": subject, "weakness": 0.5, "speed": 1}],
+                                       "light", "2027-06-01", index=index),
+    ):
+        try:
+            attempt()
+        except ValueError as e:
+            assert "does not fit" in str(e)
+        else:
+            raise AssertionError("light plan placed a hard topic")
+
+    # a seeded combined plan repeats exactly
+    entries = [{"subject": subject, "weakness": 0.4, "speed": 1} for subject in syllabus]
+    assert json.dumps(generate_combined_plan(syllabus, entries, "moderate", "2027-06-01",
+                                             index=index, seed=7)) \
+        == json.dumps(generate_combined_plan(syllabus, entries, "moderate", "2027-06-01",
+                                             index=index, seed=7))
+
+    # all subjects together: every selected topic lands exactly once
+    for mode in ("moderate", "aggressive"):
+        entries = [
+            {"subject": subject, "weakness": w, "speed": 1}
+            for subject, w in zip(syllabus.keys(), (0.8, 0.3, 0.5))
+        ]
+        combined = generate_combined_plan(syllabus, entries, mode, "2027-06-01", index=index)
+        scheduled = [(t["subject"], t["topic"]) for detail in combined["daily_plan"].values()
+                     for t in detail["topics"]]
+        assert sorted(scheduled) == sorted(
+            (subject, topic) for subject in syllabus for topic in index.subjects[subject].topics
+        ), mode
+
+    # deadline packing: never longer than greedy, same topics, caps and
+    # within-chapter order kept, streaming agrees, verdict is consistent
+    from plan_cache import skeleton_from_bytes, skeleton_to_bytes
+
+    today = datetime.now().date()
+    reordered = 0
+    for subject, mode in itertools.product(syllabus.keys(), ("moderate", "aggressive")):
+        sub_index = index.subjects[subject]
+        times = adjusted_times(sub_index.estimated_time, 1, 0.4)
+        greedy_days = len(list(iter_day_bounds(sub_index.difficulty_code, times, DAILY_LIMITS[mode])))
+        for days_left in (greedy_days - 3, greedy_days + 5):
+            kwargs = dict(
+                syllabus_json=syllabus, weakness_map={}, speed_map={}, study_mode=mode,
+                exam_date=str(today + timedelta(days=days_left)), discipline_score=0.5,
+                subject=subject, index=index
+            )
+            verdict = {}
+            random.seed(checked)
+            plan = generate_realistic_plan_fast(**kwargs, packing="deadline", verdict_out=verdict)
+            days = list(plan["daily_plan"].values())
+            placed = [t["topic"] for day in days for t in day["topics"]]
+            assert sorted(placed) == sorted(sub_index.topics), (subject, mode)
+            assert len(days) <= greedy_days, (subject, mode)
+            if placed != sub_index.topics:
+                reordered += 1
+            if days_left > greedy_days:
+                assert placed == sub_index.topics, (subject, mode)
+
+            limits = DAILY_LIMITS[mode]
+            for day in days:
+                used = [t["difficulty"] for t in day["topics"]]
+                assert len(used) <= limits["max_topics"], (subject, mode)
+                assert sum(t["time"] for t in day["topics"]) <= limits["time"], (subject, mode)
+                assert all(used.count(level) <= limits[level] for level in ("easy", "medium", "hard"))
+            rank = {topic: i for i, topic in enumerate(sub_index.topics)}
+            for chapter in sub_index.chapters:
+                ranks = [rank[t] for t in placed if sub_index.chapters[
+                    sub_index.chapter_id[rank[t]]] == chapter]
+                assert ranks == sorted(ranks), (subject, mode, chapter)
+
+            assert verdict["days_needed"] == len(days) and verdict["days_left"] == days_left
+            assert verdict["fits"] == (len(days) <= days_left), verdict
+            if verdict["fits"]:
+                assert verdict["minimum_mode"] is not None
+                assert list(DAILY_LIMITS).index(verdict["minimum_mode"]) <= list(DAILY_LIMITS).index(mode)
+
+            random.seed(checked)
+            streamed = [event for event in stream_realistic_plan(**kwargs, packing="deadline")
+                        if event["type"] == "day"]
+            assert [event["topics"] for event in streamed] == [day["topics"] for day in days]
+
+            skeleton = build_skeleton(sub_index, 0, len(sub_index), 1, 0.4, limits, days_left,
+                                      mode, "deadline")
+            restored = skeleton_from_bytes(skeleton_to_bytes(skeleton))
+            assert np.array_equal(restored["positions"], skeleton["positions"])
+            assert restored["verdict"] == skeleton["verdict"]
+
+    # availability calendar: studying only on open days, within their minutes;
+    # an all-default calendar changes nothing
+    calendar_plans = 0
+    calendars = [
+        {},
+        {"weekly": {"sat": 240, "sun": 0, "wed": 45}},
+        {"weekly": {"mon": 60}, "overrides": [
+            {"start": str(today + timedelta(days=3)), "end": str(today + timedelta(days=12)),
+             "minutes": 0},
+            {"start": str(today + timedelta(days=20)), "minutes": 300}]},
+    ]
+    for subject, mode, spec, packing, exam_days in itertools.product(
+        syllabus.keys(), ("moderate", "aggressive"), calendars, PACKING_MODES, (25, 400)
+    ):
+        kwargs = dict(
+            syllabus_json=syllabus, weakness_map={}, speed_map={}, study_mode=mode,
+            exam_date=str(today + timedelta(days=exam_days)), discipline_score=0.5,
+            subject=subject, index=index, packing=packing
+        )
+        random.seed(calendar_plans)
+        plain = generate_realistic_plan_fast(**kwargs)
+        random.seed(calendar_plans)
+        plan = generate_realistic_plan_fast(**kwargs, availability={"weekly": {}, **spec})
+        if not spec:
+            assert plan == plain, (subject, mode)
+            continue
+
+        calendar = AvailabilityCalendar(spec, today, DAILY_LIMITS[mode]["time"])
+        placed = []
+        for day, detail in plan["daily_plan"].items():
+            offset = (datetime.strptime(day, "%Y-%m-%d").date() - today).days
+            assert calendar.is_open(offset), (subject, mode, day)
+            assert sum(t["time"] for t in detail["topics"]) <= calendar.minutes_on(offset)
+            placed += [t["topic"] for t in detail["topics"]]
+        assert sorted(placed) == sorted(index.subjects[subject].topics)
+        if packing == "greedy":
+            assert placed == index.subjects[subject].topics
+        assert all(calendar.is_open((datetime.strptime(day, "%Y-%m-%d").date() - today).days)
+                   for day in plan["revision_plan"]), (subject, mode)
+
+        random.seed(calendar_plans)
+        compact = generate_realistic_plan_fast(**kwargs, availability=spec, compact=True)
+        assert json.dumps(expand_compact_plan(json.loads(json.dumps(compact)))) == json.dumps(plan)
+
+        random.seed(calendar_plans)
+        streamed = {"daily_plan": {}, "revision_plan": {}, "weekly_overview": {}}
+        for event in stream_realistic_plan(**kwargs, availability=spec):
+            if event["type"] == "day":
+                streamed["daily_plan"][event["date"]] = {
+                    "topics": event["topics"], "message": event["message"]
+                }
+            elif event["type"] == "revision":
+                streamed["revision_plan"][event["date"]] = event["topics"]
+            elif event["type"] == "week":
+                streamed["weekly_overview"][event["week"]] = event["chapters"]
+        assert streamed == {k: plan[k] for k in streamed}, (subject, mode, spec)
+        calendar_plans += 1
+
+    # seeded plans: the same seed renders the same messages whatever the
+    # module-level random state, in every format
+    kwargs = dict(syllabus_json=syllabus, weakness_map={}, speed_map={}, study_mode="moderate",
+                  exam_date="2027-06-01", discipline_score=0.5, subject="Science", index=index)
+    seeded = generate_realistic_plan_fast(**kwargs, seed=42)
+    random.seed(1)
+    assert generate_realistic_plan_fast(**kwargs, seed=42) == seeded
+    assert json.dumps(expand_compact_plan(json.loads(json.dumps(
+        generate_realistic_plan_fast(**kwargs, seed=42, compact=True))))) == json.dumps(seeded)
+    assert [e["message"] for e in stream_realistic_plan(**kwargs, seed=42) if e["type"] == "day"] \
+        == [day["message"] for day in seeded["daily_plan"].values()]
+    assert generate_realistic_plan_fast(**kwargs, seed=43) != seeded
+
+    print(f"fast, compact, streaming and combined engines match generate_realistic_plan_v2 on {checked} cases "
+          f"({dropped} revision requests dropped, reported alike)")
+    print(f"deadline packing checks passed ({reordered} plans re-packed)")
+    print(f"availability calendar checks passed on {calendar_plans} plans")
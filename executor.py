@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# ---------------------------------------------------
+# BOUNDED CPU EXECUTOR
+# ---------------------------------------------------
+# Async handlers hand scoring + plan generation to a fixed pool instead of
+# FastAPI's default threadpool. At most `workers` jobs run and `queue_depth`
+# more wait; anything beyond that is rejected straight away with
+# Overloaded, so the API can answer 503 + Retry-After instead of letting
+# requests time out.
+#
+#   mode "thread"  -> ThreadPoolExecutor (shares this worker's caches)
+#   mode "process" -> ProcessPoolExecutor (true parallelism past the GIL;
+#                     spawned, each process warms its own models via
+#                     `initializer`; fn and args must be picklable)
+
+class Overloaded(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__("planner queue is full")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+
+    def __init__(self, mode="thread", workers=None, queue_depth=None,
+                 retry_after=1, initializer=None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode: {mode}")
+
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = self.workers * 2 if queue_depth is None else queue_depth
+        self.retry_after = retry_after
+
+        if mode == "process":
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer
+            )
+        else:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="planner")
+
+        # only touched from the event loop thread
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.workers + self.queue_depth:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self):
+        # the pool runs FIFO, so the first `workers` jobs are the running ones
+        running = min(self.in_flight, self.workers)
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "running": running,
+            "queued": self.in_flight - running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
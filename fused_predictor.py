@@ -0,0 +1,173 @@
+import hashlib
+import numpy as np
+
+
+# ---------------------------------------------------
+# FUSED SPDM PREDICTOR — numpy only
+# ---------------------------------------------------
+# All three LightGBM ensembles (weakness, slope, speed) are exported by
+# compile_models.py into one flat, array-backed forest, scored in a single
+# vectorized pass. Serving needs neither lightgbm nor scikit-learn.
+#
+# Split table (one entry per internal node, grouped by tree):
+#   feature, threshold, default_left, missing_type,
+#   left, right      -> child index; >= 0 split, < 0 leaf (~leaf), LightGBM style
+#   leaf_mask        -> uint64 over the tree's leaves (left-to-right), with the
+#                       bits of the left subtree cleared
+# Leaf table: leaf_value, with leaf_offset[tree] pointing at each tree's leaves.
+# Trees are grouped by output slot (tree_slot is sorted), boosting order kept.
+#
+# Scoring is QuickScorer style: every split is tested at once, the masks of
+# the splits that go right are ANDed per tree, and the lowest surviving bit
+# is the exit leaf. Cost does not depend on tree depth. Blocks are laid out
+# splits-by-rows so the feature gather copies whole rows.
+#
+# Output slots: 0 = weakness, 1 = slope, 2.. = speed class raw scores.
+
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+
+ZERO_THRESHOLD = 1e-35  # LightGBM kZeroThreshold
+
+SLOT_WEAKNESS = 0
+SLOT_SLOPE = 1
+SLOT_SPEED = 2
+
+# rows x splits scored per chunk: ~2 MB per temporary, so a chunk's blocks
+# stay in cache (at 1 << 20, 32-64 row batches cost twice as much per row)
+CHUNK_CELLS = 1 << 18
+
+MODEL_FILES = ["spdm_weakness.pkl", "spdm_slope.pkl", "spdm_speed.pkl"]
+COMPILED_FILE = "spdm_compiled.npz"
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FusedPredictor:
+
+    def __init__(self, arrays):
+        self.features = [str(f) for f in arrays["features"]]
+        self.n_features = len(self.features)
+        self.speed_classes = np.asarray(arrays["speed_classes"])
+        self.source_hashes = [str(h) for h in arrays["source_hashes"]]
+
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.default_left = arrays["default_left"]
+        self.missing_type = arrays["missing_type"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.leaf_mask = arrays["leaf_mask"]
+        self.tree_start = arrays["tree_start"]
+        self.leaf_value = arrays["leaf_value"]
+        self.leaf_offset = arrays["leaf_offset"]
+        self.tree_slot = arrays["tree_slot"]
+
+        # trees are stored grouped by output slot, each group in boosting order
+        n_slots = SLOT_SPEED + len(self.speed_classes)
+        bounds = np.searchsorted(self.tree_slot, np.arange(n_slots + 1))
+        self._slot_ranges = list(zip(bounds[:-1], bounds[1:]))
+        self._needs_missing = bool(np.any(self.missing_type != MISSING_NONE))
+        self._chunk_rows = max(1, CHUNK_CELLS // len(self.feature))
+
+        # column views for broadcasting against (splits, rows) blocks
+        self._threshold_col = self.threshold[:, None]
+        self._left_bits_col = (~self.leaf_mask)[:, None]
+        self._leaf_offset_col = self.leaf_offset[:, None]
+
+    # ---------------------------------------------------
+    # LOADING
+    # ---------------------------------------------------
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({k: data[k] for k in data.files})
+
+    @classmethod
+    def load_if_fresh(cls, path, source_files):
+        """Load the compiled forest unless it is missing or older than the pickles."""
+        try:
+            predictor = cls.load(path)
+        except FileNotFoundError:
+            return None
+
+        hashes = [file_sha256(p) for p in source_files]
+        if hashes != predictor.source_hashes:
+            return None
+        return predictor
+
+    # ---------------------------------------------------
+    # SCORING
+    # ---------------------------------------------------
+    def _exit_leaves(self, XT):
+        """Exit-leaf values, shape (n_trees, n_rows), for features-by-rows XT."""
+        # LightGBM treats NaN as 0.0 unless the split is NaN-aware
+        nan_mask = np.isnan(XT)
+        has_nan = bool(nan_mask.any())
+        if has_nan:
+            XT = np.where(nan_mask, 0.0, XT)
+
+        x = XT.take(self.feature, axis=0)
+        go_right = x > self._threshold_col
+
+        if self._needs_missing:
+            mt = self.missing_type[:, None]
+            use_default = (mt == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD)
+            if has_nan:
+                use_default |= (mt == MISSING_NAN) & nan_mask.take(self.feature, axis=0)
+            go_right = np.where(use_default, ~self.default_left[:, None], go_right)
+
+        # OR together the left-subtree bits each right turn rules out;
+        # the surviving leaves are the complement
+        ruled_out = np.bitwise_or.reduceat(
+            self._left_bits_col * go_right, self.tree_start, axis=0
+        )
+        survivors = ~ruled_out
+
+        # index of the lowest set bit; powers of two are exact in float64
+        lowest = survivors & (ruled_out + np.uint64(1))
+        leaf = np.frexp(lowest.astype(np.float64))[1] - 1
+        return self.leaf_value.take(self._leaf_offset_col + leaf)
+
+    def raw_scores(self, X):
+        """(n, n_slots) raw ensemble outputs, summed in boosting order."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if X.shape[1] != self.n_features:
+            raise ValueError(
+                f"expected {self.n_features} features, got {X.shape[1]}"
+            )
+
+        XT = np.ascontiguousarray(X.T)
+        out = np.empty((X.shape[0], len(self._slot_ranges)))
+        for start in range(0, X.shape[0], self._chunk_rows):
+            stop = start + self._chunk_rows
+            leaves = self._exit_leaves(XT[:, start:stop])
+
+            # cumsum accumulates tree by tree like LightGBM's predict loop,
+            # which keeps the sums bit-identical to Booster.predict
+            for slot, (lo, hi) in enumerate(self._slot_ranges):
+                out[start:stop, slot] = np.cumsum(leaves[lo:hi], axis=0)[-1]
+        return out
+
+    def predict_matrix(self, X):
+        """Score a (n, n_features) matrix -> (weakness, speed, slope) arrays."""
+        raw = self.raw_scores(X)
+
+        logits = raw[:, SLOT_SPEED:]
+        proba = np.exp(logits - logits.max(axis=1, keepdims=True))
+        proba /= proba.sum(axis=1, keepdims=True)
+        speed = self.speed_classes[np.argmax(proba, axis=1)]
+
+        return raw[:, SLOT_WEAKNESS], speed, raw[:, SLOT_SLOPE]
+
+    def predict_row(self, row):
+        """Score one feature row -> (weakness_score, speed_category, slope)."""
+        weakness, speed, slope = self.predict_matrix(np.asarray(row, dtype=np.float64))
+        return float(weakness[0]), int(speed[0]), float(slope[0])
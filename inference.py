@@ -0,0 +1,117 @@
+import threading
+import numpy as np
+
+
+# ---------------------------------------------------
+# SPDM INFERENCE — NumPy rows straight into the boosters
+# ---------------------------------------------------
+# The sklearn wrappers only need a DataFrame for column names. We keep the
+# column order from spdm_features.pkl ourselves and hand contiguous float64
+# rows to the native LightGBM Booster, which skips pandas and the sklearn
+# input validation on every request.
+class SPDMPredictor:
+
+    def __init__(self, weakness_model, speed_model, slope_model, features):
+        self.features = list(features)
+        self.n_features = len(self.features)
+
+        for name, model in (("weakness", weakness_model),
+                            ("speed", speed_model),
+                            ("slope", slope_model)):
+            model_features = list(getattr(model, "feature_name_", self.features))
+            if model_features != self.features:
+                raise ValueError(
+                    f"{name} model feature order does not match spdm_features.pkl"
+                )
+
+        self._weakness = weakness_model.booster_
+        self._speed = speed_model.booster_
+        self._slope = slope_model.booster_
+        self.speed_classes = np.asarray(speed_model.classes_)
+
+        # one pre-allocated (1, n_features) row per worker thread
+        self._local = threading.local()
+
+    def _row_buffer(self):
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = np.empty((1, self.n_features), dtype=np.float64, order="C")
+            self._local.row = row
+        return row
+
+    def predict_matrix(self, X):
+        """Score a (n, n_features) matrix -> (weakness, speed, slope) arrays."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+
+        weakness = self._weakness.predict(X)
+        slope = self._slope.predict(X)
+
+        # LGBMClassifier.predict == classes_[argmax(proba)]
+        proba = self._speed.predict(X)
+        speed = self.speed_classes[np.argmax(proba, axis=1)]
+
+        return weakness, speed, slope
+
+    def predict_row(self, row):
+        """Score one feature row -> (weakness_score, speed_category, slope)."""
+        X = self._row_buffer()
+        X[0, :] = row
+
+        weakness, speed, slope = self.predict_matrix(X)
+        return float(weakness[0]), int(speed[0]), float(slope[0])
+
+
+# ---------------------------------------------------
+# PARITY CHECK + MICROBENCHMARK (python inference.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import time
+    import joblib
+    import pandas as pd
+
+    weakness_model = joblib.load("spdm_weakness.pkl")
+    slope_model = joblib.load("spdm_slope.pkl")
+    speed_model = joblib.load("spdm_speed.pkl")
+    features = joblib.load("spdm_features.pkl")
+
+    predictor = SPDMPredictor(weakness_model, speed_model, slope_model, features)
+
+    rng = np.random.default_rng(0)
+    rows = np.column_stack([
+        rng.uniform(0, 100, 500),       # marks
+        rng.uniform(0, 100, 500),       # past_mean
+        rng.uniform(0, 25, 500),        # past_std
+        rng.uniform(0, 10, 500),        # quiz_mean
+        rng.uniform(0, 4, 500),         # quiz_std
+        rng.uniform(0, 1, 500),         # attendance
+        rng.uniform(0, 1, 500),         # assignment_rate
+        rng.integers(0, 10, 500),       # events_participation
+        rng.integers(0, 5, 500),        # cluster_id
+        rng.uniform(-10, 10, 500),      # improvement_slope
+        rng.uniform(0, 1, 500),         # discipline_score
+    ])
+
+    def dataframe_path(row):
+        X = pd.DataFrame([list(row)], columns=features)
+        return (float(weakness_model.predict(X)[0]),
+                int(speed_model.predict(X)[0]),
+                float(slope_model.predict(X)[0]))
+
+    # parity: must be identical to the DataFrame path
+    for row in rows:
+        assert dataframe_path(row) == predictor.predict_row(row), row
+    print(f"parity OK on {len(rows)} rows")
+
+    def timings(fn):
+        out = []
+        for row in rows:
+            t0 = time.perf_counter()
+            fn(row)
+            out.append((time.perf_counter() - t0) * 1e6)
+        return np.percentile(out, 50), np.percentile(out, 99)
+
+    old_p50, old_p99 = timings(dataframe_path)
+    new_p50, new_p99 = timings(predictor.predict_row)
+    print(f"DataFrame path: p50={old_p50:.0f}us p99={old_p99:.0f}us")
+    print(f"NumPy path:     p50={new_p50:.0f}us p99={new_p99:.0f}us")
+    print(f"speedup:        p50 x{old_p50 / new_p50:.1f} p99 x{old_p99 / new_p99:.1f}")
@@ -0,0 +1,189 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+
+# ---------------------------------------------------
+# HOT-PATH METRICS (Prometheus text format)
+# ---------------------------------------------------
+# Fixed-bucket histograms and counters kept in plain dicts under one lock
+# each; observe() is a bisect plus two increments. Exposed by GET /metrics.
+#
+#   planner_stage_seconds{stage}        handler + engine stages (span())
+#   planner_request_seconds{endpoint}   whole request, including queueing
+#   planner_requests_total{endpoint, subject, study_mode, status}
+#   planner_predict_batch_rows          rows per coalesced SPDM predict
+#   planner_model_seconds{version, role}  SPDM predict time per model version
+#                                         (role: served / shadow)
+#   planner_revisions_dropped_total{engine}  revision requests no date had room for
+#
+# PLANNER_METRICS=off turns everything into no-ops: span() hands back one
+# shared nullcontext and nothing is recorded. Metrics are per process; with
+# several uvicorn workers (or PLANNER_EXECUTION=process) each process
+# keeps its own numbers.
+ENABLED = os.environ.get("PLANNER_METRICS", "on") != "off"
+
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, le=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+
+        for labels, series in sorted(snapshot.items()):
+            plain = _label_text(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket"
+                             f"{_label_text(self.label_names, labels, bound)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket"
+                         f"{_label_text(self.label_names, labels, '+Inf')} {cumulative}")
+            lines.append(f"{self.name}_sum{plain} {series[-1]}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "planner_stage_seconds", "Time spent per handler / engine stage", ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "planner_request_seconds", "End-to-end handler latency", ["endpoint"]
+)
+PREDICT_BATCH_ROWS = Histogram(
+    "planner_predict_batch_rows", "Feature rows per coalesced SPDM predict", [],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+MODEL_SECONDS = Histogram(
+    "planner_model_seconds", "SPDM predict time per model version", ["version", "role"]
+)
+REQUESTS_TOTAL = Counter(
+    "planner_requests_total", "Plan requests by subject, study mode and outcome",
+    ["endpoint", "subject", "study_mode", "status"]
+)
+REVISIONS_DROPPED = Counter(
+    "planner_revisions_dropped_total",
+    "Revision requests dropped at the exam or after REVISION_MAX_DELAY", ["engine"]
+)
+
+
+# ---------------------------------------------------
+# SPANS
+# ---------------------------------------------------
+class _Span:
+    __slots__ = ("labels", "t0")
+
+    def __init__(self, stage):
+        self.labels = (stage,)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(self.labels, time.perf_counter() - self.t0)
+
+
+_NOOP = nullcontext()
+
+
+def span(stage):
+    """with span("engine.pack"): ...  -> one planner_stage_seconds sample."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(stage)
+
+
+def observe_request(endpoint, seconds):
+    if ENABLED:
+        REQUEST_SECONDS.observe((endpoint,), seconds)
+
+
+def count_request(endpoint, subject, study_mode, status):
+    if ENABLED:
+        REQUESTS_TOTAL.inc((endpoint, subject, study_mode, status))
+
+
+def observe_batch(rows):
+    if ENABLED:
+        PREDICT_BATCH_ROWS.observe((), rows)
+
+
+def observe_model(version, role, seconds):
+    if ENABLED:
+        MODEL_SECONDS.observe((version, role), seconds)
+
+
+def count_dropped_revisions(engine, dropped):
+    if ENABLED and dropped:
+        REVISIONS_DROPPED.inc((engine,), dropped)
+
+
+def render():
+    if not ENABLED:
+        return "# metrics disabled (PLANNER_METRICS=off)\n"
+    lines = []
+    for metric in (REQUESTS_TOTAL, REQUEST_SECONDS, STAGE_SECONDS, PREDICT_BATCH_ROWS,
+                   MODEL_SECONDS, REVISIONS_DROPPED):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
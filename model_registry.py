@@ -0,0 +1,464 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+
+from fused_predictor import FusedPredictor, file_sha256, MODEL_FILES, COMPILED_FILE
+from shadow import LatencyStats, OutputDiff
+
+logger = logging.getLogger("spdm.models")
+
+
+# ---------------------------------------------------
+# MODEL REGISTRY — lazy, cached, memory-mapped
+# ---------------------------------------------------
+# Nothing is loaded at import time. The first predictor() call (or the
+# warm-up hook) loads the models once per worker:
+#
+#   1. SPDM_CACHE_DIR/<version> holds the compiled forest as one .npy per
+#      array, opened with mmap_mode="r". Every worker on the box maps the
+#      same read-only pages from the OS page cache instead of keeping a copy.
+#   2. If the cache is missing or stale it is rebuilt from spdm_compiled.npz
+#      (written to a temp dir, then renamed into place).
+#   3. If the compiled forest is missing or stale too, the pickles are
+#      loaded with joblib (pulls in lightgbm + scikit-learn).
+#
+# Load time per artifact is kept in load_times (ms) and logged.
+#
+# VERSIONS AND HOT-SWAP
+# A model set (the three pickles, plus spdm_compiled.npz if it is fresh)
+# is a ModelVersion, identified by the hash of its pickles. Requests take
+# one snapshot with active() and score with it throughout.
+#
+#   load_candidate(dir)  loads a set in a background thread and validates it
+#                        (feature order == spdm_features.pkl, finite outputs
+#                        on a probe batch, same speed classes); it becomes
+#                        the candidate, or last_error says why not
+#   promote()            candidate -> active, active -> previous, as one
+#                        reference swap: requests holding the old snapshot
+#                        finish on it, new ones get the new version
+#   rollback()           previous -> active
+#
+# While a candidate is loaded, shadow.ShadowScorer scores it on
+# shadow_fraction of live traffic off the response path; its latency and
+# output differences are kept on the candidate's ModelVersion.
+
+CACHE_DIR = os.environ.get("SPDM_CACHE_DIR", ".spdm_cache")
+FEATURES_FILE = "spdm_features.pkl"
+
+# rows of random, plausible features a candidate must score sanely
+PROBE_ROWS = 256
+
+
+def _model_name(path):
+    return os.path.splitext(os.path.basename(path))[0].replace("spdm_", "")
+
+
+def probe_matrix(n_features, n_rows=PROBE_ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 100, (n_rows, n_features))
+    X[:, 5:7] /= 100     # attendance, assignment_rate
+    return X
+
+
+class ModelVersion:
+
+    def __init__(self, version, predictor, backend, source, load_times):
+        self.version = version
+        self.predictor = predictor
+        self.backend = backend
+        self.source = source
+        self.load_times = load_times
+        self.loaded_at = time.time()
+
+        self.served = LatencyStats()   # predict time on the response path
+        self.shadow = LatencyStats()   # predict time as a shadow candidate
+        self._diffs = {}               # served version -> OutputDiff
+        self._lock = threading.Lock()
+
+    def diff_against(self, served_version):
+        with self._lock:
+            diff = self._diffs.get(served_version)
+            if diff is None:
+                diff = self._diffs[served_version] = OutputDiff()
+            return diff
+
+    def status(self):
+        with self._lock:
+            diffs = dict(self._diffs)
+        return {
+            "version": self.version,
+            "backend": self.backend,
+            "source": self.source,
+            "load_ms": dict(self.load_times),
+            "loaded_at": self.loaded_at,
+            "served": self.served.stats(),
+            "shadow": self.shadow.stats(),
+            "shadow_diff": {version: diff.stats() for version, diff in diffs.items()},
+        }
+
+
+class ModelRegistry:
+
+    def __init__(self, compiled_file=COMPILED_FILE, model_files=MODEL_FILES,
+                 cache_dir=CACHE_DIR, features_file=FEATURES_FILE):
+        self.compiled_file = compiled_file
+        self.model_files = list(model_files)
+        self.cache_dir = cache_dir
+        self.features_file = features_file
+
+        self._lock = threading.Lock()
+        self._active = None
+        self.candidate = None
+        self.previous = None
+        self.shadow_fraction = 0.0
+
+        self.loading = None      # {"source", "started"} while a candidate loads
+        self.last_error = None
+        self.swaps = 0
+
+    # ---------------------------------------------------
+    # ACCESS
+    # ---------------------------------------------------
+    def active(self):
+        """-> the serving ModelVersion (a snapshot: keep it for the whole request)."""
+        model = self._active
+        if model is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._load(self.compiled_file, self.model_files, "default")
+                    logger.info("SPDM models %s loaded via %s: %s", self._active.version,
+                                self._active.backend,
+                                {k: round(v, 2) for k, v in self._active.load_times.items()})
+                model = self._active
+        return model
+
+    def predictor(self):
+        return self.active().predictor
+
+    @property
+    def version(self):
+        model = self._active
+        return model.version if model is not None else None
+
+    @property
+    def backend(self):
+        model = self._active
+        return model.backend if model is not None else None
+
+    def warm_up(self):
+        self.active()
+        return self.status()
+
+    def status(self):
+        model = self._active
+        return {
+            "loaded": model is not None,
+            "backend": model.backend if model else None,
+            "version": model.version if model else None,
+            "load_ms": dict(model.load_times) if model else {},
+            "loaded_at": model.loaded_at if model else None,
+            "active": model.status() if model else None,
+            "candidate": self.candidate.status() if self.candidate else None,
+            "previous": self.previous.status() if self.previous else None,
+            "shadow_fraction": self.shadow_fraction,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "swaps": self.swaps,
+        }
+
+    # ---------------------------------------------------
+    # ROLLOUT
+    # ---------------------------------------------------
+    def load_candidate(self, model_dir=None, shadow_fraction=None, promote=False):
+        """Start loading a candidate in the background -> False if one is loading.
+
+        model_dir: a directory holding the spdm_*.pkl files (and optionally
+        spdm_compiled.npz); None re-reads the serving files, e.g. after
+        they were replaced in place. promote=True swaps it in once valid.
+        """
+        if model_dir is None:
+            compiled_file, model_files = self.compiled_file, self.model_files
+        else:
+            compiled_file = os.path.join(model_dir, os.path.basename(self.compiled_file))
+            model_files = [os.path.join(model_dir, os.path.basename(p)) for p in self.model_files]
+
+        with self._lock:
+            if self.loading is not None:
+                return False
+            self.loading = {"source": model_dir or "default", "started": time.time()}
+            if shadow_fraction is not None:
+                self.shadow_fraction = shadow_fraction
+
+        thread = threading.Thread(
+            target=self._load_candidate, args=(compiled_file, model_files, model_dir, promote),
+            name="model-loader", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _load_candidate(self, compiled_file, model_files, model_dir, promote):
+        try:
+            active = self.active()
+            model = self._load(compiled_file, model_files, model_dir or "default")
+            if model.version == active.version:
+                raise ValueError(f"model set {model.version} is already active")
+            self.validate(model, active)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.warning("SPDM candidate from %s rejected: %s", model_dir or "default", e)
+        else:
+            self.last_error = None
+            self.candidate = model
+            logger.info("SPDM candidate %s ready via %s", model.version, model.backend)
+            if promote:
+                self.promote()
+        finally:
+            self.loading = None
+
+    def validate(self, model, active):
+        import joblib
+        features = [str(f) for f in joblib.load(self.features_file)]
+        if list(model.predictor.features) != features:
+            raise ValueError(f"feature order does not match {self.features_file}")
+
+        weakness, speed, slope = model.predictor.predict_matrix(probe_matrix(len(features)))
+        if not (np.all(np.isfinite(weakness)) and np.all(np.isfinite(slope))):
+            raise ValueError("non-finite scores on the probe batch")
+        if not set(np.unique(speed)) <= set(active.predictor.speed_classes):
+            raise ValueError("speed categories outside the serving model's classes")
+
+    def promote(self):
+        """candidate -> active -> the version it replaced, or None."""
+        with self._lock:
+            if self.candidate is None:
+                return None
+            self.previous, self._active = self._active, self.candidate
+            self.candidate = None
+            self.swaps += 1
+        logger.info("SPDM models %s promoted (was %s)", self._active.version, self.previous.version)
+        return self.previous.version
+
+    def rollback(self):
+        """previous -> active -> the version it replaced, or None."""
+        with self._lock:
+            if self.previous is None:
+                return None
+            self._active, self.previous = self.previous, self._active
+            self.swaps += 1
+        logger.info("SPDM models rolled back to %s", self._active.version)
+        return self.previous.version
+
+    def discard_candidate(self):
+        with self._lock:
+            candidate, self.candidate = self.candidate, None
+        return candidate.version if candidate else None
+
+    # ---------------------------------------------------
+    # LOADING
+    # ---------------------------------------------------
+    def _load(self, compiled_file, model_files, source):
+        load_times = {}
+        t0 = time.perf_counter()
+        hashes = [file_sha256(p) for p in model_files]
+        load_times["hash_check"] = (time.perf_counter() - t0) * 1000
+        # identifies this model set, e.g. in prediction cache keys
+        version = hashlib.sha256("".join(hashes).encode()).hexdigest()[:12]
+        cache_dir = os.path.join(self.cache_dir, version)
+
+        predictor, backend = (
+            self._load_cache(cache_dir, hashes, load_times)
+            or self._build_cache(compiled_file, cache_dir, hashes, load_times)
+            or self._load_pickles(model_files, load_times)
+        )
+        return ModelVersion(version, predictor, backend, source, load_times)
+
+    def _cache_is_fresh(self, cache_dir, hashes):
+        path = os.path.join(cache_dir, "source_hashes.npy")
+        try:
+            return [str(h) for h in np.load(path)] == hashes
+        except (OSError, ValueError):
+            return False
+
+    def _load_cache(self, cache_dir, hashes, load_times):
+        if not self._cache_is_fresh(cache_dir, hashes):
+            return None
+
+        t0 = time.perf_counter()
+        arrays = {}
+        try:
+            for name in os.listdir(cache_dir):
+                if name.endswith(".npy"):
+                    arrays[name[:-4]] = np.load(
+                        os.path.join(cache_dir, name), mmap_mode="r"
+                    )
+        except (OSError, ValueError):
+            # replaced by another worker mid-read; rebuild or fall back
+            return None
+        predictor = FusedPredictor(arrays)
+        load_times["fused_forest"] = (time.perf_counter() - t0) * 1000
+        return predictor, "fused-mmap"
+
+    def _build_cache(self, compiled_file, cache_dir, hashes, load_times):
+        t0 = time.perf_counter()
+        try:
+            with np.load(compiled_file, allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files}
+        except FileNotFoundError:
+            return None
+
+        if [str(h) for h in arrays["source_hashes"]] != hashes:
+            logger.warning("%s is stale; run compile_models.py", compiled_file)
+            return None
+
+        # Workers warming up together all get here. The cache directory is
+        # never deleted in place, since another worker may be reading it:
+        # a fresh one is used as it is, and a stale or partial one is
+        # renamed aside before this build is renamed in.
+        tmp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix=".build-", dir=self.cache_dir)
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, name + ".npy"), arr)
+            if not self._cache_is_fresh(cache_dir, hashes):
+                if os.path.exists(cache_dir):
+                    os.replace(cache_dir, tmp + "-stale")
+                os.replace(tmp, cache_dir)
+        except OSError:
+            pass   # read-only disk or another worker won the rename
+        finally:
+            if tmp:
+                shutil.rmtree(tmp, ignore_errors=True)
+                shutil.rmtree(tmp + "-stale", ignore_errors=True)
+
+        load_times["cache_build"] = (time.perf_counter() - t0) * 1000
+
+        loaded = self._load_cache(cache_dir, hashes, load_times)
+        if loaded is None:
+            t0 = time.perf_counter()
+            loaded = FusedPredictor(arrays), "fused"
+            load_times["fused_forest"] = (time.perf_counter() - t0) * 1000
+        return loaded
+
+    def _load_pickles(self, model_files, load_times):
+        import joblib
+        from inference import SPDMPredictor
+
+        models = {}
+        for path in model_files:
+            t0 = time.perf_counter()
+            models[_model_name(path)] = joblib.load(path)
+            load_times[_model_name(path)] = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        features = joblib.load(self.features_file)
+        load_times["features"] = (time.perf_counter() - t0) * 1000
+
+        return SPDMPredictor(
+            models["weakness"], models["speed"], models["slope"], features
+        ), "pickle"
+
+
+# ---------------------------------------------------
+# CHECK RUNNER (python model_registry.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    import joblib
+
+    from compile_models import compile_models
+    from shadow import ShadowScorer
+
+    def write_model_set(directory, models, features, compress, tweak=None):
+        os.makedirs(directory)
+        paths = [os.path.join(directory, os.path.basename(p)) for p in MODEL_FILES]
+        for path, model in zip(paths, models):
+            joblib.dump(model, path, compress=compress)   # new bytes, new version id
+        arrays = compile_models(*models, features, [file_sha256(p) for p in paths])
+        if tweak:
+            tweak(arrays)
+        np.savez(os.path.join(directory, COMPILED_FILE), **arrays)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(cache_dir=os.path.join(tmp, "cache"))
+        v1 = registry.active()
+        X = probe_matrix(v1.predictor.n_features)
+        base = v1.predictor.predict_matrix(X)
+
+        models = [joblib.load(p) for p in MODEL_FILES]    # weakness, slope, speed
+        features = joblib.load(FEATURES_FILE)
+
+        def nudge(arrays):
+            arrays["leaf_value"] = arrays["leaf_value"] + 1e-3
+
+        write_model_set(os.path.join(tmp, "v2"), models, features, 3, nudge)
+
+        # loads in the background while v1 keeps serving
+        served = 0
+        loader = registry.load_candidate(os.path.join(tmp, "v2"), shadow_fraction=1.0)
+        while loader.is_alive():
+            registry.active().predictor.predict_matrix(X[:1])
+            served += 1
+        v2 = registry.candidate
+        assert v2 is not None and registry.version == v1.version, registry.last_error
+        print(f"candidate {v2.version} ({v2.backend}) loaded; v1 served {served} predicts meanwhile")
+
+        # shadow scoring: queued off the caller's path, diffs per served version
+        shadow = ShadowScorer(registry)
+        t0 = time.perf_counter()
+        for i in range(len(X)):
+            shadow.offer(v1.version, X[i], tuple(out[i] for out in base))
+        offer_us = (time.perf_counter() - t0) / len(X) * 1e6
+        shadow.drain()
+        diff = v2.diff_against(v1.version).stats()
+        assert diff["rows"] == shadow.scored and diff["weakness_mean_abs_diff"] > 0
+        print(f"shadow: {shadow.scored} scored, {shadow.dropped} dropped, offer {offer_us:.1f}us; "
+              f"weakness diff {diff['weakness_mean_abs_diff']:.4f}, "
+              f"speed changed {diff['speed_changed_rate']}")
+
+        # swap under load: each request sees one version, start to finish
+        expected = {v1.version: base[0], v2.version: v2.predictor.predict_matrix(X)[0]}
+        mixed = []
+
+        def request(j):
+            model = registry.active()
+            for k in range(3):   # a request scoring more than once
+                weakness = model.predictor.predict_matrix(X[(j + k) % len(X)][None])[0][0]
+                if weakness != expected[model.version][(j + k) % len(X)]:
+                    mixed.append(j)
+
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(request, j) for j in range(400)]
+            assert registry.promote() == v1.version
+            assert registry.rollback() == v2.version
+            assert registry.rollback() == v1.version   # and forward again
+            for f in futures:
+                f.result()
+        assert not mixed and registry.version == v2.version and registry.previous is v1
+        assert registry.candidate is None and registry.swaps == 3
+
+        # a model set with the wrong feature order never becomes a candidate
+        def reorder(arrays):
+            arrays["features"] = arrays["features"][::-1]
+
+        write_model_set(os.path.join(tmp, "bad"), models, features, 1, reorder)
+        registry.load_candidate(os.path.join(tmp, "bad")).join()
+        assert registry.candidate is None and "feature order" in registry.last_error
+        assert registry.version == v2.version
+
+        # workers warming up together on a fresh deploy, over a partial cache
+        shared = os.path.join(tmp, "shared")
+        os.makedirs(os.path.join(shared, v1.version))
+        with ThreadPoolExecutor(6) as pool:
+            warmed = list(pool.map(lambda _: ModelRegistry(cache_dir=shared).active(), range(6)))
+        assert {m.version for m in warmed} == {v1.version}
+        assert all(m.backend.startswith("fused") for m in warmed)
+        assert os.listdir(shared) == [v1.version]
+
+    print("model registry checks passed")
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+
+# ---------------------------------------------------
+# PLAN SKELETON CACHE — in-process LRU
+# ---------------------------------------------------
+# A skeleton (engine.build_skeleton) only depends on:
+#   subject, study_mode, speed bucket (0 / 1 / 2), weakness > 0.6,
+#   topic range, days_left (= exam date - today), packing and the
+#   availability calendar (AvailabilityCalendar.key, which pins today)
+# so students sharing those values share one skeleton. It holds day
+# offsets, not dates; engine.render_plan() anchors it to today and draws
+# the messages per request.
+#
+# Entries are evicted least-recently-used past maxsize, and expire once
+# they are older than ttl_days calendar days.
+#
+# With a shared backend (shared_cache.make_backend) misses fall through to
+# it before building, so workers reuse each other's skeletons.
+
+class SkeletonCache:
+
+    def __init__(self, maxsize=4096, ttl_days=1, shared=None, shared_ttl=86400):
+        self.maxsize = maxsize
+        self.ttl_days = ttl_days
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (built_on, skeleton)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+
+    def get_or_build(self, key, build):
+        """-> (skeleton, source) with source "memory", "shared" or "miss"."""
+        today = date.today()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if (today - entry[0]).days < self.ttl_days:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], "memory"
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        skeleton, source = None, "miss"
+        if self.shared is not None:
+            value = self.shared.get(shared_skeleton_key(key))
+            if value is not None:
+                skeleton, source = skeleton_from_bytes(value), "shared"
+                with self._lock:
+                    self.shared_hits += 1
+
+        if skeleton is None:
+            # built outside the lock; a racing duplicate build is harmless
+            skeleton = build()
+            if self.shared is not None:
+                self.shared.set(shared_skeleton_key(key), skeleton_to_bytes(skeleton),
+                                self.shared_ttl)
+
+        with self._lock:
+            self._entries[key] = (today, skeleton)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return skeleton, source
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_days": self.ttl_days,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "shared_hits": self.shared_hits,
+                "shared": self.shared.stats() if self.shared is not None else None,
+            }
+
+
+def skeleton_key(sub_index, study_mode, speed, weakness, lo, hi, days_left, packing="greedy",
+                 calendar_key=None):
+    # adjusted_time() only distinguishes speed 0, speed 2 and everything else
+    speed_bucket = speed if speed in (0, 2) else 1
+    return (sub_index, study_mode, speed_bucket, weakness > 0.6, lo, hi, days_left, packing,
+            calendar_key)
+
+
+# bumped whenever build_skeleton() changes what it stores
+# (2: capped, spilled revision plan from revision.RevisionScheduler)
+# (3: packing order + feasibility verdict)
+# (4: subject fingerprints follow chapter order)
+# (5: count of dropped revision requests)
+SKELETON_VERSION = 5
+
+
+def shared_skeleton_key(key):
+    sub_index, study_mode, speed_bucket, weak, lo, hi, days_left, packing, calendar_key = key
+    key = (f"spdm:skel{SKELETON_VERSION}:{sub_index.fingerprint}:{study_mode}:{int(speed_bucket)}:"
+           f"{int(weak)}:{lo}:{hi}:{days_left}:{packing}")
+    if calendar_key is not None:
+        key += ":cal" + hashlib.sha256(repr(calendar_key).encode()).hexdigest()[:16]
+    return key
+
+
+# ---------------------------------------------------
+# SKELETON <-> BYTES (shared backends)
+# ---------------------------------------------------
+def skeleton_to_bytes(skeleton):
+    positions = skeleton["positions"]
+    lo = int(positions.min()) if len(positions) else 0
+    # syllabus order (every greedy plan) -> just lo; otherwise the permutation
+    in_order = bool((np.diff(positions) == 1).all())
+    return json.dumps({
+        "lo": lo,
+        "order": None if in_order else (positions - lo).tolist(),
+        "times": skeleton["times"].tolist(),
+        "bounds": skeleton["bounds"],
+        "n_days": skeleton["n_days"],
+        # lists of pairs keep insertion order and int keys
+        "weekly": list(skeleton["weekly"].items()),
+        "revision": list(skeleton["revision"].items()),
+        "revisions_dropped": skeleton["revisions_dropped"],
+        "verdict": skeleton.get("verdict"),
+    }, separators=(",", ":")).encode()
+
+
+def skeleton_from_bytes(value):
+    data = json.loads(value)
+    times = np.array(data["times"], dtype=np.int64)
+    if data["order"] is None:
+        positions = np.arange(data["lo"], data["lo"] + len(times))
+    else:
+        positions = data["lo"] + np.array(data["order"], dtype=np.int64)
+    return {
+        "positions": positions,
+        "times": times,
+        "bounds": data["bounds"],
+        "n_days": data["n_days"],
+        "weekly": {wk: cids for wk, cids in data["weekly"]},
+        "revision": {d: entries for d, entries in data["revision"]},
+        "revisions_dropped": data["revisions_dropped"],
+        "verdict": data["verdict"],
+    }
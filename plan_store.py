@@ -0,0 +1,288 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from response_encoding import dumps
+
+
+# ---------------------------------------------------
+# PLAN STORE — persisted plans, day-keyed (SQLite)
+# ---------------------------------------------------
+# PLAN_STORE_URL=sqlite:///plans.db (four slashes for an absolute path;
+# unset = off). Two tables:
+#
+#   plans      plan_id -> the whole plan response (JSON bytes) + etag
+#   plan_days  (plan_id, day) -> one date's topics, message and revision
+#              list (JSON bytes) + etag; WITHOUT ROWID, so the primary
+#              key is the table and a day is one B-tree lookup
+#
+# A plan and its days are written in one transaction and never change
+# afterwards (same plan_id = same inputs, same day, same models), so an
+# ETag is a hash of the stored bytes and a matching If-None-Match is
+# answered from the etag column alone. Reads hand back the stored bytes
+# as they are; nothing is re-rendered or re-serialized.
+#
+# Plans expire after ttl_days; expired and surplus (past max_plans,
+# oldest first) plans are trimmed every trim_every writes. Store errors
+# are counted; a failed write never fails the request that made the plan.
+
+def etag_of(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match header (list, W/ prefixes, *) vs one strong etag."""
+    if not if_none_match or etag is None:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def plan_days(plan):
+    """Verbose plan -> {date: {"date", "topics", "message", "revision"}}."""
+    days = {}
+    for day, detail in plan["daily_plan"].items():
+        days[day] = {"date": day, "topics": detail["topics"], "message": detail["message"],
+                     "revision": []}
+    for day, topics in plan["revision_plan"].items():
+        days.setdefault(day, {"date": day, "topics": [], "message": None, "revision": []})
+        days[day]["revision"] = topics
+    return days
+
+
+class PlanStore:
+
+    def __init__(self, path, ttl_days=30, max_plans=100_000, trim_every=256):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_plans = max_plans
+        self.trim_every = trim_every
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.errors = 0
+        self.not_modified = 0
+
+        # small columns first: reading etag / expires never walks the body's
+        # overflow pages
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " plan_id TEXT PRIMARY KEY, etag TEXT NOT NULL, created REAL NOT NULL,"
+            " expires REAL NOT NULL, body BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS plans_created ON plans(created)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS plan_days ("
+            " plan_id TEXT NOT NULL, day TEXT NOT NULL, etag TEXT NOT NULL, body BLOB NOT NULL,"
+            " PRIMARY KEY (plan_id, day)) WITHOUT ROWID"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------------------------------------------
+    # WRITE
+    # ---------------------------------------------------
+    def save(self, plan_id, response, plan):
+        """response: the plan response dict; plan: its verbose plan -> etag (None on error)."""
+        body = dumps(response)
+        etag = etag_of(body)
+        rows = []
+        for day, detail in plan_days(plan).items():
+            day_body = dumps({"plan_id": plan_id, **detail})
+            rows.append((plan_id, day, etag_of(day_body), day_body))
+
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM plan_days WHERE plan_id = ?", (plan_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO plans (plan_id, etag, created, expires, body)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (plan_id, etag, now, now + self.ttl, body)
+                )
+                conn.executemany(
+                    "INSERT INTO plan_days (plan_id, day, etag, body) VALUES (?, ?, ?, ?)", rows
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % self.trim_every == 0
+            if trim:
+                self._trim(conn, now)
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+        return etag
+
+    def _trim(self, conn, now):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM plans WHERE expires <= ? OR plan_id IN (SELECT plan_id FROM plans"
+                " ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (now, self.max_plans)
+            )
+            conn.execute(
+                "DELETE FROM plan_days WHERE plan_id NOT IN (SELECT plan_id FROM plans)"
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------------------------------------------------
+    # READ
+    # ---------------------------------------------------
+    def _fetch(self, sql, args):
+        try:
+            return self._conn().execute(sql, args).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+
+    def etag(self, plan_id):
+        row = self._fetch("SELECT etag FROM plans WHERE plan_id = ? AND expires > ?",
+                          (plan_id, time.time()))
+        return row[0] if row else None
+
+    def get(self, plan_id):
+        """-> (body, etag) or None."""
+        return self._fetch("SELECT body, etag FROM plans WHERE plan_id = ? AND expires > ?",
+                           (plan_id, time.time()))
+
+    def day_etag(self, plan_id, day):
+        # the plan row decides expiry for its days
+        row = self._fetch(
+            "SELECT d.etag FROM plan_days d JOIN plans p ON p.plan_id = d.plan_id"
+            " WHERE d.plan_id = ? AND d.day = ? AND p.expires > ?",
+            (plan_id, day, time.time())
+        )
+        return row[0] if row else None
+
+    def get_day(self, plan_id, day):
+        """-> (body, etag) or None."""
+        return self._fetch(
+            "SELECT d.body, d.etag FROM plan_days d JOIN plans p ON p.plan_id = d.plan_id"
+            " WHERE d.plan_id = ? AND d.day = ? AND p.expires > ?",
+            (plan_id, day, time.time())
+        )
+
+    def stats(self):
+        try:
+            size = self._conn().execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        return {"backend": "sqlite", "path": self.path, "plans": size,
+                "max_plans": self.max_plans, "ttl_days": self.ttl // 86400,
+                "not_modified": self.not_modified, "errors": self.errors}
+
+
+def make_plan_store(url, ttl_days=30, max_plans=100_000):
+    """sqlite:///path.db | '' / none -> None"""
+    if not url or url == "none":
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return PlanStore(parsed.path[1:] or "spdm_plans.db", ttl_days=ttl_days,
+                         max_plans=max_plans)
+    raise ValueError(f"Unknown plan store: {url}")
+
+
+def plan_store_from_env():
+    return make_plan_store(
+        os.environ.get("PLAN_STORE_URL", ""),
+        ttl_days=int(os.environ.get("PLAN_STORE_TTL_DAYS", "30")),
+        max_plans=int(os.environ.get("PLAN_STORE_MAX", "100000"))
+    )
+
+
+# ---------------------------------------------------
+# CHECK RUNNER (python plan_store.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import json
+    import tempfile
+    from datetime import date, timedelta
+
+    from benchmarks import synthetic_syllabus
+    from engine import generate_realistic_plan_fast
+    from syllabus_index import SyllabusIndex
+
+    def best_ms(fn, runs=200):
+        best = float("inf")
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best * 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_plan_store(f"sqlite:///{tmp}/plans.db", max_plans=3)
+        store.trim_every = 1
+
+        exam = str(date.today() + timedelta(days=3000))
+        sizes = {}
+        for size in (500, 20_000):
+            syllabus = synthetic_syllabus(size)
+            plan = generate_realistic_plan_fast(
+                syllabus, {}, {}, "aggressive", exam, 0.5, "Synthetic",
+                index=SyllabusIndex(syllabus), seed=size
+            )
+            response = {"status": "success", "plan_id": f"p{size}", "plan": plan}
+            etag = store.save(f"p{size}", response, plan)
+
+            body, stored_etag = store.get(f"p{size}")
+            assert stored_etag == etag and json.loads(body) == json.loads(dumps(response))
+            assert store.save(f"p{size}", response, plan) == etag   # same plan, same etag
+
+            days = plan_days(plan)
+            for day in list(days)[:5] + list(days)[-5:]:
+                day_body, day_etag = store.get_day(f"p{size}", day)
+                assert json.loads(day_body) == json.loads(dumps({"plan_id": f"p{size}", **days[day]}))
+                assert store.day_etag(f"p{size}", day) == day_etag
+            assert store.get_day(f"p{size}", "1999-01-01") is None
+
+            last = list(days)[-1]
+            sizes[size] = (len(plan["daily_plan"]),
+                           best_ms(lambda: store.get_day(f"p{size}", last)),
+                           best_ms(lambda: store.get(f"p{size}"), runs=20))
+
+        assert etag_matches('W/"x", ' + etag, etag) and etag_matches("*", etag)
+        assert not etag_matches('"other"', etag) and not etag_matches(None, etag)
+
+        # the oldest plans past max_plans go, days with them
+        for i in range(4):
+            store.save(f"extra{i}", {"plan_id": f"extra{i}"}, plan)
+        assert store.get("p500") is None and store.get_day("p500", last) is None
+        assert store.stats()["plans"] == 3
+
+        # an expired plan is gone for reads at once
+        store.ttl = -1
+        store.save("old", {"plan_id": "old"}, plan)
+        assert store.get("old") is None and store.etag("old") is None
+
+    for size, (n_days, day_ms, plan_ms) in sizes.items():
+        print(f"{size} topics ({n_days} days): one day {day_ms * 1000:.0f}us, whole plan {plan_ms:.2f}ms")
+    print("plan store checks passed")
@@ -0,0 +1,618 @@
+from pydantic import BaseModel, Field, model_validator
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from typing import Literal
+from features import (
+    feature_row, feature_matrix,
+    Score, Rate, PastMarks, QuizScores, EventCount, ClusterId, DateString, Name, Minutes
+)
+from engine import (
+    DAILY_LIMITS, generate_realistic_plan_fast, stream_realistic_plan, generate_combined_plan,
+    expand_compact_plan
+)
+from coalescer import PredictionCoalescer, SingleFlight
+from metrics import observe_model, span
+from model_registry import ModelRegistry
+from shadow import ShadowScorer
+from replan import encode_token, decode_token, replan
+from plan_cache import SkeletonCache
+from plan_store import plan_store_from_env
+from shared_cache import PredictionCache, backend_from_env
+from syllabus_store import SyllabusStore
+
+
+# ------------------------------
+# PLANNER SERVICE
+# ------------------------------
+# Feature calculation, SPDM scoring and plan generation behind the API.
+# Kept free of FastAPI so executor pool processes (and offline jobs) can
+# import it; each process loads its models once through the registry.
+# Every request scores with one registry.active() snapshot, so a model
+# swap never splits a request across versions.
+registry = ModelRegistry()
+
+# SPDM_SHADOW_QUEUE bounds the samples waiting for the candidate; past it
+# samples are dropped, never waited for
+SHADOW = ShadowScorer(registry, queue_size=int(os.environ.get("SPDM_SHADOW_QUEUE", "256")))
+
+
+def warm_up():
+    registry.warm_up()
+
+
+# ------------------------------
+# SYLLABI (compiled, memory-mapped, hot-reloaded)
+# ------------------------------
+# PLANNER_SYLLABI="default=syllabus.json,science=science_syllabus.json";
+# requests pick one with "syllabus" (default: the first). Each request
+# takes one snapshot with SYLLABI.get() and uses it throughout, so a
+# reload never changes a plan half-way. See syllabus_store.py.
+SYLLABI = SyllabusStore.from_env().load()
+
+
+def unknown_syllabus(name):
+    return {"status": "error", "message": f"Unknown syllabus: {name}"}
+
+
+# ------------------------------
+# CACHES (per worker + optional shared backend)
+# ------------------------------
+# PLAN_CACHE_URL: sqlite:///path.db or redis://host:port/db (unset = off)
+SHARED_CACHE = backend_from_env()
+SHARED_CACHE_TTL = int(os.environ.get("PLAN_CACHE_SHARED_TTL", "86400"))
+
+SKELETON_CACHE = SkeletonCache(
+    maxsize=int(os.environ.get("PLAN_CACHE_SIZE", "4096")),
+    ttl_days=int(os.environ.get("PLAN_CACHE_TTL_DAYS", "1")),
+    shared=SHARED_CACHE,
+    shared_ttl=SHARED_CACHE_TTL
+)
+
+PREDICTION_CACHE = (
+    PredictionCache(SHARED_CACHE, ttl=SHARED_CACHE_TTL) if SHARED_CACHE else None
+)
+
+
+# ------------------------------
+# REQUEST COALESCING (single-plan requests)
+# ------------------------------
+# Concurrent single requests score their feature rows together: rows
+# arriving within PLANNER_BATCH_WINDOW_MS (default 0: only what piles up
+# while a batch is scoring) or up to PLANNER_BATCH_MAX rows go through one
+# predict_matrix(), and identical rows in flight are scored once. Identical
+# requests in flight (same input, same format) are planned once and share
+# the response. PLANNER_BATCHING=off scores and plans each on its own.
+# See coalescer.py; GET /batching for the numbers.
+BATCHING = os.environ.get("PLANNER_BATCHING", "on") != "off"
+
+COALESCER = PredictionCoalescer(
+    window_ms=float(os.environ.get("PLANNER_BATCH_WINDOW_MS", "0")),
+    max_batch=int(os.environ.get("PLANNER_BATCH_MAX", "64"))
+) if BATCHING else None
+
+PLAN_FLIGHTS = SingleFlight() if BATCHING else None
+
+
+def batching_stats():
+    if not BATCHING:
+        return {"enabled": False}
+    return {"enabled": True, "predictions": COALESCER.stats(), "plans": PLAN_FLIGHTS.stats()}
+
+
+# ------------------------------
+# PLAN STORE (PLAN_STORE_URL=sqlite:///plans.db, unset = off)
+# ------------------------------
+# A plan id hashes the request, the subject's syllabus fingerprint, the
+# model version and today's date, and seeds the plan's messages: asking
+# again the same day gives the same id and the same plan. With the store
+# on, every plan is saved under its id (GET /plans/{id}) and a repeated
+# request is answered from the store without scoring or planning.
+PLAN_STORE = plan_store_from_env()
+
+
+def plan_id_for(data, syllabus, sub, model_version):
+    """sub: the plan's subject key, or a list of them for a combined plan."""
+    if isinstance(sub, str):
+        fingerprint = syllabus.subjects[sub].fingerprint
+    else:
+        fingerprint = [syllabus.subjects[s].fingerprint for s in sub]
+    key = json.dumps({
+        "input": data.model_dump(mode="json"),
+        "subject": fingerprint,
+        "models": model_version,
+        "today": str(date.today()),
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(key.encode()).hexdigest()[:20]
+
+
+def plan_seed(plan_id):
+    return int(plan_id[:15], 16)
+
+
+def stored_response(data):
+    """-> the stored response for this request, or None."""
+    syllabus = SYLLABI.get(data.syllabus)
+    sub = syllabus.find_subject(data.subject) if syllabus is not None else None
+    if not sub:
+        return None
+
+    # plan ids include the model version
+    model_version = registry.active().version
+    with span("plan_store"):
+        row = PLAN_STORE.get(plan_id_for(data, syllabus, sub, model_version))
+    if row is None:
+        return None
+    return {**json.loads(row[0]), "cache": {"prediction": "stored", "plan": "stored"}}
+
+
+# ------------------------------
+# INPUT MODEL
+# ------------------------------
+# typed, bounded fields (features.py): bad input is a 422 before any
+# feature or model work
+#
+# packing: "deadline" (default) re-packs a plan that would run past the
+# exam (engine.pack_days); "greedy" keeps the plain syllabus-order packing
+#
+# availability: study minutes per weekday plus dated overrides (0 = no
+# study); see availability.py. Left out, every day gets the study_mode's
+# daily minutes.
+Weekday = Literal["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+class AvailabilityOverride(BaseModel):
+    start: DateString
+    end: DateString | None = None
+    minutes: Minutes
+
+
+class Availability(BaseModel):
+    weekly: dict[Weekday, Minutes] = {}
+    overrides: list[AvailabilityOverride] = Field([], max_length=366)
+
+    @model_validator(mode="after")
+    def check_calendar(self):
+        # the checks AvailabilityCalendar makes, as a 422 up front
+        if len(self.weekly) == 7 and not any(self.weekly.values()):
+            raise ValueError("at least one weekday needs study time")
+        spans = sorted((o.start, o.end or o.start) for o in self.overrides)
+        if any(end < start for start, end in spans):
+            raise ValueError("an override ends before it starts")
+        if any(b[0] <= a[1] for a, b in zip(spans, spans[1:])):
+            raise ValueError("overrides overlap")
+        return self
+
+
+class FullPlanInput(BaseModel):
+    subject: Name
+    exam_date: DateString
+    study_mode: Name
+    syllabus: Name | None = None
+    packing: Literal["greedy", "deadline"] = "deadline"
+    availability: Availability | None = None
+
+    start_topic: Name | None = None
+    end_topic: Name | None = None
+
+    marks: Score
+    past_marks: PastMarks
+    quiz_scores: QuizScores
+    attendance: Rate
+    assignment_rate: Rate
+    events_participation: EventCount
+    cluster_id: ClusterId
+
+
+# re-plan from an earlier plan: its plan_token (or the whole earlier
+# response / plan, which carry it) plus progress since then
+class ReplanInput(BaseModel):
+    plan_token: str | None = None
+    plan: dict | None = None
+
+    completed: list[str] = []
+    missed: list[str] = []
+    today: DateString | None = None  # defaults to the server date
+
+
+# one subject's performance inputs inside a multi-subject request
+class SubjectPerformance(BaseModel):
+    subject: Name
+
+    start_topic: Name | None = None
+    end_topic: Name | None = None
+
+    marks: Score
+    past_marks: PastMarks
+    quiz_scores: QuizScores
+    attendance: Rate
+    assignment_rate: Rate
+    events_participation: EventCount
+    cluster_id: ClusterId
+
+
+class MultiSubjectPlanInput(BaseModel):
+    exam_date: DateString
+    study_mode: Name
+    syllabus: Name | None = None
+    subjects: list[SubjectPerformance]
+
+
+# ------------------------------
+# PLAN HELPERS
+# ------------------------------
+def metric_labels(subject, study_mode, syllabus=None):
+    # bounded label values: unknown subjects / modes collapse to one series;
+    # the subject resolves against the syllabus the request named
+    index = SYLLABI.get(syllabus)
+    return (
+        (index is not None and index.find_subject(subject)) or "unknown",
+        study_mode if study_mode in DAILY_LIMITS else "other"
+    )
+
+
+def availability_spec(data):
+    return data.availability.model_dump() if data.availability else None
+
+
+def build_plan_response(data, weakness_score, speed_category,
+                        predicted_slope, discipline_score, model_version,
+                        cache_status=None, compact=False):
+    if cache_status is None:
+        cache_status = {}
+    state = {}
+    verdict = {}
+
+    syllabus = SYLLABI.get(data.syllabus)
+    if syllabus is None:
+        return unknown_syllabus(data.syllabus)
+
+    # SUBJECT MAPS
+    sub = syllabus.find_subject(data.subject)
+
+    if not sub:
+        return {"status": "error", "message": "Subject not found in syllabus"}
+
+    weakness_map = {sub: weakness_score}
+    speed_map = {sub: speed_category}
+    plan_id = plan_id_for(data, syllabus, sub, model_version)
+
+    # GENERATE PLAN
+    with span("plan"):
+        plan = generate_realistic_plan_fast(
+            syllabus_json=None,
+            weakness_map=weakness_map,
+            speed_map=speed_map,
+            study_mode=data.study_mode,
+            exam_date=data.exam_date,
+            discipline_score=discipline_score,
+            subject=sub,
+            start_topic=data.start_topic,
+            end_topic=data.end_topic,
+            index=syllabus,
+            skeleton_cache=SKELETON_CACHE,
+            cache_status=cache_status,
+            state_out=state,
+            compact=compact,
+            packing=data.packing,
+            verdict_out=verdict,
+            availability=availability_spec(data),
+            seed=plan_seed(plan_id)
+        )
+    state["syllabus"] = syllabus.name
+
+    response = {
+        "status": "success",
+        "plan_id": plan_id,
+        "model_version": model_version,
+        "analysis": {
+            "weakness_score": weakness_score,
+            "learning_speed_category": speed_category,
+            "predicted_improvement_slope": predicted_slope,
+            "discipline_score": discipline_score
+        },
+        "plan": plan,
+        "feasibility": verdict,
+        "plan_token": encode_token(state),
+    }
+
+    # the store keeps the verbose plan; a compact one expands to it exactly
+    if PLAN_STORE is not None:
+        with span("plan_store"):
+            verbose = expand_compact_plan(plan) if compact else plan
+            saved = PLAN_STORE.save(plan_id, {**response, "plan": verbose}, verbose)
+        cache_status["store"] = "saved" if saved else "error"
+
+    response["cache"] = cache_status
+    return response
+
+
+# ------------------------------
+# SINGLE STUDENT
+# ------------------------------
+def observe_served(model, seconds, rows=1):
+    model.served.observe(seconds, rows)
+    observe_model(model.version, "served", seconds)
+
+
+def score_matrix(model, X, stage):
+    """Score X with one model snapshot (batch / multi / re-plan)."""
+    t0 = time.perf_counter()
+    with span(stage):
+        outputs = model.predictor.predict_matrix(X)
+    observe_served(model, time.perf_counter() - t0, len(X))
+    SHADOW.offer(model.version, X, outputs)
+    return outputs
+
+
+def score_single(data: FullPlanInput):
+    """-> (feature row, (weakness, speed, slope), model version, cache_status)"""
+    with span("features"):
+        row = feature_row(data)
+
+    model = registry.active()
+    cache_status = {"prediction": "off"}
+
+    scores = None
+    if PREDICTION_CACHE is not None:
+        with span("prediction_cache"):
+            scores = PREDICTION_CACHE.get(row, model.version)
+        cache_status["prediction"] = "hit" if scores else "miss"
+
+    if scores is None:
+        t0 = time.perf_counter()
+        with span("predict"):
+            if COALESCER is not None:
+                scores = COALESCER.predict_row(model.predictor, row)
+            else:
+                scores = model.predictor.predict_row(row)
+        observe_served(model, time.perf_counter() - t0)
+        SHADOW.offer(model.version, row, scores)
+        if PREDICTION_CACHE is not None:
+            PREDICTION_CACHE.set(row, model.version, scores)
+
+    return row, scores, model.version, cache_status
+
+
+def generate_single(data: FullPlanInput, compact=False):
+    if PLAN_FLIGHTS is None:
+        return plan_single(data, compact)
+    return PLAN_FLIGHTS.do((data.model_dump_json(), compact), plan_single, data, compact)
+
+
+def plan_single(data: FullPlanInput, compact=False):
+
+    if PLAN_STORE is not None and not compact:
+        stored = stored_response(data)
+        if stored is not None:
+            return stored
+
+    row, scores, model_version, cache_status = score_single(data)
+    weakness_score, speed_category, predicted_slope = scores
+
+    try:
+        return build_plan_response(
+            data, weakness_score, speed_category, predicted_slope, row[-1],
+            model_version, cache_status, compact
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except KeyError:
+        return {"status": "error", "message": f"Unknown study_mode: {data.study_mode}"}
+
+
+# ------------------------------
+# SINGLE STUDENT — STREAMED (NDJSON)
+# ------------------------------
+# Returns an error dict, or an iterator of NDJSON lines: one "analysis"
+# line, then the engine.stream_realistic_plan() events. Input errors are
+# raised by the engine before the first line, so they still come back as a
+# plain error response.
+def stream_single(data: FullPlanInput):
+
+    syllabus = SYLLABI.get(data.syllabus)
+    if syllabus is None:
+        return unknown_syllabus(data.syllabus)
+
+    sub = syllabus.find_subject(data.subject)
+    if not sub:
+        return {"status": "error", "message": "Subject not found in syllabus"}
+
+    row, scores, model_version, _ = score_single(data)
+    weakness_score, speed_category, predicted_slope = scores
+
+    try:
+        events = stream_realistic_plan(
+            syllabus_json=None,
+            weakness_map={sub: weakness_score},
+            speed_map={sub: speed_category},
+            study_mode=data.study_mode,
+            exam_date=data.exam_date,
+            discipline_score=row[-1],
+            subject=sub,
+            start_topic=data.start_topic,
+            end_topic=data.end_topic,
+            index=syllabus,
+            packing=data.packing,
+            availability=availability_spec(data),
+            seed=plan_seed(plan_id_for(data, syllabus, sub, model_version))
+        )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except KeyError:
+        return {"status": "error", "message": f"Unknown study_mode: {data.study_mode}"}
+
+    analysis = {
+        "type": "analysis",
+        "weakness_score": weakness_score,
+        "learning_speed_category": speed_category,
+        "predicted_improvement_slope": predicted_slope,
+        "discipline_score": row[-1]
+    }
+    return ndjson_lines(analysis, events)
+
+
+def ndjson_lines(first, events):
+    yield json.dumps(first) + "\n"
+    for event in events:
+        yield json.dumps(event) + "\n"
+
+
+# ------------------------------
+# BATCH OF STUDENTS
+# ------------------------------
+def generate_batch(batch: list[FullPlanInput], compact=False):
+
+    if not batch:
+        return {"status": "success", "count": 0, "results": []}
+
+    # ONE FEATURE MATRIX -> ONE PREDICT PER MODEL
+    with span("batch.features"):
+        X = feature_matrix(batch)
+
+    model = registry.active()
+    weakness_scores, speed_categories, predicted_slopes = score_matrix(model, X, "batch.predict")
+
+    # PER-STUDENT PLANS (errors stay in place)
+    results = []
+    for i, data in enumerate(batch):
+        try:
+            results.append(build_plan_response(
+                data,
+                float(weakness_scores[i]),
+                int(speed_categories[i]),
+                float(predicted_slopes[i]),
+                float(X[i, -1]),
+                model.version,
+                compact=compact
+            ))
+        except ValueError as e:
+            results.append({"status": "error", "message": str(e)})
+        except KeyError:
+            results.append({
+                "status": "error",
+                "message": f"Unknown study_mode: {data.study_mode}"
+            })
+
+    return {"status": "success", "count": len(results), "results": results}
+
+
+# ------------------------------
+# SEVERAL SUBJECTS, ONE COMBINED PLAN
+# ------------------------------
+def generate_multi(data: MultiSubjectPlanInput):
+
+    if not data.subjects:
+        return {"status": "error", "message": "At least one subject is required"}
+
+    syllabus = SYLLABI.get(data.syllabus)
+    if syllabus is None:
+        return unknown_syllabus(data.syllabus)
+
+    keys = []
+    for item in data.subjects:
+        sub = syllabus.find_subject(item.subject)
+        if not sub:
+            return {"status": "error", "message": f"Subject not found in syllabus: {item.subject}"}
+        if sub in keys:
+            return {"status": "error", "message": f"Subject listed more than once: {sub}"}
+        keys.append(sub)
+
+    # ONE FEATURE MATRIX -> ONE PREDICT FOR ALL SUBJECTS
+    with span("multi.features"):
+        X = feature_matrix(data.subjects)
+
+    model = registry.active()
+    weakness_scores, speed_categories, predicted_slopes = score_matrix(model, X, "multi.predict")
+
+    analysis = {}
+    entries = []
+    for i, (sub, item) in enumerate(zip(keys, data.subjects)):
+        analysis[sub] = {
+            "weakness_score": float(weakness_scores[i]),
+            "learning_speed_category": int(speed_categories[i]),
+            "predicted_improvement_slope": float(predicted_slopes[i]),
+            "discipline_score": float(X[i, -1])
+        }
+        entries.append({
+            "subject": sub,
+            "weakness": float(weakness_scores[i]),
+            "speed": int(speed_categories[i]),
+            "start_topic": item.start_topic,
+            "end_topic": item.end_topic
+        })
+
+    try:
+        with span("multi.plan"):
+            plan = generate_combined_plan(
+                None, entries, data.study_mode, data.exam_date, index=syllabus,
+                seed=plan_seed(plan_id_for(data, syllabus, keys, model.version))
+            )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except KeyError:
+        return {"status": "error", "message": f"Unknown study_mode: {data.study_mode}"}
+
+    return {"status": "success", "model_version": model.version, "analysis": analysis, "plan": plan}
+
+
+# ------------------------------
+# RE-PLAN FROM A PLAN TOKEN + PROGRESS
+# ------------------------------
+def replan_single(data: ReplanInput):
+
+    token = data.plan_token
+    if token is None and data.plan:
+        token = data.plan.get("plan_token")
+
+    try:
+        state = decode_token(token)
+        today = date.fromisoformat(data.today) if data.today else date.today()
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    # tokens from before named syllabi carry no "syllabus": the default
+    syllabus = SYLLABI.get(state.get("syllabus"))
+    if syllabus is None:
+        return unknown_syllabus(state.get("syllabus"))
+
+    sub_index = syllabus.subjects.get(state.get("subject"))
+    if sub_index is None or sub_index.fingerprint != state.get("fingerprint"):
+        return {
+            "status": "error",
+            "message": "Syllabus changed since this plan was made; generate a new plan"
+        }
+
+    def positions(topics):
+        found = [sub_index.position.get(t.lower().strip()) for t in topics]
+        unknown = [t for t, p in zip(topics, found) if p is None]
+        return found, unknown
+
+    completed, unknown_completed = positions(data.completed)
+    missed, unknown_missed = positions(data.missed)
+    if unknown_completed or unknown_missed:
+        return {
+            "status": "error",
+            "message": "Unknown topic(s): " + ", ".join(unknown_completed + unknown_missed)
+        }
+
+    # the same token + progress + date re-plans to the same messages
+    seed = plan_seed(hashlib.sha256(
+        json.dumps([token, str(today), sorted(completed), sorted(missed)]).encode()
+    ).hexdigest())
+    try:
+        with span("replan"):
+            new_state, patch = replan(state, sub_index, set(completed), set(missed), today,
+                                      seed=seed)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    return {
+        "status": "success",
+        "subject_used": state["subject"],
+        "syllabus_used": syllabus.name,
+        "replan": patch,
+        "plan_token": encode_token(new_state)
+    }
@@ -0,0 +1,218 @@
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+# ---------------------------------------------------
+# ON-DEMAND PROFILING (collapsed stacks, flamegraph-ready)
+# ---------------------------------------------------
+# Two ways in, both writing Brendan Gregg "collapsed" files
+# ("frame;frame;frame value" per line) to PROFILE_DIR:
+#
+#   SamplingSession  every `interval` seconds grabs sys._current_frames()
+#                    and counts stacks that pass through planner code;
+#                    stops after N seconds or N finished requests.
+#                    value = samples. Started by POST /admin/profile or
+#                    SIGUSR2 (fixed SIGNAL_SECONDS run).
+#
+#   run_traced()     sys.setprofile on the worker thread for one request;
+#                    value = self time in microseconds. Picked by the
+#                    X-Profile header, works in process pools too.
+#
+# Frames are "module:function"; stacks start at the first planner frame,
+# so engine stages (engine:build_skeleton;engine:iter_day_bounds ...) and
+# inference (fused_predictor:..., lightgbm ...) show up by name.
+PROFILE_DIR = os.environ.get("PLANNER_PROFILE_DIR", ".profiles")
+SIGNAL_SECONDS = float(os.environ.get("PLANNER_PROFILE_SIGNAL_SECONDS", "30"))
+
+# every module of the planner (the .py files next to this one), so modules
+# added later are attributed too; entry points are left out so stacks
+# start at the service
+ENTRY_POINTS = {"combined_api-planner", "bulk_plans", "benchmarks", "compile_models", "profiler"}
+PLANNER_MODULES = {
+    os.path.splitext(name)[0]
+    for name in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+    if name.endswith(".py")
+} - ENTRY_POINTS
+
+
+def frame_label(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+def planner_stack(frame):
+    """Root-first labels from the outermost planner frame down, or None."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+
+    for i, label in enumerate(labels):
+        if label.split(":", 1)[0] in PLANNER_MODULES:
+            return labels[i:]
+    return None
+
+
+def write_collapsed(stacks, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}.collapsed")
+    with open(path, "w") as f:
+        for stack, value in sorted(stacks.items()):
+            if value > 0:
+                f.write(f"{stack} {int(value)}\n")
+    return path
+
+
+def read_profile(name):
+    # names come from new_profile_id(); anything else is refused
+    if not name or not all(c.isalnum() or c == "-" for c in name):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{name}.collapsed")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+def new_profile_id(kind):
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:8]}"
+
+
+# ---------------------------------------------------
+# SAMPLING SESSION (whole process, N seconds / N requests)
+# ---------------------------------------------------
+class SamplingSession:
+
+    def __init__(self, seconds=10.0, requests=0, interval=0.005):
+        self.id = new_profile_id("sampled")
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.requests_seen = 0
+        self.started_at = time.time()
+        self.path = None
+
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="planner-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def note_request(self):
+        self.requests_seen += 1
+        if self.requests and self.requests_seen >= self.requests:
+            self._done.set()
+
+    def stop(self):
+        self._done.set()
+
+    @property
+    def running(self):
+        return self.path is None
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+
+        while not self._done.wait(self.interval) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = planner_stack(frame)
+                if stack:
+                    self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+        self.path = write_collapsed(self.stacks, self.id)
+
+    def status(self):
+        return {
+            "id": self.id,
+            "running": self.running,
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "requests_seen": self.requests_seen,
+            "samples": self.samples,
+            "started_at": self.started_at,
+            "path": self.path,
+        }
+
+
+_session_lock = threading.Lock()
+SESSION = None
+
+
+def start_session(seconds=10.0, requests=0, interval=0.005):
+    """-> the new session, or None while another one is still running."""
+    global SESSION
+    with _session_lock:
+        if SESSION is not None and SESSION.running:
+            return None
+        SESSION = SamplingSession(seconds, requests, interval).start()
+        return SESSION
+
+
+def note_request():
+    session = SESSION
+    if session is not None and session.running:
+        session.note_request()
+
+
+def install_signal_handler(signum=getattr(signal, "SIGUSR2", None)):
+    """kill -USR2 <worker pid> -> SIGNAL_SECONDS of sampling into PROFILE_DIR."""
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda *_: start_session(seconds=SIGNAL_SECONDS))
+    return True
+
+
+# ---------------------------------------------------
+# TRACED REQUEST (one call, deterministic)
+# ---------------------------------------------------
+class _Tracer:
+
+    def __init__(self):
+        self.stack = []          # [label, start, child time]
+        self.totals = Counter()  # collapsed path -> self seconds
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call":
+            self.stack.append([frame_label(frame.f_code), now, 0.0])
+        elif event == "c_call":
+            module = getattr(arg, "__module__", None) or "builtins"
+            self.stack.append([f"{module}:{getattr(arg, '__qualname__', repr(arg))}", now, 0.0])
+        elif event in ("return", "c_return", "c_exception"):
+            if not self.stack:
+                return
+            path = ";".join(entry[0] for entry in self.stack)
+            label, start, child = self.stack.pop()
+            elapsed = now - start
+            self.totals[path] += elapsed - child
+            if self.stack:
+                self.stack[-1][2] += elapsed
+
+
+def run_traced(fn, *args):
+    """-> (fn(*args), profile id). Module-level so process pools can pickle it."""
+    tracer = _Tracer()
+    sys.setprofile(tracer)
+    try:
+        result = fn(*args)
+    finally:
+        sys.setprofile(None)
+
+    profile_id = new_profile_id("request")
+    micros = {stack: seconds * 1e6 for stack, seconds in tracer.totals.items()}
+    write_collapsed(micros, profile_id)
+    return result, profile_id
@@ -0,0 +1,473 @@
+import base64
+import json
+import random
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from engine import (
+    DAILY_LIMITS, MOTIVATION, DIFFICULTY_CODES,
+    adjusted_times, check_packable, iter_day_bounds, pack_days
+)
+from availability import AvailabilityCalendar
+from revision import RevisionScheduler
+
+
+# ---------------------------------------------------
+# PLAN TOKENS
+# ---------------------------------------------------
+# A plan token is the schedule itself, not the rendered plan:
+#
+#   subject, fingerprint (syllabus_index.SubjectIndex), study_mode, speed,
+#   weakness, origin (day 0 of the plan), exam, first (offset of the first
+#   stored day), lengths (topics per day), positions (syllabus positions,
+#   delta-encoded so runs of consecutive topics compress to almost nothing),
+#   carry (revision requests still pending at `first`, as
+#   RevisionScheduler.pending() lists them), packing (engine.PACKING_MODES),
+#   availability (the calendar spec, or None; closed days are stored as
+#   empty days)
+#
+# serialized as "p1." + base64url(zlib(json)). Only the last KEEP_PAST_DAYS
+# days before a re-plan are kept: revision requests look back at most 7
+# days, and anything older that is still waiting for room is in the carry.
+#
+# Every plan response carries a token, so it is compressed at zlib level 1:
+# on a 20k-topic plan that is ~0.15ms against ~14ms at level 9, for a
+# token about a quarter larger (the deltas are mostly 1s either way).
+TOKEN_PREFIX = "p1."
+TOKEN_ZLIB_LEVEL = 1
+KEEP_PAST_DAYS = 7
+
+
+def encode_token(state):
+    deltas = np.diff(state["positions"], prepend=0).tolist()
+    raw = json.dumps({**state, "positions": deltas}, separators=(",", ":")).encode()
+    return TOKEN_PREFIX + base64.urlsafe_b64encode(
+        zlib.compress(raw, TOKEN_ZLIB_LEVEL)
+    ).decode().rstrip("=")
+
+
+def decode_token(token):
+    if not token or not token.startswith(TOKEN_PREFIX):
+        raise ValueError("Invalid plan token")
+    body = token[len(TOKEN_PREFIX):]
+    try:
+        raw = zlib.decompress(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+        state = json.loads(raw)
+        state["positions"] = np.cumsum(state["positions"], dtype=np.int64).tolist()
+    except (ValueError, zlib.error, KeyError, TypeError):
+        raise ValueError("Invalid plan token")
+
+    if sum(state["lengths"]) != len(state["positions"]):
+        raise ValueError("Invalid plan token")
+    return state
+
+
+# ---------------------------------------------------
+# RE-PLANNING — re-pack from today, patch what moved
+# ---------------------------------------------------
+# Past days count as done unless a topic is listed in `missed`; upcoming
+# topics count as pending unless listed in `completed` (working ahead).
+# Missed topics go first, in syllabus order, then the pending topics in
+# their old order.
+#
+# The packer is greedy, so once a new day starts on the same topic as an
+# old day, with no completed topic removed after that point, every later
+# day packs exactly as before. Re-packing stops there and the old tail is
+# reused, shifted by the difference in day count. Only the re-packed days
+# (plus the tail, if it moved) and their weeks are rendered. Revision
+# dates are replayed for the old and the new schedule side by side and
+# only dates that differ go into the patch; the replay stops once both
+# schedulers hold the same pending requests past the last changed day, so
+# the cost follows the size of the change rather than the syllabus.
+#
+# A packing="deadline" plan is re-packed in full instead: the pending
+# topics go back into syllabus order and engine.pack_days() fits them into
+# the days left, so there is no greedy tail to line up with. So is a plan
+# with an availability calendar, packed against the calendar from today.
+def replan(state, sub_index, completed, missed, today, seed=None):
+    """-> (new state, patch dict). completed / missed are syllabus positions.
+
+    seed: for the messages of re-packed days, as in
+    engine.generate_realistic_plan_fast(); None draws from the module-level random.
+    """
+    origin = date.fromisoformat(state["origin"])
+    exam = date.fromisoformat(state["exam"])
+    limits = DAILY_LIMITS[state["study_mode"]]
+    speed, weakness = state["speed"], state["weakness"]
+    calendar = None
+    if state.get("availability"):
+        calendar = AvailabilityCalendar(state["availability"], origin, limits["time"])
+
+    first = state["first"]
+    lengths = state["lengths"]
+    positions = np.asarray(state["positions"], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    today_off = (today - origin).days
+    exam_off = (exam - origin).days
+    if today_off < first:
+        raise ValueError("Plan token starts after the re-plan date")
+    if today_off > exam_off:
+        raise ValueError("Exam date has already passed")
+
+    # ---------------------------------------------------
+    # 1. NEW TASK SEQUENCE: missed + pending - completed
+    # ---------------------------------------------------
+    k0 = min(today_off - first, len(lengths))       # first upcoming day index
+    future = positions[starts[k0]:]
+
+    removed = np.isin(future, np.asarray(list(completed), dtype=np.int64))
+    kept_idx = np.flatnonzero(~removed)
+    last_removed = int(np.flatnonzero(removed)[-1]) if removed.any() else -1
+
+    candidates = np.asarray(sorted(set(missed) - set(completed)), dtype=np.int64)
+    extra = candidates[~np.isin(candidates, future[kept_idx])]
+    packing = state.get("packing", "greedy")
+    pending = future[kept_idx]
+    if packing == "deadline":
+        pending = np.sort(pending)
+    sequence = np.concatenate([extra, pending])
+
+    codes = sub_index.difficulty_code[sequence]
+    times = adjusted_times(sub_index.estimated_time[sequence], speed, weakness)
+    check_packable(codes, times, limits if calendar is None else calendar.packing_limits(limits))
+
+    # old upcoming day starts, relative to `future`
+    old_starts = starts[k0:-1] - starts[k0]
+
+    # ---------------------------------------------------
+    # 2. RE-PACK UNTIL THE OLD SCHEDULE LINES UP AGAIN
+    # ---------------------------------------------------
+    new_days = []
+    tail_day = None   # index of the first reused upcoming day
+    if packing == "deadline" or calendar is not None:
+        order, bounds = pack_days(codes, times, sub_index.chapter_id[sequence], limits,
+                                  exam_off - today_off, packing, calendar, first=today_off)
+        if order is not None:
+            sequence = sequence[order]
+        new_days = list(zip(bounds, bounds[1:]))
+    else:
+        for start, stop in iter_day_bounds(codes, times, limits):
+            new_days.append((start, stop))
+            if stop >= len(sequence) or stop < len(extra):
+                continue
+            t = kept_idx[stop - len(extra)]
+            m = int(np.searchsorted(old_starts, t))
+            if t > last_removed and m < len(old_starts) and old_starts[m] == t:
+                tail_day = m
+                break
+
+    n_upcoming_old = len(lengths) - k0
+    if tail_day is None:
+        tail_day = n_upcoming_old
+    shift = len(new_days) - tail_day
+
+    # ---------------------------------------------------
+    # 3. NEW STATE (past window + re-packed + shifted tail)
+    # ---------------------------------------------------
+    # stored days are consecutive; a break between the past and today is
+    # kept as empty days
+    kp = min(max(0, today_off - KEEP_PAST_DAYS - first), k0)
+    new_first = first + kp if kp < k0 else today_off
+    gap = today_off - (first + k0) if kp < k0 else 0
+    tail = k0 + tail_day
+
+    new_lengths = (
+        list(lengths[kp:k0]) + [0] * gap
+        + [stop - start for start, stop in new_days] + list(lengths[tail:])
+    )
+    new_positions = np.concatenate([
+        positions[starts[kp]:starts[k0]],
+        sequence[:new_days[-1][1] if new_days else 0],
+        positions[starts[tail]:],
+    ])
+    new_state = {
+        **state,
+        "first": new_first,
+        "lengths": new_lengths,
+        "positions": new_positions.tolist(),
+    }
+
+    new_starts = np.concatenate([[0], np.cumsum(new_lengths)]).astype(np.int64)
+
+    def day_positions(d):
+        k = d - new_first
+        if 0 <= k < len(new_lengths):
+            return new_positions[new_starts[k]:new_starts[k + 1]].tolist()
+        return []
+
+    # ---------------------------------------------------
+    # 4. PATCH: changed days, affected revision dates and weeks
+    # ---------------------------------------------------
+    old_end = today_off + n_upcoming_old            # first offset after the old plan
+    new_end = today_off + len(new_days) + (n_upcoming_old - tail_day)
+    changed = set(range(today_off, today_off + len(new_days)))
+    if shift:
+        changed.update(range(today_off + len(new_days), max(old_end, new_end)))
+
+    day_lists = {}   # offset -> positions, only for days the patch reads
+
+    def day_at(d):
+        if d not in day_lists:
+            day_lists[d] = day_positions(d)
+        return day_lists[d]
+
+    time_of = {}
+    needed = sorted({p for d in changed for p in day_at(d)})
+    if needed:
+        needed_times = adjusted_times(sub_index.estimated_time[needed], speed, weakness)
+        time_of = dict(zip(needed, needed_times.tolist()))
+
+    def day_date(d):
+        return str(origin + timedelta(days=d))
+
+    rng = random if seed is None else random.Random(seed)
+    daily_plan = {}
+    for d in sorted(changed):
+        if not day_at(d):
+            daily_plan[day_date(d)] = None
+            continue
+        daily_plan[day_date(d)] = {
+            "topics": [
+                {
+                    "chapter": sub_index.chapters[int(sub_index.chapter_id[p])],
+                    "topic": sub_index.topics[p],
+                    "difficulty": sub_index.difficulty[p],
+                    "time": time_of[p]
+                }
+                for p in day_lists[d]
+            ],
+            "message": rng.choice(MOTIVATION)
+        }
+
+    def old_day(d):
+        k = d - first
+        if 0 <= k < len(lengths):
+            return positions[starts[k]:starts[k + 1]].tolist()
+        return []
+
+    revisions, new_state["carry"] = replay_revisions(
+        state, new_first, old_day, day_at, sub_index, exam_off, today_off,
+        settled=max(changed, default=today_off) + 7, calendar=calendar
+    )
+    revision_plan = {
+        day_date(r): entries and [sub_index.topics[p] for p in entries]
+        for r, entries in revisions.items()
+    }
+
+    weekly_overview = {}
+    for wk in sorted({d // 7 + 1 for d in changed}):
+        chapter_ids = [
+            int(sub_index.chapter_id[p])
+            for d in range((wk - 1) * 7, wk * 7) for p in day_at(d)
+        ]
+        weekly_overview[wk] = (
+            [sub_index.chapters[c] for c in dict.fromkeys(chapter_ids)] if chapter_ids else None
+        )
+
+    patch = {
+        "today": str(today),
+        "days_left": exam_off - today_off,
+        "repacked_days": len(new_days),
+        "shift_days": shift,
+        "remaining_topics": int(len(sequence)),
+        "last_study_day": day_date(new_end - 1) if new_end > today_off else None,
+        "daily_plan": daily_plan,
+        "revision_plan": revision_plan,
+        "weekly_overview": weekly_overview,
+    }
+    return new_state, patch
+
+
+def revision_requests(day, sub_index):
+    """One study day's +1 / +3 / +7 requests, as RevisionScheduler.add_day() takes them."""
+    medium = DIFFICULTY_CODES["medium"]
+    chapters = dict.fromkeys(int(sub_index.chapter_id[p]) for p in day)
+    return (
+        day[-2:],
+        [p for p in day if sub_index.difficulty_code[p] >= medium],
+        [p for cid in chapters for p in sub_index.key_topics[cid]],
+    )
+
+
+def replay_revisions(state, new_first, old_day, new_day, sub_index, exam_off, today_off, settled,
+                     calendar=None):
+    """Close the old and new revision schedules date by date.
+
+    -> ({offset: new positions, or None if the date lost its revision} for
+    dates from today that differ, carry for the new state at new_first).
+    """
+    first = state["first"]
+    old = RevisionScheduler(exam_off, carry=state.get("carry", ()), start=first,
+                            calendar=calendar)
+    new = carry = None
+    changed = {}
+
+    for r in range(first, exam_off + 1):
+        if r > first:
+            old.add_day(r - 1, *revision_requests(old_day(r - 1), sub_index))
+        if r == new_first:
+            carry = old.pending()
+            new = RevisionScheduler(exam_off, carry=carry, start=new_first, calendar=calendar)
+        elif new is not None:
+            new.add_day(r - 1, *revision_requests(new_day(r - 1), sub_index))
+
+        old_entries = old.close(r)
+        if new is None:
+            continue
+        new_entries = new.close(r)
+        if r >= today_off and old_entries != new_entries:
+            changed[r] = new_entries or None
+
+        # same pending requests and the same days from here on
+        if r > settled and old.pending() == new.pending():
+            break
+
+    return changed, carry
+
+
+# ---------------------------------------------------
+# CHECK RUNNER (python replan.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import time
+    from engine import generate_realistic_plan_fast
+    from syllabus_index import SyllabusIndex
+
+    with open("syllabus.json") as f:
+        syllabus = json.load(f)
+    index = SyllabusIndex(syllabus)
+    rng = random.Random(7)
+
+    def view(state, sub_index):
+        """Full days / revision / weekly of a state, keyed by date."""
+        origin = date.fromisoformat(state["origin"])
+        exam_off = (date.fromisoformat(state["exam"]) - origin).days
+        starts = np.concatenate([[0], np.cumsum(state["lengths"])])
+        days = {
+            state["first"] + k: state["positions"][starts[k]:starts[k + 1]]
+            for k in range(len(state["lengths"])) if state["lengths"][k]
+        }
+        dated = lambda d: str(origin + timedelta(days=d))
+        calendar = state.get("availability") and AvailabilityCalendar(
+            state["availability"], origin, DAILY_LIMITS[state["study_mode"]]["time"])
+        scheduler = RevisionScheduler(exam_off, carry=state.get("carry", ()),
+                                      start=state["first"], calendar=calendar or None)
+        for d, ps in days.items():
+            scheduler.add_day(d, *revision_requests(ps, sub_index))
+        revision = {
+            dated(r): [sub_index.topics[p] for p in ps]
+            for r, ps in scheduler.schedule(state["first"]).items()
+        }
+        return {dated(d): [sub_index.topics[p] for p in ps] for d, ps in days.items()}, revision
+
+    def apply(old, patch_part, from_date):
+        merged = {k: v for k, v in old.items() if k >= from_date}
+        for k, v in patch_part.items():
+            if v is None:
+                merged.pop(k, None)
+            else:
+                merged[k] = v
+        return merged
+
+    checked = 0
+    for subject, mode in [(s, m) for s in syllabus for m in ("moderate", "aggressive")]:
+        sub_index = index.subjects[subject]
+        for trial in range(40):
+            # deadline plans get a tight exam so some of them are re-packed;
+            # every other pair studies by an availability calendar
+            packing = ("greedy", "deadline")[trial % 2]
+            availability = None
+            if trial % 4 >= 2:
+                availability = {"weekly": {"sun": 0, "sat": rng.choice([60, 300])}, "overrides": [
+                    {"start": str(date.today() + timedelta(days=rng.randint(0, 10))),
+                     "end": str(date.today() + timedelta(days=rng.randint(11, 16))), "minutes": 0}]}
+            exam_date = "2099-01-01" if packing == "greedy" else str(
+                date.today() + timedelta(days=rng.randint(15, 60)))
+            state = {}
+            plan = generate_realistic_plan_fast(
+                syllabus, {subject: rng.choice([0.3, 0.7])}, {subject: rng.choice([0, 1, 2])},
+                mode, exam_date, 0.5, subject, index=index, state_out=state, packing=packing,
+                availability=availability
+            )
+            state = decode_token(encode_token(state))
+
+            # the engine's revision plan is what the replayed schedule gives
+            assert view(state, sub_index)[1] == plan["revision_plan"], (subject, mode)
+
+            today = date.fromisoformat(state["origin"])
+            for step in range(4):
+                today = min(today + timedelta(days=rng.randint(0, 5)),
+                            date.fromisoformat(state["exam"]))
+                today_off = (today - date.fromisoformat(state["origin"])).days
+                starts = np.concatenate([[0], np.cumsum(state["lengths"])])
+                k0 = min(today_off - state["first"], len(state["lengths"]))
+                past = state["positions"][:starts[k0]]
+                upcoming = state["positions"][starts[k0]:]
+
+                completed = set(rng.sample(upcoming, min(len(upcoming), rng.randint(0, 3))))
+                missed = set(rng.sample(past, min(len(past), rng.randint(0, 3))))
+
+                old_days, old_revision = view(state, sub_index)
+                new_state, patch = replan(state, sub_index, completed, missed, today)
+                new_days, new_revision = view(new_state, sub_index)
+
+                # splice == re-packing everything from today
+                pending = [p for p in upcoming if p not in completed]
+                if packing == "deadline":
+                    pending.sort()
+                sequence = np.asarray(sorted(missed - set(upcoming)) + pending, dtype=np.int64)
+                times = adjusted_times(sub_index.estimated_time[sequence],
+                                       state["speed"], state["weakness"])
+                origin = date.fromisoformat(state["origin"])
+                calendar = availability and AvailabilityCalendar(
+                    availability, origin, DAILY_LIMITS[mode]["time"])
+                order, bounds = pack_days(
+                    sub_index.difficulty_code[sequence], times, sub_index.chapter_id[sequence],
+                    DAILY_LIMITS[mode], (date.fromisoformat(state["exam"]) - today).days, packing,
+                    calendar, first=today_off)
+                if order is not None:
+                    sequence = sequence[order]
+                full = [sequence[a:b].tolist() for a, b in zip(bounds, bounds[1:]) if b > a]
+                assert [ps for d, ps in sorted(view(new_state, sub_index)[0].items())
+                        if d >= str(today)] == [[sub_index.topics[p] for p in ps] for ps in full]
+
+                # old view + patch == new view, from today on
+                patched_days = apply(old_days, {
+                    k: v and [t["topic"] for t in v["topics"]] for k, v in patch["daily_plan"].items()
+                }, str(today))
+                assert patched_days == {k: v for k, v in new_days.items() if k >= str(today)}
+                assert apply(old_revision, patch["revision_plan"], str(today)) == {
+                    k: v for k, v in new_revision.items() if k >= str(today)
+                }
+
+                state = decode_token(encode_token(new_state))
+                checked += 1
+
+    # cost follows the change: one completed topic on a 20k-topic plan
+    big = {"Big": {f"Chapter {c}": [
+        {"topic": f"T{c}-{i}", "difficulty": ["easy", "medium", "hard"][(c + i) % 3],
+         "estimated_time": 30} for i in range(10)] for c in range(2000)}}
+    big_index = SyllabusIndex(big)
+    state = {}
+    t0 = time.perf_counter()
+    generate_realistic_plan_fast(big, {"Big": 0.4}, {"Big": 1}, "aggressive", "2099-01-01",
+                                 0.5, "Big", index=big_index, state_out=state)
+    full_ms = (time.perf_counter() - t0) * 1000
+    token = encode_token(state)
+    t0 = time.perf_counter()
+    _, patch = replan(decode_token(token), big_index.subjects["Big"],
+                      {state["positions"][30]}, set(), date.fromisoformat(state["origin"]))
+    replan_ms = (time.perf_counter() - t0) * 1000
+
+    # a seed fixes the messages of re-packed days
+    repeat = [replan(decode_token(token), big_index.subjects["Big"], {state["positions"][30]},
+                     set(), date.fromisoformat(state["origin"]), seed=11)[1] for _ in range(2)]
+    assert repeat[0] == repeat[1] and repeat[0]["daily_plan"]
+
+    print(f"replan matches a full re-pack and patches cleanly on {checked} re-plans")
+    print(f"20k topics: full plan {full_ms:.1f}ms, token {len(token)} bytes, "
+          f"replan {replan_ms:.1f}ms ({patch['repacked_days']} day(s) re-packed, "
+          f"{len(patch['daily_plan'])} patched)")
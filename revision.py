@@ -0,0 +1,209 @@
+from bisect import bisect_left
+
+
+# ---------------------------------------------------
+# REVISION SCHEDULER — per-date capacity + spill queue
+# ---------------------------------------------------
+# Every study day d asks for revision of
+#   +1  its last two topics
+#   +3  its medium / hard topics
+#   +7  the key topics (SubjectIndex.key_topics) of each chapter it touched
+#
+# Requests are bucketed by target date as they arrive; days are added in
+# order, so each bucket is already in (source day, arrival) order, the
+# order the old per-date lists were built in. Repeated requests for the
+# same topic on the same date are rejected before placement.
+#
+# close(date) places up to REVISION_CAP topics on that date: first what
+# spilled from earlier dates (oldest first), then the date's own bucket.
+# A topic already placed on that date is rejected; requests that do not fit
+# spill, in order, to the next date. A request still unplaced
+# REVISION_MAX_DELAY days after its target, or at the exam, is dropped and
+# counted in .dropped; the engines report that count with the plan
+# (feasibility, the stream's end event, the combined plan) and in
+# planner_revisions_dropped_total. Each request is touched once when it is placed or
+# rejected, plus once per day it waits (at most REVISION_MAX_DELAY).
+#
+# Dates are closed in order, and only once every day that can feed them
+# (the 7 before) has been added; the streaming engine closes d + 1 right
+# after day d.
+#
+# With an availability calendar (availability.AvailabilityCalendar) each
+# request's date snaps forward to the next open day, and closed dates
+# place nothing: anything due there waits, as spill, for the next open one.
+REVISION_CAP = 5
+REVISION_MAX_DELAY = 7
+REVISION_OFFSETS = (1, 3, 7)
+
+
+class RevisionScheduler:
+
+    def __init__(self, last_date, carry=(), start=0,
+                 cap=REVISION_CAP, max_delay=REVISION_MAX_DELAY, calendar=None):
+        """last_date: the exam's day offset.
+
+        carry: pending() of an earlier scheduler, resumed here from date
+        `start` (the first date this one will close).
+        """
+        self.last_date = last_date
+        self.cap = cap
+        self.max_delay = max_delay
+        self.calendar = calendar
+        self.dropped = 0
+
+        self._buckets = {}        # target date -> [item, ...] in request order
+        self._spill_targets = []  # spilled requests, oldest first
+        self._spill_items = []
+
+        for target, item in carry:
+            if target < start:
+                self._spill_targets.append(target)
+                self._spill_items.append(item)
+            else:
+                self._buckets.setdefault(target, []).append(item)
+
+    def add_day(self, d, recent, revisable, key_topics):
+        """Queue day d's +1 / +3 / +7 requests (items are any hashable topic ref)."""
+        for offset, items in zip(REVISION_OFFSETS, (recent, revisable, key_topics)):
+            target = d + offset
+            if items and self.calendar is not None:
+                target = self.calendar.next_open(target)
+            if items and target <= self.last_date:
+                self._buckets.setdefault(target, []).extend(items)
+
+    def close(self, date):
+        """-> items revised on `date`, at most cap, in priority order."""
+        fresh = self._buckets.pop(date, [])
+        if len(set(fresh)) != len(fresh):
+            fresh = list(dict.fromkeys(fresh))   # repeated requests for one date
+
+        if self.calendar is not None and not self.calendar.is_open(date):
+            placed = []      # a closed day: everything due waits
+            self._spill_targets += [date] * len(fresh)
+            self._spill_items += fresh
+        elif not self._spill_items and len(fresh) <= self.cap:
+            placed = fresh   # the common case: nothing waiting, no overflow
+        else:
+            # spilled requests are in target order: the expired ones are a prefix
+            first = bisect_left(self._spill_targets, date - self.max_delay)
+            self.dropped += first
+
+            targets = self._spill_targets[first:] + [date] * len(fresh)
+            queue = self._spill_items[first:] + fresh
+            placed = []
+            taken = 0
+            while taken < len(queue) and len(placed) < self.cap:
+                if queue[taken] not in placed:
+                    placed.append(queue[taken])
+                taken += 1
+
+            self._spill_targets = targets[taken:]
+            self._spill_items = queue[taken:]
+
+        if date >= self.last_date:
+            self.dropped += len(self._spill_items) + sum(map(len, self._buckets.values()))
+            self._spill_targets, self._spill_items = [], []
+            self._buckets.clear()
+        return placed
+
+    def schedule(self, start):
+        """Close start, start + 1, ... until nothing is pending -> {date: items}."""
+        revision = {}
+        upcoming = sorted(self._buckets)
+        i = 0
+        date = start
+        while date <= self.last_date:
+            placed = self.close(date)
+            if placed:
+                revision[date] = placed
+
+            while i < len(upcoming) and upcoming[i] <= date:
+                i += 1
+            if self._spill_items:
+                date += 1
+            elif i < len(upcoming):
+                date = upcoming[i]
+            else:
+                break
+        return revision
+
+    def pending(self):
+        """-> [(target, item), ...] in priority order (a carry for a later scheduler)."""
+        return list(zip(self._spill_targets, self._spill_items)) + [
+            (target, item) for target in sorted(self._buckets) for item in self._buckets[target]
+        ]
+
+
+# ---------------------------------------------------
+# CHECK RUNNER (python revision.py)
+# ---------------------------------------------------
+if __name__ == "__main__":
+    # a quiet stretch: every request lands on its own date, in arrival order
+    s = RevisionScheduler(30)
+    s.add_day(0, ["a", "b"], ["b"], ["k1", "k2"])
+    assert s.schedule(1) == {1: ["a", "b"], 3: ["b"], 7: ["k1", "k2"]}
+
+    # duplicates on one date are rejected, overflow spills to the next date
+    s = RevisionScheduler(30)
+    for d in range(3):
+        s.add_day(d, [f"t{d}", f"u{d}"], [f"t{d}", f"u{d}", f"v{d}"], ["k", f"t{d}"])
+    s.add_day(2, ["t2"], [], [])   # a second +1 request for t2 on day 3
+    plan = s.schedule(1)
+    assert all(len(items) <= REVISION_CAP and len(set(items)) == len(items)
+               for items in plan.values())
+    assert plan[3] == ["t0", "u0", "v0", "t2", "u2"]
+    assert plan[4][:2] == ["t1", "u1"]
+    assert s.dropped == 0
+
+    # nothing is lost while there is room before the exam (8 requests
+    # every other day against 5 a day)
+    s = RevisionScheduler(60)
+    requests = 0
+    for d in range(0, 40, 2):
+        s.add_day(d, [d, d + 100], [d + 200, d + 300, d + 400], [d + 500, d + 600, d + 700])
+        requests += 8
+    placed = sum(len(items) for items in s.schedule(1).values())
+    assert placed == requests and s.dropped == 0, (placed, requests)
+
+    # ... and what is left at the exam is counted, not silently lost
+    s = RevisionScheduler(10)
+    for d in range(10):
+        s.add_day(d, [d, d + 100], [d + 200, d + 300, d + 400], [d + 500, d + 600, d + 700])
+    placed = sum(len(items) for items in s.schedule(1).values())
+    assert placed <= 10 * REVISION_CAP and s.dropped > 0
+
+    # closing in two runs with a carry == one run
+    def requests_for(d):
+        return d, [d, d + 1], [d + 50, d + 51], [d // 3 + 90, d // 3 + 91, d // 3 + 92]
+
+    full = RevisionScheduler(40)
+    first = RevisionScheduler(40)
+    for d in range(12):
+        full.add_day(*requests_for(d))
+        if d < 6:
+            first.add_day(*requests_for(d))
+    expected = full.schedule(1)
+    got = {r: first.close(r) for r in range(1, 7)}
+    second = RevisionScheduler(40, carry=first.pending(), start=7)
+    for d in range(6, 12):
+        second.add_day(*requests_for(d))
+    got.update(second.schedule(7))
+    assert {r: v for r, v in got.items() if v} == expected
+
+    # with a calendar every revision lands on an open day
+    from datetime import date
+    from availability import AvailabilityCalendar
+
+    calendar = AvailabilityCalendar({"weekly": {"sat": 0, "sun": 0}, "overrides": [
+        {"start": "2026-10-21", "end": "2026-10-23", "minutes": 0}]}, date(2026, 10, 12), 90)
+    s = RevisionScheduler(40, calendar=calendar)
+    requests = 0
+    for d in range(0, 30, 3):
+        if calendar.is_open(d):
+            s.add_day(d, [d, d + 100], [d + 200], [d + 300])
+            requests += 4
+    plan = s.schedule(1)
+    assert all(calendar.is_open(r) for r in plan), sorted(plan)
+    assert sum(len(items) for items in plan.values()) == requests and s.dropped == 0
+
+    print("revision scheduler checks passed")
@@ -0,0 +1,161 @@
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+
+from metrics import observe_model
+
+
+# ---------------------------------------------------
+# PER-VERSION STATS
+# ---------------------------------------------------
+# Plain counters, updated by one thread per sample under a lock; read by
+# GET /models. Latency percentiles come from planner_model_seconds in
+# /metrics; here: count, mean and max.
+class LatencyStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, rows=1):
+        with self._lock:
+            self.count += 1
+            self.rows += rows
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.count,
+                "rows": self.rows,
+                "mean_ms": round(self.total / self.count * 1000, 4) if self.count else None,
+                "max_ms": round(self.max * 1000, 4) if self.count else None,
+            }
+
+
+class OutputDiff:
+    """Candidate vs served outputs, row by row."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.weakness_abs = 0.0
+        self.weakness_max = 0.0
+        self.slope_abs = 0.0
+        self.slope_max = 0.0
+        self.speed_changed = 0
+
+    def add(self, served, candidate):
+        weakness = np.abs(np.asarray(candidate[0]) - served[0])
+        slope = np.abs(np.asarray(candidate[2]) - served[2])
+        changed = int(np.count_nonzero(np.asarray(candidate[1]) != served[1]))
+        with self._lock:
+            self.rows += len(weakness)
+            self.weakness_abs += float(weakness.sum())
+            self.weakness_max = max(self.weakness_max, float(weakness.max()))
+            self.slope_abs += float(slope.sum())
+            self.slope_max = max(self.slope_max, float(slope.max()))
+            self.speed_changed += changed
+
+    def stats(self):
+        with self._lock:
+            if not self.rows:
+                return {"rows": 0}
+            return {
+                "rows": self.rows,
+                "weakness_mean_abs_diff": self.weakness_abs / self.rows,
+                "weakness_max_abs_diff": self.weakness_max,
+                "slope_mean_abs_diff": self.slope_abs / self.rows,
+                "slope_max_abs_diff": self.slope_max,
+                "speed_changed_rate": round(self.speed_changed / self.rows, 4),
+            }
+
+
+# ---------------------------------------------------
+# SHADOW SCORING — candidate models on sampled live traffic
+# ---------------------------------------------------
+# offer() is called after a request has its own scores. With a candidate
+# loaded and registry.shadow_fraction > 0, a sampled fraction of offers
+# is queued (features + served outputs) for a background thread, which
+# scores the candidate on them and records its latency and output diffs
+# on the candidate's ModelVersion. The caller only pays a random() and a
+# put_nowait(): a full queue drops the sample (counted) instead of
+# waiting, and nothing the candidate returns reaches a response.
+class ShadowScorer:
+
+    def __init__(self, registry, queue_size=256, workers=1):
+        self.registry = registry
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+        self.sampled = 0
+        self.dropped = 0
+        self.scored = 0
+        self.errors = 0
+
+    def offer(self, served_version, X, outputs):
+        """X: the rows a request was scored on; outputs: its (weakness, speed, slope)."""
+        candidate = self.registry.candidate
+        fraction = self.registry.shadow_fraction
+        if candidate is None or fraction <= 0 or random.random() >= fraction:
+            return
+        self.sampled += 1
+
+        if not self._threads:
+            self._start()
+        try:
+            self._queue.put_nowait((candidate, served_version, X, outputs))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"shadow-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            candidate, served_version, X, outputs = self._queue.get()
+            try:
+                X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+                served = [np.atleast_1d(np.asarray(o)) for o in outputs]
+                t0 = time.perf_counter()
+                result = candidate.predictor.predict_matrix(X)
+                seconds = time.perf_counter() - t0
+
+                candidate.shadow.observe(seconds, len(X))
+                candidate.diff_against(served_version).add(served, result)
+                observe_model(candidate.version, "shadow", seconds)
+                self.scored += 1
+            except Exception:
+                self.errors += 1
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        """Wait for queued samples (checks and shutdown)."""
+        self._queue.join()
+
+    def stats(self):
+        return {
+            "fraction": self.registry.shadow_fraction,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "sampled": self.sampled,
+            "scored": self.scored,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
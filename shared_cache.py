@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+
+# ---------------------------------------------------
+# SHARED CACHE BACKENDS (cross-worker)
+# ---------------------------------------------------
+# Every uvicorn worker keeps its own in-process caches; these backends sit
+# behind them so all workers (and boxes, for Redis) share hits.
+#
+#   sqlite:///cache.db           one box, any number of workers (WAL mode);
+#   sqlite:////abs/cache.db      four slashes for an absolute path
+#   redis://host:6379/0          anything speaking the Redis protocol
+#
+# Backend contract: get(key) -> bytes | None, set(key, value, ttl_seconds),
+# stats() -> dict. Each backend enforces a TTL per entry and a max entry
+# count. Backend errors are counted and treated as misses; a broken
+# cache never fails a request.
+
+class SQLiteBackend:
+
+    def __init__(self, path, max_entries=100_000, trim_every=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.trim_every = trim_every
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.errors = 0
+
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires REAL NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_created ON cache(created)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, created)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % self.trim_every == 0
+            if trim:
+                self._trim(conn, now)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def _trim(self, conn, now):
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache"
+            " ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        try:
+            size = self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        return {"backend": "sqlite", "path": self.path, "size": size,
+                "max_entries": self.max_entries, "errors": self.errors}
+
+
+class RedisBackend:
+    """Minimal RESP client (GET / SET PX / ZADD index) — no redis package needed."""
+
+    INDEX_KEY = "spdm:cache:index"
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None,
+                 max_entries=100_000, timeout=0.25):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self.errors = 0
+
+    # ---------------------------------------------------
+    # RESP PLUMBING
+    # ---------------------------------------------------
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._call(("AUTH", self.password))
+        if self.db:
+            self._call(("SELECT", self.db))
+
+    def _send(self, *commands):
+        if getattr(self._local, "sock", None) is None:
+            self._connect()
+        out = bytearray()
+        for cmd in commands:
+            out += b"*%d\r\n" % len(cmd)
+            for arg in cmd:
+                if not isinstance(arg, bytes):
+                    arg = str(arg).encode()
+                out += b"$%d\r\n%s\r\n" % (len(arg), arg)
+        self._local.sock.sendall(out)
+        return [self._read() for _ in commands]
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self._local.reader.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise ConnectionError(f"bad RESP reply {line!r}")
+
+    def _call(self, cmd):
+        return self._send(cmd)[0]
+
+    def _guarded(self, *commands):
+        try:
+            return self._send(*commands)
+        except (OSError, ConnectionError, RuntimeError, ValueError):
+            self.errors += 1
+            self._close()
+            return None
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    # ---------------------------------------------------
+    # BACKEND CONTRACT
+    # ---------------------------------------------------
+    def get(self, key):
+        replies = self._guarded(("GET", key))
+        return replies[0] if replies else None
+
+    def set(self, key, value, ttl):
+        replies = self._guarded(
+            ("SET", key, value, "PX", max(1, int(ttl * 1000))),
+            ("ZADD", self.INDEX_KEY, time.time(), key),
+            ("ZCARD", self.INDEX_KEY),
+        )
+        if replies and replies[2] > self.max_entries:
+            # evict the oldest writes past the limit
+            popped = self._guarded(("ZPOPMIN", self.INDEX_KEY, replies[2] - self.max_entries))
+            if popped and popped[0]:
+                self._guarded(("DEL", *popped[0][0::2]))
+
+    def stats(self):
+        replies = self._guarded(("ZCARD", self.INDEX_KEY))
+        return {"backend": "redis", "host": self.host, "port": self.port,
+                "size": replies[0] if replies else None,
+                "max_entries": self.max_entries, "errors": self.errors}
+
+
+def make_backend(url, max_entries=100_000):
+    """sqlite:///path.db | redis://[:password@]host:port/db | '' / none -> None"""
+    if not url or url == "none":
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(parsed.path[1:] or "spdm_cache.db", max_entries=max_entries)
+    if parsed.scheme == "redis":
+        return RedisBackend(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=parsed.password,
+            max_entries=max_entries,
+        )
+    raise ValueError(f"Unknown cache backend: {url}")
+
+
+# ---------------------------------------------------
+# PREDICTION CACHE — keyed on the feature vector
+# ---------------------------------------------------
+def feature_key(row, model_version):
+    # -0.0 and 0.0 hash the same; ints and floats share a key
+    vec = np.ascontiguousarray(row, dtype=np.float64) + 0.0
+    digest = hashlib.sha256(vec.tobytes()).hexdigest()
+    return f"spdm:pred:{model_version}:{digest}"
+
+
+class PredictionCache:
+
+    def __init__(self, backend, ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, row, model_version):
+        value = self.backend.get(feature_key(row, model_version))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        weakness, speed, slope = json.loads(value)
+        return float(weakness), int(speed), float(slope)
+
+    def set(self, row, model_version, result):
+        weakness, speed, slope = result
+        value = json.dumps([float(weakness), int(speed), float(slope)])
+        self.backend.set(feature_key(row, model_version), value.encode(), self.ttl)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, **self.backend.stats()}
+
+
+def backend_from_env():
+    return make_backend(
+        os.environ.get("PLAN_CACHE_URL", ""),
+        max_entries=int(os.environ.get("PLAN_CACHE_SHARED_MAX", "100000"))
+    )
@@ -0,0 +1,123 @@
+import hashlib
+import json
+from functools import cached_property
+
+import numpy as np
+
+
+# ---------------------------------------------------
+# DIFFICULTY CODES
+# ---------------------------------------------------
+DIFFICULTY_CODES = {"easy": 0, "medium": 1, "hard": 2}
+UNKNOWN_DIFFICULTY = -1
+
+# first topics of a chapter, revised 7 days after the chapter is studied
+KEY_TOPICS_PER_CHAPTER = 3
+
+
+# ---------------------------------------------------
+# PER-SUBJECT INDEX
+# ---------------------------------------------------
+# One subject flattened once into parallel arrays, in syllabus order:
+#   topics[i], difficulty[i]           -> names as in the JSON
+#   chapter_id[i], difficulty_code[i]  -> int arrays
+#   estimated_time[i]                  -> numeric array
+# plus a lowercase topic name -> position map (first occurrence wins, like
+# the linear scan it replaces).
+class SubjectIndex:
+
+    def __init__(self, name, chapters_json):
+        self.name = name
+        self.fingerprint = self.content_fingerprint(name, chapters_json)
+        self.chapters = list(chapters_json.keys())
+        self.chapter_ids = {chapter: cid for cid, chapter in enumerate(self.chapters)}
+        self.chapter_start = []
+
+        topics, difficulty, chapter_id, estimated_time = [], [], [], []
+        for cid, items in enumerate(chapters_json.values()):
+            self.chapter_start.append(len(topics))
+            for item in items:
+                topics.append(item["topic"])
+                difficulty.append(item["difficulty"])
+                chapter_id.append(cid)
+                estimated_time.append(item["estimated_time"])
+        self.chapter_start.append(len(topics))
+
+        self.topics = topics
+        self.difficulty = difficulty
+        self.chapter_id = np.array(chapter_id, dtype=np.int32)
+        self.difficulty_code = np.array(
+            [DIFFICULTY_CODES.get(d, UNKNOWN_DIFFICULTY) for d in difficulty],
+            dtype=np.int8
+        )
+        self.estimated_time = np.array(estimated_time)
+
+        self.position = {}
+        for i, topic in enumerate(topics):
+            self.position.setdefault(topic.lower(), i)
+
+    @staticmethod
+    def content_fingerprint(name, chapters_json):
+        # content hash; stable across processes, used in shared cache keys.
+        # Chapters are hashed as an ordered list: reordering them moves every
+        # topic position, so it has to change the fingerprint.
+        return hashlib.sha256(
+            json.dumps([name, list(chapters_json.items())], sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.topics)
+
+    def topic_range(self, start_topic=None, end_topic=None):
+        """(start, stop) slice bounds for an optional inclusive topic range."""
+        if not (start_topic and end_topic):
+            return 0, len(self.topics)
+
+        start_idx = self.position.get(start_topic.lower().strip())
+        end_idx = self.position.get(end_topic.lower().strip())
+
+        if start_idx is None or end_idx is None:
+            raise ValueError("Invalid start_topic or end_topic")
+
+        if end_idx < start_idx:
+            raise ValueError("end_topic cannot come before start_topic")
+
+        return start_idx, end_idx + 1
+
+    def chapter_topics(self, chapter_id):
+        return self.topics[self.chapter_start[chapter_id]:self.chapter_start[chapter_id + 1]]
+
+    @cached_property
+    def key_topics(self):
+        """Per chapter id: range of its key topic positions (built once per syllabus)."""
+        starts = list(self.chapter_start)
+        return [
+            range(first, min(first + KEY_TOPICS_PER_CHAPTER, stop))
+            for first, stop in zip(starts, starts[1:])
+        ]
+
+
+# ---------------------------------------------------
+# WHOLE-SYLLABUS INDEX
+# ---------------------------------------------------
+class SyllabusIndex:
+
+    def __init__(self, syllabus_json):
+        self.subjects = {
+            key: SubjectIndex(key, chapters) for key, chapters in syllabus_json.items()
+        }
+
+        self.subject_by_lower = {}
+        for key in syllabus_json.keys():
+            self.subject_by_lower.setdefault(key.lower(), key)
+
+    def find_subject(self, subject):
+        return self.subject_by_lower.get(subject.lower())
+
+    def select_subject(self, subject_from_api):
+        # same contract as engine.select_subject: fall back to the first subject
+        if subject_from_api:
+            key = self.subject_by_lower.get(subject_from_api.lower().strip())
+            if key is not None:
+                return key
+        return next(iter(self.subjects))
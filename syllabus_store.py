@@ -0,0 +1,705 @@
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+
+from syllabus_index import DIFFICULTY_CODES, SubjectIndex, SyllabusIndex
+
+logger = logging.getLogger("spdm.syllabus")
+
+
+# ---------------------------------------------------
+# SYLLABUS STORE — compiled, memory-mapped, hot-reloaded
+# ---------------------------------------------------
+# Each named syllabus (a board / grade; one JSON file) is validated and
+# compiled once into STORE_DIR/<name>-<source hash>/:
+#
+#   pack.bin   every array back to back: topic / chapter names as one UTF-8
+#              blob + offsets, chapter ids, difficulty codes, estimated
+#              times, chapter starts, and per subject the lowercase topic
+#              names sorted for lookup (no per-worker dict)
+#   meta.json  array layout, subject slices and fingerprints
+#
+# Workers mmap pack.bin read-only, so every worker on the box shares the
+# same page-cache pages and nothing is parsed at start-up once a pack
+# exists. StoredSubject / StoredSyllabus expose the SubjectIndex /
+# SyllabusIndex interface over those arrays, so the engines take them as
+# `index=` unchanged, and fingerprints match SubjectIndex's (cache keys and
+# plan tokens stay valid).
+#
+# Hot reload: get() looks at the source files at most every check_interval
+# seconds, on a background thread: the request that notices is served the
+# current version straight away, like every other until the swap. A
+# changed file is compiled (or an existing pack for the same content
+# opened) and the name -> syllabus map is swapped in one assignment. Requests hold on to the syllabus they started with; old packs
+# stay mapped until the last reference goes. A file that fails validation
+# is logged and the previous version keeps serving.
+#
+# Names decode from the blob on access. The HOT_SUBJECTS most recently used
+# subjects also keep decoded name lists per worker (renders index them per
+# task); everything else, and all numeric arrays, stays shared.
+STORE_DIR = os.environ.get("PLANNER_SYLLABUS_DIR", ".syllabus_store")
+CHECK_SECONDS = float(os.environ.get("PLANNER_SYLLABUS_CHECK_SECONDS", "5"))
+# name=path pairs; requests without a "syllabus" field use the first one
+SOURCES = os.environ.get(
+    "PLANNER_SYLLABI", "default=syllabus.json,science=science_syllabus.json"
+)
+
+HOT_SUBJECTS = int(os.environ.get("PLANNER_SYLLABUS_HOT_SUBJECTS", "32"))
+
+PACK_FORMAT = 2   # 2: order-sensitive subject fingerprints
+KEEP_VERSIONS = 2
+DIFFICULTY_NAMES = {code: name for name, code in DIFFICULTY_CODES.items()}
+
+
+class SyllabusError(ValueError):
+    pass
+
+
+# ---------------------------------------------------
+# VALIDATION (build time)
+# ---------------------------------------------------
+def validate_syllabus(data, source="syllabus", max_errors=20):
+    """Raise SyllabusError listing what is wrong with a parsed syllabus file.
+
+    {subject: {chapter: [{"topic": str, "difficulty": easy|medium|hard,
+                          "estimated_time": number > 0}, ...]}}
+    """
+    errors = []
+
+    def error(where, message):
+        errors.append(f"{source}: {where}: {message}" if where else f"{source}: {message}")
+
+    if not isinstance(data, dict) or not data:
+        error("", "expected a non-empty object of subjects")
+        data = {}
+
+    seen_subjects = set()
+    for subject, chapters in data.items():
+        if not subject.strip():
+            error(repr(subject), "empty subject name")
+        if subject.lower().strip() in seen_subjects:
+            error(subject, "subject name repeats (case-insensitive)")
+        seen_subjects.add(subject.lower().strip())
+
+        if not isinstance(chapters, dict) or not chapters:
+            error(subject, "expected a non-empty object of chapters")
+            continue
+
+        for chapter, items in chapters.items():
+            where = f"{subject} / {chapter}"
+            if not chapter.strip():
+                error(where, "empty chapter name")
+            if not isinstance(items, list) or not items:
+                error(where, "expected a non-empty list of topics")
+                continue
+
+            for i, item in enumerate(items, 1):
+                at = f"{where} / topic {i}"
+                if not isinstance(item, dict):
+                    error(at, "expected an object")
+                    continue
+                topic = item.get("topic")
+                if not isinstance(topic, str) or not topic.strip():
+                    error(at, "'topic' must be a non-empty string")
+                if item.get("difficulty") not in DIFFICULTY_CODES:
+                    error(at, f"'difficulty' must be one of {', '.join(DIFFICULTY_CODES)}")
+                minutes = item.get("estimated_time")
+                if isinstance(minutes, bool) or not isinstance(minutes, (int, float)) \
+                        or not minutes > 0:
+                    error(at, "'estimated_time' must be a positive number")
+
+    if errors:
+        more = f" (+{len(errors) - max_errors} more)" if len(errors) > max_errors else ""
+        raise SyllabusError("; ".join(errors[:max_errors]) + more)
+
+
+# ---------------------------------------------------
+# COMPILE: JSON -> pack.bin + meta.json
+# ---------------------------------------------------
+def compile_syllabus(data, out_dir, name="default", source=None, source_hash=None):
+    validate_syllabus(data, source or name)
+
+    strings = bytearray()
+
+    def add_strings(values):
+        offsets = [len(strings)]
+        for value in values:
+            strings.extend(value.encode())
+            offsets.append(len(strings))
+        return offsets
+
+    topic_offsets, chapter_offsets, key_offsets = [], [], []
+    key_position, chapter_id, chapter_start = [], [], []
+    difficulty_code, estimated_time, subjects = [], [], []
+
+    for subject, chapters in data.items():
+        topics = [item["topic"] for items in chapters.values() for item in items]
+        t_lo, c_lo, s_lo = len(chapter_id), len(chapter_offsets), len(chapter_start)
+
+        # offsets arrays hold one extra end offset per subject
+        topic_offsets.extend(add_strings(topics))
+        chapter_offsets.extend(add_strings(chapters.keys()))
+
+        start = 0
+        for cid, items in enumerate(chapters.values()):
+            chapter_start.append(start)
+            start += len(items)
+            for item in items:
+                chapter_id.append(cid)
+                difficulty_code.append(DIFFICULTY_CODES[item["difficulty"]])
+                estimated_time.append(item["estimated_time"])
+        chapter_start.append(start)
+
+        # (lowercase name, position) sorted: bisect finds the first occurrence
+        keys = sorted((topic.lower(), i) for i, topic in enumerate(topics))
+        key_offsets.extend(add_strings(k for k, _ in keys))
+        key_position.extend(i for _, i in keys)
+
+        subjects.append({
+            "name": subject,
+            "fingerprint": SubjectIndex.content_fingerprint(subject, chapters),
+            "topics": [t_lo, len(chapter_id)],
+            "topic_offsets": [t_lo + len(subjects), len(topic_offsets)],
+            "chapter_offsets": [c_lo, len(chapter_offsets)],
+            "chapter_start": [s_lo, len(chapter_start)],
+        })
+
+    arrays = {
+        "strings": np.frombuffer(bytes(strings), dtype=np.uint8),
+        "topic_offsets": np.array(topic_offsets, dtype=np.int64),
+        "chapter_offsets": np.array(chapter_offsets, dtype=np.int64),
+        "key_offsets": np.array(key_offsets, dtype=np.int64),
+        "key_position": np.array(key_position, dtype=np.int64),
+        "chapter_id": np.array(chapter_id, dtype=np.int32),
+        "chapter_start": np.array(chapter_start, dtype=np.int64),
+        "difficulty_code": np.array(difficulty_code, dtype=np.int8),
+        # int64 unless the file has fractional minutes, like np.array() would
+        "estimated_time": np.array(estimated_time),
+    }
+
+    layout, offset = {}, 0
+    with open(os.path.join(out_dir, "pack.bin"), "wb") as f:
+        for key, arr in arrays.items():
+            pad = -offset % 8
+            f.write(b"\0" * pad)
+            offset += pad
+            layout[key] = [arr.dtype.str, offset, len(arr)]
+            f.write(arr.tobytes())
+            offset += arr.nbytes
+
+    meta = {
+        "format": PACK_FORMAT, "name": name, "source": source,
+        "source_hash": source_hash, "arrays": layout, "subjects": subjects,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+# ---------------------------------------------------
+# READ SIDE: views over one mmap'd pack
+# ---------------------------------------------------
+class StringColumn:
+    """Read-only sequence of str decoded on access from a UTF-8 blob."""
+    __slots__ = ("_blob", "_offsets")
+
+    def __init__(self, blob, offsets):
+        self._blob = blob        # mmap / bytes
+        self._offsets = offsets  # memoryview of int64, len n + 1
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self._offsets) - 1
+            if i < 0:
+                raise IndexError("string column index out of range")
+        # offsets[i + 1] raises IndexError past the end
+        offsets = self._offsets
+        return self._blob[offsets[i]:offsets[i + 1]].decode()
+
+    def __iter__(self):
+        blob, offsets = self._blob, self._offsets
+        for i in range(len(offsets) - 1):
+            yield blob[offsets[i]:offsets[i + 1]].decode()
+
+
+class CodedColumn:
+    """Read-only sequence of names looked up from small integer codes."""
+    __slots__ = ("_codes", "_names")
+
+    def __init__(self, codes, names):
+        self._codes = codes  # memoryview: indexing gives plain ints
+        self._names = names
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._names[c] for c in self._codes[i].tolist()]
+        return self._names[self._codes[i]]
+
+    def __iter__(self):
+        return (self._names[c] for c in self._codes.tolist())
+
+
+class HotStrings:
+    """Per-worker LRU: (subject fingerprint, kind) -> decoded list of names."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._lists = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, column):
+        if not self.capacity:
+            return column
+        hit = self._lists.get(key)
+        if hit is not None:
+            try:
+                self._lists.move_to_end(key)
+            except KeyError:  # evicted by another thread just now
+                pass
+            return hit
+
+        decoded = list(column)
+        with self._lock:
+            self._lists[key] = decoded
+            while len(self._lists) > self.capacity:
+                self._lists.popitem(last=False)
+        return decoded
+
+
+HOT = HotStrings(HOT_SUBJECTS)
+
+
+class PositionLookup:
+    """lowercase topic name -> first position, by binary search (dict.get API)."""
+    __slots__ = ("_keys", "_positions")
+
+    def __init__(self, keys, positions):
+        self._keys = keys
+        self._positions = positions
+
+    def get(self, key, default=None):
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._positions[i]
+        return default
+
+
+class StoredSubject(SubjectIndex):
+    # same attributes as SubjectIndex; topic_range() / chapter_topics()
+    # are inherited and work against the views
+
+    def __init__(self, spec, blob, arrays):
+        self.name = spec["name"]
+        self.fingerprint = spec["fingerprint"]
+
+        t_lo, t_hi = spec["topics"]
+        o_lo, o_hi = spec["topic_offsets"]
+        c_lo, c_hi = spec["chapter_offsets"]
+        s_lo, s_hi = spec["chapter_start"]
+
+        self.topic_column = StringColumn(blob, memoryview(arrays["topic_offsets"][o_lo:o_hi]))
+        self.chapter_column = StringColumn(blob, memoryview(arrays["chapter_offsets"][c_lo:c_hi]))
+        self.chapter_start = memoryview(arrays["chapter_start"][s_lo:s_hi])
+
+        self.chapter_id = arrays["chapter_id"][t_lo:t_hi]
+        self.difficulty_code = arrays["difficulty_code"][t_lo:t_hi]
+        self.estimated_time = arrays["estimated_time"][t_lo:t_hi]
+        self.difficulty = CodedColumn(memoryview(self.difficulty_code), DIFFICULTY_NAMES)
+        self._hot_keys = ((self.fingerprint, "topics"), (self.fingerprint, "chapters"))
+
+        self.position = PositionLookup(
+            StringColumn(blob, memoryview(arrays["key_offsets"][o_lo:o_hi])),
+            memoryview(arrays["key_position"][t_lo:t_hi])
+        )
+
+    @property
+    def topics(self):
+        return HOT.get(self._hot_keys[0], self.topic_column)
+
+    @property
+    def chapters(self):
+        return HOT.get(self._hot_keys[1], self.chapter_column)
+
+    @cached_property
+    def chapter_ids(self):
+        # only the reference engine (generate_realistic_plan_v2) uses this
+        return {chapter: cid for cid, chapter in enumerate(self.chapters)}
+
+
+class StoredSyllabus(SyllabusIndex):
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != PACK_FORMAT:
+            raise SyllabusError(f"{path}: unsupported pack format")
+
+        with open(os.path.join(path, "pack.bin"), "rb") as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        arrays = {
+            key: np.frombuffer(blob, dtype=np.dtype(dtype), count=count, offset=offset)
+            for key, (dtype, offset, count) in meta["arrays"].items()
+        }
+
+        self.name = meta["name"]
+        self.version = meta["source_hash"]
+        self.path = path
+        self.subjects = {
+            spec["name"]: StoredSubject(spec, blob, arrays) for spec in meta["subjects"]
+        }
+        self.subject_by_lower = {}
+        for key in self.subjects:
+            self.subject_by_lower.setdefault(key.lower(), key)
+
+    def topic_count(self):
+        return sum(len(sub) for sub in self.subjects.values())
+
+
+# ---------------------------------------------------
+# STORE (name -> current StoredSyllabus)
+# ---------------------------------------------------
+def parse_sources(spec):
+    """ "default=syllabus.json,science=science_syllabus.json" -> {name: path} """
+    sources = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, sep, path = part.partition("=")
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(part.strip()))[0], part
+        name = name.strip()
+        if not name or not all(c.isalnum() or c in "-_" for c in name):
+            raise ValueError(f"Invalid syllabus name: {name!r}")
+        sources[name] = path.strip()
+    if not sources:
+        raise ValueError("No syllabus sources configured")
+    return sources
+
+
+def file_digest(path):
+    # the pack format is part of the version, so a format bump recompiles
+    # packs left by the previous release instead of failing to open them
+    with open(path, "rb") as f:
+        return hashlib.sha256(f"pack{PACK_FORMAT}:".encode() + f.read()).hexdigest()[:16]
+
+
+class SyllabusStore:
+
+    def __init__(self, sources, store_dir=STORE_DIR, check_interval=CHECK_SECONDS):
+        self.sources = dict(sources)  # name -> JSON path
+        self.default = next(iter(self.sources))
+        self.store_dir = store_dir
+        self.check_interval = check_interval
+
+        self._syllabi = {}   # swapped whole, never mutated
+        self._stamps = {}    # name -> (mtime_ns, size) last seen
+        self._errors = {}    # name -> last failed reload
+        self._loaded_at = {}
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._reloader = None   # the last background reload thread
+
+    @classmethod
+    def from_env(cls):
+        return cls(parse_sources(SOURCES))
+
+    # ---------------------------------------------------
+    # ACCESS
+    # ---------------------------------------------------
+    def get(self, name=None):
+        """-> the current StoredSyllabus for `name` (default first), or None."""
+        if self.check_interval and time.monotonic() >= self._next_check:
+            self._reload_in_background()
+        return self._syllabi.get(name or self.default)
+
+    def names(self):
+        return list(self._syllabi)
+
+    def status(self):
+        syllabi = self._syllabi
+        return {
+            name: {
+                "source": self.sources[name],
+                "version": syllabi[name].version if name in syllabi else None,
+                "subjects": list(syllabi[name].subjects) if name in syllabi else [],
+                "topics": syllabi[name].topic_count() if name in syllabi else 0,
+                "loaded_at": self._loaded_at.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self.sources
+        }
+
+    # ---------------------------------------------------
+    # LOADING / RELOAD
+    # ---------------------------------------------------
+    def load(self):
+        """First load; any invalid source raises."""
+        self.reload(strict=True)
+        return self
+
+    def reload(self, blocking=True, strict=False):
+        """Pick up changed sources. -> names reloaded (None if another thread is at it)."""
+        if not self._reload_lock.acquire(blocking=blocking):
+            return None
+        try:
+            return self._reload(strict)
+        finally:
+            self._reload_lock.release()
+
+    def _reload_in_background(self):
+        # the lock is taken here and released by the thread, so one check runs
+        # at a time and concurrent requests start no more threads
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        self._next_check = time.monotonic() + self.check_interval
+        self._reloader = threading.Thread(target=self._background_reload,
+                                          name="syllabus-reload", daemon=True)
+        self._reloader.start()
+
+    def _background_reload(self):
+        try:
+            self._reload(strict=False)
+        except Exception:
+            logger.exception("syllabus reload failed")
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self, strict):
+        # caller holds _reload_lock
+        self._next_check = time.monotonic() + self.check_interval
+        syllabi, changed = dict(self._syllabi), []
+
+        for name, path in self.sources.items():
+            stamp = None
+            try:
+                st = os.stat(path)
+                stamp = (st.st_mtime_ns, st.st_size)
+                if name in syllabi and self._stamps.get(name) == stamp:
+                    continue
+                syllabus = self._open(name, path)
+            except (OSError, ValueError) as e:  # SyllabusError, bad JSON
+                if strict:
+                    raise
+                # retried once the file changes again, not on every check
+                self._stamps[name] = stamp
+                self._errors[name] = str(e)
+                logger.error("syllabus %s not reloaded, keeping %s: %s", name,
+                             syllabi[name].version if name in syllabi else "nothing", e)
+                continue
+
+            self._stamps[name] = stamp
+            self._errors.pop(name, None)
+            if name not in syllabi or syllabi[name].version != syllabus.version:
+                syllabi[name] = syllabus
+                self._loaded_at[name] = time.time()
+                changed.append(name)
+
+        if changed:
+            self._syllabi = syllabi
+            logger.info("syllabi loaded: %s", {n: syllabi[n].version for n in changed})
+        return changed
+
+    def _open(self, name, path):
+        digest = file_digest(path)
+        target = os.path.join(self.store_dir, f"{name}-{digest}")
+
+        current = self._syllabi.get(name)
+        if current is not None and current.version == digest:
+            return current
+
+        if not os.path.exists(os.path.join(target, "meta.json")):
+            self._build(name, path, digest, target)
+        syllabus = StoredSyllabus(target)
+        self._prune(name, keep=target)
+        return syllabus
+
+    def _build(self, name, path, digest, target):
+        t0 = time.perf_counter()
+        with open(path) as f:
+            data = json.load(f)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=f".{name}-", dir=self.store_dir)
+        try:
+            compile_syllabus(data, tmp, name=name, source=path, source_hash=digest)
+            os.replace(tmp, target)
+        except OSError:
+            # another worker published the same version first
+            if not os.path.exists(os.path.join(target, "meta.json")):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        logger.info("compiled syllabus %s (%s) in %.1fms", name, digest,
+                    (time.perf_counter() - t0) * 1000)
+
+    def _prune(self, name, keep):
+        # mapped files stay readable after unlink, so in-flight requests on
+        # an old version are unaffected
+        pattern = re.compile(rf"{re.escape(name)}-[0-9a-f]{{16}}")
+        try:
+            names = os.listdir(self.store_dir)
+        except OSError:
+            return
+        versions = []
+        for d in names:
+            if not pattern.fullmatch(d):
+                continue   # another syllabus ("cbse-10" next to "cbse") or a build dir
+            path = os.path.join(self.store_dir, d)
+            try:
+                versions.append((os.path.getmtime(path), path))
+            except OSError:
+                pass       # pruned by another worker meanwhile
+        versions = [path for _, path in sorted(versions, reverse=True)]
+        stale = [v for v in versions if v != keep][KEEP_VERSIONS - 1:]
+        for path in stale:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# ---------------------------------------------------
+# CHECK (python syllabus_store.py [file.json ...])
+# ---------------------------------------------------
+if __name__ == "__main__":
+    import random
+    import sys
+    from datetime import date, timedelta
+
+    from benchmarks import synthetic_syllabus
+    from engine import generate_realistic_plan_fast
+
+    paths = sys.argv[1:] or list(parse_sources(SOURCES).values())
+    workdir = tempfile.mkdtemp(prefix="syllabus-check-")
+    try:
+        # every stored subject reads back exactly like a SubjectIndex
+        for path in paths:
+            with open(path) as f:
+                data = json.load(f)
+            store = SyllabusStore({"check": path}, store_dir=workdir, check_interval=0).load()
+            stored, plain = store.get(), SyllabusIndex(data)
+            HOT.capacity = 0  # compare the blob-backed columns themselves
+            assert list(stored.subjects) == list(plain.subjects)
+            for key, sub in plain.subjects.items():
+                got = stored.subjects[key]
+                assert got.fingerprint == sub.fingerprint
+                if len(data[key]) > 1:   # positions move when chapters do
+                    reordered = dict(reversed(list(data[key].items())))
+                    assert SubjectIndex.content_fingerprint(key, reordered) != sub.fingerprint
+                assert list(got.topics) == sub.topics and got.topics[2:5] == sub.topics[2:5]
+                assert list(got.chapters) == sub.chapters
+                assert list(got.difficulty) == sub.difficulty
+                assert list(got.chapter_start) == sub.chapter_start
+                assert got.chapter_ids == sub.chapter_ids
+                for arr in ("chapter_id", "difficulty_code", "estimated_time"):
+                    assert np.array_equal(getattr(got, arr), getattr(sub, arr)), arr
+                for topic in sub.topics + ["no such topic"]:
+                    assert got.position.get(topic.lower()) == sub.position.get(topic.lower())
+
+            # ... and plans made from it are identical, with and without hot lists
+            HOT.capacity = HOT_SUBJECTS
+            exam = str(date.today() + timedelta(days=200))
+            for key in plain.subjects:
+                for mode in ("moderate", "aggressive"):
+                    kwargs = dict(syllabus_json=data, weakness_map={key: 0.5},
+                                  speed_map={key: 1}, study_mode=mode, exam_date=exam,
+                                  discipline_score=0.5, subject=key)
+                    random.seed(1)
+                    expected = generate_realistic_plan_fast(**kwargs, index=plain)
+                    random.seed(1)
+                    assert generate_realistic_plan_fast(**kwargs, index=stored) == expected
+            print(f"{path}: {stored.topic_count()} topics, pack {stored.version}, matches SyllabusIndex")
+
+        # schema errors are reported with their location
+        bad = {"Maths": {"Algebra": [{"topic": "x", "difficulty": "tricky", "estimated_time": 0}]}}
+        try:
+            validate_syllabus(bad, "bad.json")
+            raise AssertionError("invalid syllabus accepted")
+        except SyllabusError as e:
+            assert "Maths / Algebra / topic 1" in str(e) and "estimated_time" in str(e)
+
+        # hot reload: swap on change, keep serving through a broken edit
+        source = os.path.join(workdir, "live.json")
+        with open(source, "w") as f:
+            json.dump(synthetic_syllabus(200), f)
+        store = SyllabusStore({"live": source}, store_dir=workdir, check_interval=0).load()
+        before = store.get()
+        held = before.subjects["Synthetic"]
+
+        with open(source, "w") as f:
+            json.dump(synthetic_syllabus(300), f)
+        assert store.reload() == ["live"] and store.get().topic_count() == 300
+        assert len(held) == 200 and held.topics[199] == "Topic 200"  # old view still valid
+
+        with open(source, "w") as f:
+            f.write('{"Synthetic": {"Chapter 1": []}}')
+        assert store.reload() == [] and store.get().topic_count() == 300
+        assert store.status()["live"]["error"]
+
+        # pruning "live" leaves "live-10" (a different syllabus) alone
+        other = os.path.join(workdir, "live-10.json")
+        with open(other, "w") as f:
+            json.dump(synthetic_syllabus(50), f)
+        neighbour = SyllabusStore({"live-10": other}, store_dir=workdir, check_interval=0).load()
+        for n in (310, 320, 330):
+            with open(source, "w") as f:
+                json.dump(synthetic_syllabus(n), f)
+            assert store.reload() == ["live"]
+        assert os.path.exists(os.path.join(neighbour.get().path, "meta.json"))
+
+        # a request that notices a change is not the one that compiles it:
+        # get() returns the current version while a thread builds the next
+        store.check_interval = 1e-6
+        with open(source, "w") as f:
+            json.dump(synthetic_syllabus(100_000), f)
+        t0 = time.perf_counter()
+        served = store.get()
+        get_ms = (time.perf_counter() - t0) * 1000
+        assert served.topic_count() == 330 and store._reloader.is_alive()
+        store._reloader.join()
+        assert store.get().topic_count() == 100_000
+        print(f"stale syllabus: get() {get_ms:.2f}ms while a 100k-topic pack compiles behind it")
+
+        # start-up cost: compile once, then every worker just maps it
+        big = os.path.join(workdir, "big.json")
+        with open(big, "w") as f:
+            json.dump(synthetic_syllabus(200_000), f)
+        t0 = time.perf_counter()
+        SyllabusStore({"big": big}, store_dir=workdir, check_interval=0).load()
+        compile_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        mapped = SyllabusStore({"big": big}, store_dir=workdir, check_interval=0).load().get()
+        open_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        with open(big) as f:
+            SyllabusIndex(json.load(f))
+        json_ms = (time.perf_counter() - t0) * 1000
+        sub = mapped.subjects["Synthetic"]
+        t0 = time.perf_counter()
+        for i in range(0, 200_000, 97):
+            assert sub.position.get(sub.topic_column[i].lower()) == i
+        lookup_us = (time.perf_counter() - t0) / len(range(0, 200_000, 97)) * 1e6
+        print(f"200k topics: compile {compile_ms:.0f}ms once, open {open_ms:.1f}ms per worker "
+              f"(json + SyllabusIndex {json_ms:.0f}ms), topic lookup {lookup_us:.1f}us")
+
+        print("hot reload swaps versions and keeps serving through an invalid edit")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)